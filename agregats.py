@@ -0,0 +1,118 @@
+"""
+Agrégats de km maintenus incrémentalement : total par utilisateur et seaux
+jour / semaine / mois / année. Mis à jour en O(1) à chaque ajout ou suppression,
+reconstruits depuis un parcours complet seulement au démarrage ou sur dérive.
+"""
+import datetime
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+
+PERIODES = ('total_global', 'total_aujourdhui', 'total_semaine', 'total_mois', 'total_annee')
+
+
+def parse_date_tour(valeur) -> Optional[datetime.date]:
+    """Date d'un tour ('dd/mm/yyyy', date ou Timestamp) ; None si invalide"""
+    if valeur is None:
+        return None
+    if isinstance(valeur, datetime.datetime):
+        return valeur.date()
+    if isinstance(valeur, datetime.date):
+        return valeur
+    try:
+        return datetime.datetime.strptime(str(valeur).strip(), '%d/%m/%Y').date()
+    except ValueError:
+        return None
+
+
+class AgregatsKm:
+    """
+    Totaux de km par utilisateur et par période, sans relire l'historique
+    Chaque tour est connu par son ID (ID Supabase/SQLite ou Id stable du journal CSV) :
+    une suppression se fait en O(1) avec retirer_id
+    """
+
+    def __init__(self, utilisateurs: Iterable[str]):
+        self.utilisateurs = tuple(utilisateurs)
+        self.verrou = threading.RLock()
+        self.pret = False
+        self.version_source = None  # Version des données lors de la dernière synchronisation
+        self.verifie_a = 0.0
+        self._vider()
+
+    def _vider(self):
+        self.count = 0
+        self.total = {u: 0.0 for u in self.utilisateurs}
+        self.jours = {u: defaultdict(float) for u in self.utilisateurs}
+        self.semaines = {u: defaultdict(float) for u in self.utilisateurs}  # clé : lundi de la semaine
+        self.mois = {u: defaultdict(float) for u in self.utilisateurs}      # clé : (année, mois)
+        self.annees = {u: defaultdict(float) for u in self.utilisateurs}    # clé : année
+        self.lignes = {}  # ID -> (utilisateur, date, km)
+
+    def _appliquer(self, utilisateur: str, date: Optional[datetime.date], km: float, signe: float):
+        if utilisateur not in self.total:
+            utilisateur = self.utilisateurs[0]
+        km = signe * km
+        self.count += int(signe)
+        self.total[utilisateur] += km
+        if date is None:
+            return
+        self.jours[utilisateur][date] += km
+        self.semaines[utilisateur][date - datetime.timedelta(days=date.weekday())] += km
+        self.mois[utilisateur][(date.year, date.month)] += km
+        self.annees[utilisateur][date.year] += km
+
+    def reconstruire(self, lignes: Iterable[Tuple[Optional[int], str, object, float]]):
+        """Reconstruit tout depuis (id, utilisateur, date, km) ; id peut être None"""
+        with self.verrou:
+            self._vider()
+            for tour_id, utilisateur, date, km in lignes:
+                self.ajouter(utilisateur, date, km, tour_id)
+            self.pret = True
+
+    def ajouter(self, utilisateur: str, date, km: float, tour_id: Optional[int] = None):
+        """Ajoute un tour"""
+        with self.verrou:
+            date = parse_date_tour(date)
+            km = float(km or 0)
+            self._appliquer(utilisateur, date, km, 1.0)
+            if tour_id is not None:
+                self.lignes[tour_id] = (utilisateur, date, km)
+
+    def retirer_id(self, tour_id: int) -> bool:
+        """Retire un tour connu par son ID ; False si l'ID est inconnu (dérive)"""
+        with self.verrou:
+            ligne = self.lignes.pop(tour_id, None)
+            if ligne is None:
+                return False
+            self._appliquer(*ligne, -1.0)
+            return True
+
+    def dernier_id(self) -> Optional[int]:
+        """Plus grand ID connu"""
+        return max(self.lignes) if self.lignes else None
+
+    def stats(self, auj: Optional[datetime.date] = None) -> Tuple[Dict, Dict]:
+        """
+        Retourne (stats_global, {utilisateur: stats}) au même format que
+        _agreger_periodes dans app.py ; coût proportionnel au nombre de seaux
+        """
+        auj = auj or datetime.date.today()
+        lundi = auj - datetime.timedelta(days=auj.weekday())
+        with self.verrou:
+            par_utilisateur = {}
+            for u in self.utilisateurs:
+                par_utilisateur[u] = {
+                    'total_global': float(self.total[u]),
+                    'total_aujourdhui': float(self.jours[u].get(auj, 0.0)),
+                    'total_semaine': float(sum(v for k, v in self.semaines[u].items() if k >= lundi)),
+                    'total_mois': float(sum(v for k, v in self.mois[u].items() if k >= (auj.year, auj.month))),
+                    'total_annee': float(sum(v for k, v in self.annees[u].items() if k >= auj.year))
+                }
+        stats_global = {p: float(sum(s[p] for s in par_utilisateur.values())) for p in PERIODES}
+        return stats_global, par_utilisateur
+
+    def totaux(self) -> Dict[str, float]:
+        """Total de km par utilisateur"""
+        with self.verrou:
+            return {u: float(t) for u, t in self.total.items()}
@@ -1,512 +1,560 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, send_from_directory
 import datetime
 import pandas as pd
-import requests
+import numpy as np
 import os
 import urllib.parse
 import time
-from database import (
+import threading
+import hashlib
+import csv
+import io
+import itertools
+import json
+from stockage import (
+    STORAGE_BACKEND,
     get_all_tours, add_tour as add_tour_db, delete_tour as delete_tour_db,
-    upload_photo_to_tour as upload_photo_db,
+    upload_photo_to_tour as upload_photo_db, upload_photos_to_tour as upload_photos_db,
     get_all_entretien, add_entretien as add_entretien_db, update_entretien as update_entretien_db,
-    delete_entretien as delete_entretien_db, upload_entretien_file as upload_entretien_file_db
+    delete_entretien as delete_entretien_db, upload_entretien_file as upload_entretien_file_db,
+    get_data_version, get_tours_head as get_tours_head_db,
+    get_tours_page as get_tours_page_db, add_write_listener,
+    get_ride_aggregates as get_ride_aggregates_db, update_tour as update_tour_db,
+    tour_exists as tour_exists_db
 )
+from events import publish_event, event_stream, acquire_stream_slot, release_stream_slot, EVENTS_BUSY_RETRY_MS
+from itineraire import calculer_progressions
+from agregats import AgregatsKm, PERIODES, parse_date_tour
+from stockage_csv import JournalCsv, ENTETE as COLONNES_EXPORT_CSV
+from images import verifier_photo
+from utilisateurs import USERS, normaliser_utilisateur as _normalize_utilisateur
+from meteo import obtenir_meteos, planifier_meteo, statistiques_cache_meteo, METEO_DEFERRED
 
 app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False
 APP_START_TIME = time.time()
 
 FICHIER_DATA = "journal_velo.csv"
-USE_SUPABASE = os.getenv('SUPABASE_URL') and os.getenv('SUPABASE_KEY')
+# Tours et entretien en base (Supabase ou SQLite, lignes au format de la table rides), sinon journal CSV
+USE_BASE = STORAGE_BACKEND != 'csv'
 TOUR_DU_MONDE_KM = 40075  # Circonférence de la Terre en km
 
-USERS = ['Oswald', 'Titine', 'Alexandre', 'Damien']
-
-def _normalize_utilisateur(val):
-    """Normalise l'utilisateur : Oswald, Titine, Alexandre ou Damien. Opa -> Oswald pour rétrocompatibilité."""
-    v = str(val or 'Oswald').strip()
-    if v.upper() == 'MOI':
-        return 'Damien'
-    if v == 'Opa':  # Migration Opa -> Oswald
-        return 'Oswald'
-    if v in USERS:
-        return v
-    return 'Oswald'
-
-def obtenir_meteo(ville):
-    if not ville or ville.strip() == "":
-        return "N/A"
-    try:
-        # Utiliser units=metric dans les params pour forcer les Celsius
-        url = f"https://wttr.in/{ville}"
-        params = {
-            'format': '%C+%t',
-            'lang': 'de',
-            'units': 'metric'  # Force les degrés Celsius
-        }
-        r = requests.get(url, params=params, timeout=10)
-        if r.status_code == 200:
-            result = r.text.strip()
-            # Vérification de sécurité : convertir °F en °C si nécessaire
-            if '°F' in result:
-                import re
-                def f_to_c(match):
-                    f = float(match.group(1))
-                    c = (f - 32) * 5/9
-                    return f"{c:.0f}°C"
-                result = re.sub(r'(-?\d+(?:\.\d+)?)°F', f_to_c, result)
-            return result
-        return "N/A"
-    except Exception as e:
-        print(f"[ERROR] Erreur météo pour {ville}: {e}")
-        return "N/A"
+# Cache du payload /api/tours (invalidé par la version des données et le changement de jour).
+# La durée max borne le retard quand un autre worker gunicorn a écrit.
+TOURS_CACHE_MAX_AGE = float(os.getenv('TOURS_CACHE_MAX_AGE', '300'))
+_tours_cache = {}
+_tours_cache_lock = threading.Lock()
 
-def charger_donnees():
-    """Charge les données depuis Supabase ou CSV selon la configuration"""
-    if USE_SUPABASE:
+# Agrégats de km incrémentaux (totaux + seaux jour/semaine/mois/année par utilisateur).
+# En mode Supabase, la cohérence avec la base (écritures d'autres workers) est
+# vérifiée au plus toutes les AGREGATS_VERIFY_INTERVAL secondes.
+AGREGATS = AgregatsKm(USERS)
+AGREGATS_VERIFY_INTERVAL = float(os.getenv('AGREGATS_VERIFY_INTERVAL', '60'))
+
+# Pagination de l'historique (GET /api/tours?user=&limit=&before_id=)
+TOURS_PAGE_DEFAULT = 50
+TOURS_PAGE_MAX = 200
+
+
+def _tour_depuis_supabase(tour):
+    """Convertit une ligne Supabase au format API (colonnes du CSV + _index et photos)"""
+    photos = tour.get('photos')
+    if not isinstance(photos, list):
+        photos = photos if photos else []
+    return {
+        "Date": tour.get('date', ''),
+        "Start": tour.get('start', ''),
+        "Etape": tour.get('etape', '') if tour.get('etape') else '',
+        "Ziel": tour.get('ziel', ''),
+        "Wetter": tour.get('wetter', ''),
+        "Km": float(tour.get('km', 0)),
+        "Bemerkungen": tour.get('bemerkungen', '') if tour.get('bemerkungen') else '',
+        "Utilisateur": _normalize_utilisateur(tour.get('utilisateur', 'Oswald')),
+        "_index": tour.get('id'),  # Utiliser l'ID Supabase comme index
+        "photos": photos
+    }
+
+def _tours_depuis_df(df_visu):
+    """Convertit un DataFrame CSV (déjà trié/filtré) en liste de tours au format API"""
+    if 'Date_dt' in df_visu.columns:
+        df_visu = df_visu.drop(columns=['Date_dt'])
+    df_visu = df_visu.fillna('')
+    tours = []
+    for idx, row in df_visu.iterrows():
+        tour_dict = row.to_dict()
+        tour_dict['_index'] = int(idx)
+        if 'Utilisateur' not in tour_dict or pd.isna(tour_dict.get('Utilisateur')):
+            tour_dict['Utilisateur'] = 'Oswald'
+        else:
+            tour_dict['Utilisateur'] = _normalize_utilisateur(tour_dict['Utilisateur'])
+        tour_dict['photos'] = []  # Pas de photos en mode CSV
+        tours.append(tour_dict)
+    return tours
+
+def charger_donnees_et_tours():
+    """
+    Charge les données depuis Supabase ou CSV selon la configuration
+    Retourne (df, tours) : en mode Supabase, tours est la liste des tours au format
+    API (ID décroissant, avec _index et photos) issue du même appel que df ;
+    en mode CSV, tours vaut None
+    """
+    if USE_BASE:
         # Utiliser Supabase
-        tours = get_all_tours()
+        lignes = get_all_tours()
+        tours = [_tour_depuis_supabase(tour) for tour in lignes]
         if not tours:
-            return pd.DataFrame(columns=["Date", "Start", "Etape", "Ziel", "Wetter", "Km", "Bemerkungen", "Utilisateur"])
+            return pd.DataFrame(columns=["Date", "Start", "Etape", "Ziel", "Wetter", "Km", "Bemerkungen", "Utilisateur"]), tours
         
         # Convertir les données Supabase en DataFrame
-        data = []
-        for tour in tours:
-            data.append({
-                "Date": tour.get('date', ''),
-                "Start": tour.get('start', ''),
-                "Etape": tour.get('etape', '') if tour.get('etape') else '',
-                "Ziel": tour.get('ziel', ''),
-                "Wetter": tour.get('wetter', ''),
-                "Km": float(tour.get('km', 0)),
-                "Bemerkungen": tour.get('bemerkungen', '') if tour.get('bemerkungen') else '',
-                "Utilisateur": _normalize_utilisateur(tour.get('utilisateur', 'Oswald'))
-            })
-        
-        df = pd.DataFrame(data)
-        if not df.empty:
-            df['Date_dt'] = pd.to_datetime(df['Date'], format='%d/%m/%Y', errors='coerce')
-        return df
+        df = pd.DataFrame(tours, columns=["Date", "Start", "Etape", "Ziel", "Wetter", "Km", "Bemerkungen", "Utilisateur"])
+        # Colonne DATE typée (ISO) si présente ; sinon (ancien schéma, ligne non remplie) parse de 'dd/mm/yyyy'
+        dates = pd.to_datetime(pd.Series([tour.get('ride_date') for tour in lignes], dtype=object),
+                               format='%Y-%m-%d', errors='coerce')
+        manquantes = dates.isna()
+        if manquantes.any():
+            dates[manquantes] = pd.to_datetime(df.loc[manquantes, 'Date'], format='%d/%m/%Y', errors='coerce')
+        df['Date_dt'] = dates
+        return df, tours
     else:
-        # Fallback sur CSV
-        if os.path.exists(FICHIER_DATA):
-            df = pd.read_csv(FICHIER_DATA)
-            df['Date_dt'] = pd.to_datetime(df['Date'], format='%d/%m/%Y', errors='coerce')
-            # Ajouter colonne Utilisateur si absente (anciens fichiers) - défaut Oswald
-            if 'Utilisateur' not in df.columns:
-                df['Utilisateur'] = 'Oswald'
-            df['Utilisateur'] = df['Utilisateur'].fillna('Oswald').astype(str).apply(_normalize_utilisateur)
-            return df
-        return pd.DataFrame(columns=["Date", "Start", "Etape", "Ziel", "Wetter", "Km", "Bemerkungen", "Utilisateur"])
+        # Fallback sur CSV (parse mis en cache par le journal tant que le fichier ne change pas)
+        return JOURNAL_CSV.lire(), None
+
+def _preparer_df_csv(df):
+    """Colonnes dérivées des tours CSV, calculées une fois par lecture du fichier"""
+    df['Date_dt'] = pd.to_datetime(df['Date'], format='%d/%m/%Y', errors='coerce')
+    # Colonne Utilisateur vide (anciens fichiers) - défaut Oswald
+    df['Utilisateur'] = df['Utilisateur'].fillna('Oswald').astype(str).apply(_normalize_utilisateur)
+    return df
+
+JOURNAL_CSV = JournalCsv(FICHIER_DATA, preparer=_preparer_df_csv)
+
+def charger_donnees():
+    """Charge les données depuis Supabase ou CSV selon la configuration"""
+    df, _ = charger_donnees_et_tours()
+    return df
 
 @app.route('/')
 def index():
-    return render_template('index.html', use_supabase=USE_SUPABASE)
+    return render_template('index.html', use_supabase=USE_BASE)
 
 
 @app.route('/api/version', methods=['GET'])
 def api_version():
-    """Retourne une version qui change à chaque déploiement (nouveau processus)."""
-    return jsonify({'version': str(APP_START_TIME)})
+    """
+    Retourne une version qui change à chaque déploiement (nouveau processus),
+    et les compteurs du cache météo du worker qui répond
+    """
+    return jsonify({'version': str(APP_START_TIME), 'meteo': statistiques_cache_meteo()})
 
-@app.route('/api/tours', methods=['GET'])
-def get_tours():
-    try:
-        df = charger_donnees()
-    except Exception as e:
-        print(f"[ERROR] Erreur lors du chargement des données: {e}")
-        # Retourner des données vides plutôt que de planter
-        df = pd.DataFrame(columns=["Date", "Start", "Etape", "Ziel", "Wetter", "Km", "Bemerkungen", "Utilisateur"])
-    
+def _agreger_periodes(df, auj=None):
+    """
+    Somme des km par utilisateur et par période (tout, aujourd'hui, semaine, mois, année)
+    en une seule passe : codes catégoriels + un np.bincount par période
+    Retourne (stats_global, {utilisateur: stats})
+    """
+    if auj is None:
+        auj = pd.Timestamp.now().normalize()
+    n_users = len(USERS)
     if df.empty:
-        empty_prog = {
-            'ville_actuelle': '🏠 Kettenis',
-            'prochaine_ville': '🇧🇪 Liège',
-            'km_restants': 30.0,
-            'progression': 0.0,
-            'distance_kettenis': 30.0,
-            'world_tour_pct': 0.0
-        }
-        empty_stats = {
-            'total_global': 0,
-            'total_aujourdhui': 0,
-            'total_semaine': 0,
-            'total_mois': 0,
-            'total_annee': 0
-        }
-        return jsonify({
-            'tours': [],
-            'stats': empty_stats,
-            'stats_oswald': empty_stats.copy(),
-            'stats_titine': empty_stats.copy(),
-            'stats_alexandre': empty_stats.copy(),
-            'stats_damien': empty_stats.copy(),
-            'progression': empty_prog,
-            'progression_oswald': empty_prog.copy(),
-            'progression_titine': empty_prog.copy(),
-            'progression_alexandre': empty_prog.copy(),
-            'progression_damien': empty_prog.copy(),
-            'challenge': {
-                'total_oswald': 0,
-                'total_titine': 0,
-                'total_alexandre': 0,
-                'total_damien': 0,
-                'leader': 'Unentschieden',
-                'difference': 0,
-                'world_tour_oswald': {'km': 0, 'pct': 0, 'target': TOUR_DU_MONDE_KM},
-                'world_tour_titine': {'km': 0, 'pct': 0, 'target': TOUR_DU_MONDE_KM},
-                'world_tour_alexandre': {'km': 0, 'pct': 0, 'target': TOUR_DU_MONDE_KM},
-                'world_tour_damien': {'km': 0, 'pct': 0, 'target': TOUR_DU_MONDE_KM}
-            }
-        })
+        vide = dict.fromkeys(PERIODES, 0.0)
+        return dict(vide), {u: dict(vide) for u in USERS}
     
-    total_global = df['Km'].sum()
+    # Utilisateur déjà normalisé par charger_donnees ; valeur inconnue -> Oswald
+    codes = pd.Categorical(df['Utilisateur'], categories=USERS).codes.astype(np.intp)
+    codes[codes < 0] = USERS.index('Oswald')
+    km = pd.to_numeric(df['Km'], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    dates = df['Date_dt']
+    # Une colonne de booléens par période (None = toutes les lignes)
+    masques = (
+        None,
+        dates == auj,
+        dates >= auj - pd.Timedelta(days=auj.dayofweek),
+        dates >= auj.replace(day=1),
+        dates >= auj.replace(month=1, day=1)
+    )
+    matrice = np.empty((n_users, len(PERIODES)))
+    for j, masque in enumerate(masques):
+        poids = km if masque is None else np.where(masque.to_numpy(), km, 0.0)
+        matrice[:, j] = np.bincount(codes, weights=poids, minlength=n_users)
     
-    # Stats temporelles : somme filtrée par Utilisateur (Oswald, Alexandre, Damien)
-    df_util = df.copy()
-    if 'Utilisateur' not in df_util.columns:
-        df_util['Utilisateur'] = 'Oswald'
-    df_util['Utilisateur'] = df_util['Utilisateur'].fillna('Oswald').astype(str).apply(_normalize_utilisateur)
-    df_oswald = df_util[df_util['Utilisateur'] == 'Oswald']
-    df_titine = df_util[df_util['Utilisateur'] == 'Titine']
-    df_alexandre = df_util[df_util['Utilisateur'] == 'Alexandre']
-    df_damien = df_util[df_util['Utilisateur'] == 'Damien']
+    totaux = matrice.sum(axis=0)
+    stats_global = {p: float(totaux[j]) for j, p in enumerate(PERIODES)}
+    stats_par_utilisateur = {
+        u: {p: float(matrice[i, j]) for j, p in enumerate(PERIODES)}
+        for i, u in enumerate(USERS)
+    }
+    return stats_global, stats_par_utilisateur
+
+def _agregats_a_jour():
+    """
+    Retourne AGREGATS, reconstruit depuis un parcours complet seulement au démarrage
+    à froid ou si une dérive est détectée (fichier CSV modifié ailleurs, ou nombre de
+    tours / dernier ID différents de ceux de Supabase)
+    """
+    with AGREGATS.verrou:
+        if USE_BASE:
+            derive = False
+            head = None
+            if AGREGATS.pret and time.monotonic() - AGREGATS.verifie_a >= AGREGATS_VERIFY_INTERVAL:
+                head = get_tours_head_db()
+                if head is not None:
+                    derive = (head['count'], head['latest_id']) != (AGREGATS.count, AGREGATS.dernier_id())
+                AGREGATS.verifie_a = time.monotonic()
+            if not AGREGATS.pret or derive:
+                _, tours = charger_donnees_et_tours()
+                # get_all_tours retourne [] en cas d'erreur : une liste vide n'est retenue que si
+                # la table est bien vide, sinon les agrégats précédents sont conservés
+                if not tours and head is None:
+                    head = get_tours_head_db()
+                if tours or (head is not None and head['count'] == 0):
+                    AGREGATS.reconstruire(
+                        (t['_index'], t['Utilisateur'], t['Date'], t['Km']) for t in tours
+                    )
+                    AGREGATS.verifie_a = time.monotonic()
+                else:
+                    # Lecture en échec : nouvel essai au prochain appel
+                    AGREGATS.verifie_a = 0.0
+        else:
+            version = _version_donnees()
+            if not AGREGATS.pret or AGREGATS.version_source != version:
+                df = charger_donnees()
+                AGREGATS.reconstruire(
+                    (int(i), u, d if not pd.isna(d) else None, k)
+                    for i, u, d, k in zip(df.index, df['Utilisateur'], df['Date_dt'],
+                                          pd.to_numeric(df['Km'], errors='coerce').fillna(0.0))
+                )
+                AGREGATS.version_source = version
+    return AGREGATS
+
+def _agregats_csv_ecriture(ecriture, appliquer):
+    """Applique une écriture du journal CSV aux agrégats s'ils étaient synchronisés avec le fichier avant elle"""
+    with AGREGATS.verrou:
+        if AGREGATS.pret and AGREGATS.version_source == ('csv', ecriture.version_avant):
+            appliquer()
+            AGREGATS.version_source = ('csv', ecriture.version_apres)
+
+def _agregats_sur_ecriture(evenement, lignes):
+    """Listener des écritures Supabase : mise à jour O(1) des agrégats"""
+    with AGREGATS.verrou:
+        if not AGREGATS.pret:
+            return
+        for ligne in lignes:
+            if evenement == 'add':
+                AGREGATS.ajouter(_normalize_utilisateur(ligne.get('utilisateur', 'Oswald')),
+                                 ligne.get('date'), ligne.get('km', 0), ligne.get('id'))
+            elif evenement == 'delete' and not AGREGATS.retirer_id(ligne.get('id')):
+                # Tour inconnu des agrégats : reconstruction au prochain accès
+                AGREGATS.pret = False
+
+add_write_listener(_agregats_sur_ecriture)
+
+def _version_donnees():
+    """
+    Version des données des tours : compteur d'écritures (Supabase), version
+    partagée de la base (SQLite) ou mtime/taille du journal CSV et de ses pierres tombales
+    """
+    if USE_BASE:
+        return (STORAGE_BACKEND, get_data_version())
+    return ('csv', JOURNAL_CSV.version())
+
+def _etag(corps):
+    """ETag fort dérivé du contenu de la réponse"""
+    return hashlib.sha256(corps).hexdigest()[:32]
+
+def _reponse_json_conditionnelle(corps, etag=None):
+    """Réponse JSON avec ETag ; 304 Not Modified si If-None-Match correspond"""
+    response = app.response_class(corps, mimetype='application/json')
+    response.set_etag(etag or _etag(corps))
+    # Le navigateur doit toujours revalider (pas de réutilisation sans vérification)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def _cle_cache_tours():
+    """Clé du cache /api/tours : version des données + jour courant (stats aujourd'hui/semaine/mois)"""
+    return (_version_donnees(), datetime.date.today().isoformat())
+
+@app.route('/api/events', methods=['GET'])
+def api_events():
+    """
+    Flux Server-Sent Events : tour_added, tour_deleted, tour_updated, photo_added, entretien_changed,
+    version_changed. Reprise via l'en-tête Last-Event-ID (géré par EventSource)
+    503 si EVENTS_MAX_STREAMS flux sont déjà ouverts (les threads restants servent l'API)
+    """
+    if not acquire_stream_slot():
+        response = Response(f"retry: {EVENTS_BUSY_RETRY_MS}\n\n", status=503, mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(EVENTS_BUSY_RETRY_MS // 1000)
+        return response
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    response = Response(
+        stream_with_context(event_stream(last_event_id, str(APP_START_TIME))),
+        mimetype='text/event-stream'
+    )
+    # Place libérée à la fermeture de la réponse (fin du flux ou déconnexion du client)
+    response.call_on_close(release_stream_slot)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Pas de buffering par un proxy
+    return response
+
+@app.route('/api/tours', methods=['GET'])
+def get_tours():
+    """
+    Tours + stats + progression + challenge, servis depuis le cache tant que les données ne changent pas
+    ?tours=0 omet la liste des tours (l'historique se charge alors par pages, voir _page_tours)
+    ?user=&limit=&before_id= retourne une page de tours (pagination par ID)
+    """
+    if any(k in request.args for k in ('user', 'limit', 'before_id')):
+        return _page_tours()
+    variante = 'complet' if request.args.get('tours', '1') != '0' else 'resume'
+    entree = _entree_cache(variante)
+    return _reponse_json_conditionnelle(entree['corps'], entree['etag'])
+
+def _entree_cache(variante):
+    """
+    Entrée du cache de /api/tours pour une variante :
+    'complet' (tous les tours) ou 'resume' (stats seules, depuis les agrégats)
+    """
+    cle = _cle_cache_tours()
+    with _tours_cache_lock:
+        entree = _tours_cache.get(variante)
+    if entree and entree['cle'] == cle and time.monotonic() - entree['cree_a'] < TOURS_CACHE_MAX_AGE:
+        return entree
     
-    auj = pd.Timestamp.now().normalize()
-    def _stats(df_sub):
-        if df_sub.empty:
-            return {'total_global': 0.0, 'total_aujourdhui': 0.0, 'total_semaine': 0.0, 'total_mois': 0.0, 'total_annee': 0.0}
-        return {
-            'total_global': float(df_sub['Km'].sum()),
-            'total_aujourdhui': float(df_sub[df_sub['Date_dt'] == auj]['Km'].sum()),
-            'total_semaine': float(df_sub[df_sub['Date_dt'] >= (auj - pd.Timedelta(days=auj.dayofweek))]['Km'].sum()),
-            'total_mois': float(df_sub[df_sub['Date_dt'] >= auj.replace(day=1)]['Km'].sum()),
-            'total_annee': float(df_sub[df_sub['Date_dt'] >= auj.replace(month=1, day=1)]['Km'].sum())
+    if variante == 'complet':
+        payload = _calculer_payload_tours()
+        head = {
+            'latest_id': payload['tours'][0].get('_index') if payload['tours'] else None,
+            'count': len(payload['tours'])
         }
+    else:
+        payload = _calculer_payload_resume()
+        head = payload['head']
+    corps = jsonify(payload).get_data()
+    entree = {'cle': cle, 'cree_a': time.monotonic(), 'head': head, 'corps': corps, 'etag': _etag(corps)}
+    # Un journal vide (ou un échec de lecture Supabase) n'est pas mis en cache
+    if head['count']:
+        with _tours_cache_lock:
+            _tours_cache[variante] = entree
+    return entree
+
+def _page_tours():
+    """
+    Une page de l'historique, du plus récent au plus ancien :
+    ?user=Oswald&limit=50&before_id=123 -> {'tours', 'has_more', 'next_before_id'}
+    Le filtre utilisateur et la limite sont appliqués par Supabase (ou sur le CSV)
+    """
+    utilisateur = request.args.get('user')
+    if utilisateur:
+        utilisateur = _normalize_utilisateur(utilisateur)
+    try:
+        limit = max(1, min(TOURS_PAGE_MAX, int(request.args.get('limit', TOURS_PAGE_DEFAULT))))
+        before_id = request.args.get('before_id')
+        before_id = int(before_id) if before_id not in (None, '') else None
+    except ValueError:
+        return jsonify({'error': 'limit et before_id doivent être des entiers'}), 400
     
-    stats_global = _stats(df)
-    total_aujourdhui = stats_global['total_aujourdhui']
-    total_semaine = stats_global['total_semaine']
-    total_mois = stats_global['total_mois']
-    total_annee = stats_global['total_annee']
-    stats_oswald = _stats(df_oswald)
-    stats_titine = _stats(df_titine)
-    stats_alexandre = _stats(df_alexandre)
-    stats_damien = _stats(df_damien)
-    
-    # Étapes basées sur distances routières réelles depuis Kettenis (tous les 30 km jusqu'à 6000 km, puis tous les 500 km)
-    etapes = []
-    
-    # De 0 à 6000 km : une ville tous les 30 km
-    villes_30km = [
-        (0, "🏠 Kettenis"),
-        (30, "🇧🇪 Liège"),
-        (60, "🇳🇱 Maastricht"),
-        (90, "🇧🇪 Hasselt"),
-        (120, "🇧🇪 Leuven"),
-        (150, "🇧🇪 Bruxelles"),
-        (180, "🇧🇪 Anvers"),
-        (210, "🇧🇪 Gand"),
-        (240, "🇧🇪 Bruges"),
-        (270, "🇧🇪 Ostende"),
-        (300, "🇫🇷 Lille"),
-        (330, "🇫🇷 Arras"),
-        (360, "🇫🇷 Amiens"),
-        (390, "🇫🇷 Beauvais"),
-        (420, "🇫🇷 Paris"),
-        (450, "🇫🇷 Chartres"),
-        (480, "🇫🇷 Orléans"),
-        (510, "🇫🇷 Tours"),
-        (540, "🇫🇷 Poitiers"),
-        (570, "🇫🇷 Angoulême"),
-        (600, "🇫🇷 Bordeaux"),
-        (630, "🇫🇷 Arcachon"),
-        (660, "🇫🇷 Bayonne"),
-        (690, "🇪🇸 San Sebastian"),
-        (720, "🇪🇸 Bilbao"),
-        (750, "🇪🇸 Santander"),
-        (780, "🇪🇸 Oviedo"),
-        (810, "🇪🇸 Gijón"),
-        (840, "🇪🇸 Avilés"),
-        (870, "🇪🇸 La Coruña"),
-        (900, "🇪🇸 Vigo"),
-        (930, "🇵🇹 Porto"),
-        (960, "🇵🇹 Coimbra"),
-        (990, "🇵🇹 Leiria"),
-        (1020, "🇵🇹 Lisbonne"),
-        (1050, "🇵🇹 Setúbal"),
-        (1080, "🇵🇹 Évora"),
-        (1110, "🇪🇸 Badajoz"),
-        (1140, "🇪🇸 Mérida"),
-        (1170, "🇪🇸 Cáceres"),
-        (1200, "🇪🇸 Plasencia"),
-        (1230, "🇪🇸 Ávila"),
-        (1260, "🇪🇸 Madrid"),
-        (1290, "🇪🇸 Guadalajara"),
-        (1320, "🇪🇸 Sigüenza"),
-        (1350, "🇪🇸 Calatayud"),
-        (1380, "🇪🇸 Saragosse"),
-        (1410, "🇪🇸 Huesca"),
-        (1440, "🇪🇸 Jaca"),
-        (1470, "🇫🇷 Pau"),
-        (1500, "🇫🇷 Tarbes"),
-        (1530, "🇫🇷 Toulouse"),
-        (1560, "🇫🇷 Carcassonne"),
-        (1590, "🇫🇷 Narbonne"),
-        (1620, "🇫🇷 Montpellier"),
-        (1650, "🇫🇷 Nîmes"),
-        (1680, "🇫🇷 Avignon"),
-        (1710, "🇫🇷 Orange"),
-        (1740, "🇫🇷 Valence"),
-        (1770, "🇫🇷 Romans-sur-Isère"),
-        (1800, "🇫🇷 Grenoble"),
-        (1830, "🇫🇷 Chambéry"),
-        (1860, "🇫🇷 Annecy"),
-        (1890, "🇫🇷 Genève"),
-        (1920, "🇨🇭 Lausanne"),
-        (1950, "🇨🇭 Berne"),
-        (1980, "🇨🇭 Lucerne"),
-        (2010, "🇨🇭 Zurich"),
-        (2040, "🇨🇭 Schaffhausen"),
-        (2070, "🇩🇪 Constance"),
-        (2100, "🇩🇪 Ulm"),
-        (2130, "🇩🇪 Augsbourg"),
-        (2160, "🇩🇪 Munich"),
-        (2190, "🇩🇪 Rosenheim"),
-        (2220, "🇦🇹 Salzbourg"),
-        (2250, "🇦🇹 Linz"),
-        (2280, "🇦🇹 Vienne"),
-        (2310, "🇸🇰 Bratislava"),
-        (2340, "🇭🇺 Győr"),
-        (2370, "🇭🇺 Budapest"),
-        (2400, "🇭🇺 Székesfehérvár"),
-        (2430, "🇭🇺 Szombathely"),
-        (2460, "🇦🇹 Graz"),
-        (2490, "🇸🇮 Ljubljana"),
-        (2520, "🇭🇷 Zagreb"),
-        (2550, "🇭🇷 Karlovac"),
-        (2580, "🇭🇷 Rijeka"),
-        (2610, "🇭🇷 Pula"),
-        (2640, "🇮🇹 Trieste"),
-        (2670, "🇮🇹 Venise"),
-        (2700, "🇮🇹 Padoue"),
-        (2730, "🇮🇹 Vérone"),
-        (2760, "🇮🇹 Brescia"),
-        (2790, "🇮🇹 Milan"),
-        (2820, "🇮🇹 Pavie"),
-        (2850, "🇮🇹 Gênes"),
-        (2880, "🇮🇹 La Spezia"),
-        (2910, "🇮🇹 Pise"),
-        (2940, "🇮🇹 Florence"),
-        (2970, "🇮🇹 Arezzo"),
-        (3000, "🇮🇹 Pérouse"),
-        (3030, "🇮🇹 Terni"),
-        (3060, "🇮🇹 Rome"),
-        (3090, "🇮🇹 Latina"),
-        (3120, "🇮🇹 Naples"),
-        (3150, "🇮🇹 Salerne"),
-        (3180, "🇮🇹 Potenza"),
-        (3210, "🇮🇹 Bari"),
-        (3240, "🇮🇹 Brindisi"),
-        (3270, "🇬🇷 Igoumenitsa"),
-        (3300, "🇬🇷 Ioannina"),
-        (3330, "🇬🇷 Larissa"),
-        (3360, "🇬🇷 Lamia"),
-        (3390, "🇬🇷 Athènes"),
-        (3420, "🇬🇷 Le Pirée"),
-        (3450, "🇬🇷 Corinthe"),
-        (3480, "🇬🇷 Patras"),
-        (3510, "🇬🇷 Pyrgos"),
-        (3540, "🇬🇷 Kalamata"),
-        (3570, "🇬🇷 Sparte"),
-        (3600, "🇬🇷 Tripoli"),
-        (3630, "🇬🇷 Argos"),
-        (3660, "🇬🇷 Nauplie"),
-        (3690, "🇬🇷 Épidaure"),
-        (3720, "🇬🇷 Mycènes"),
-        (3750, "🇬🇷 Corinthe"),
-        (3780, "🇬🇷 Thèbes"),
-        (3810, "🇬🇷 Chalkida"),
-        (3840, "🇬🇷 Volos"),
-        (3870, "🇬🇷 Thessalonique"),
-        (3900, "🇬🇷 Kavala"),
-        (3930, "🇧🇬 Plovdiv"),
-        (3960, "🇧🇬 Sofia"),
-        (3990, "🇧🇬 Pernik"),
-        (4020, "🇷🇸 Niš"),
-        (4050, "🇷🇸 Belgrade"),
-        (4080, "🇷🇸 Novi Sad"),
-        (4110, "🇭🇺 Szeged"),
-        (4140, "🇭🇺 Kecskemét"),
-        (4170, "🇭🇺 Debrecen"),
-        (4200, "🇷🇴 Oradea"),
-        (4230, "🇷🇴 Cluj-Napoca"),
-        (4260, "🇷🇴 Târgu Mureș"),
-        (4290, "🇷🇴 Brașov"),
-        (4320, "🇷🇴 Bucarest"),
-        (4350, "🇷🇴 Ploiești"),
-        (4380, "🇷🇴 Pitești"),
-        (4410, "🇷🇴 Craiova"),
-        (4440, "🇷🇴 Drobeta-Turnu Severin"),
-        (4470, "🇷🇴 Timișoara"),
-        (4500, "🇷🇸 Subotica"),
-        (4530, "🇭🇺 Szeged"),
-        (4560, "🇭🇺 Békéscsaba"),
-        (4590, "🇭🇺 Arad"),
-        (4620, "🇷🇴 Arad"),
-        (4650, "🇷🇴 Deva"),
-        (4680, "🇷🇴 Alba Iulia"),
-        (4710, "🇷🇴 Sibiu"),
-        (4740, "🇷🇴 Sighișoara"),
-        (4770, "🇷🇴 Târgu Mureș"),
-        (4800, "🇷🇴 Miercurea Ciuc"),
-        (4830, "🇷🇴 Bacău"),
-        (4860, "🇷🇴 Iași"),
-        (4890, "🇲🇩 Chișinău"),
-        (4920, "🇺🇦 Odessa"),
-        (4950, "🇺🇦 Mykolaïv"),
-        (4980, "🇺🇦 Kherson"),
-        (5010, "🇺🇦 Melitopol"),
-        (5040, "🇺🇦 Marioupol"),
-        (5070, "🇺🇦 Donetsk"),
-        (5100, "🇺🇦 Luhansk"),
-        (5130, "🇷🇺 Rostov-sur-le-Don"),
-        (5160, "🇷🇺 Krasnodar"),
-        (5190, "🇷🇺 Sotchi"),
-        (5220, "🇬🇪 Batoumi"),
-        (5250, "🇬🇪 Koutaïssi"),
-        (5280, "🇬🇪 Tbilissi"),
-        (5310, "🇬🇪 Gori"),
-        (5340, "🇬🇪 Mtskheta"),
-        (5370, "🇦🇲 Erevan"),
-        (5400, "🇦🇲 Gyumri"),
-        (5430, "🇬🇪 Tbilissi"),
-        (5460, "🇦🇿 Bakou"),
-        (5490, "🇦🇿 Sumqayıt"),
-        (5520, "🇦🇿 Ganja"),
-        (5550, "🇦🇿 Şəki"),
-        (5580, "🇬🇪 Tbilissi"),
-        (5610, "🇹🇷 Trabzon"),
-        (5640, "🇹🇷 Rize"),
-        (5670, "🇹🇷 Erzurum"),
-        (5700, "🇹🇷 Kars"),
-        (5730, "🇹🇷 Ağrı"),
-        (5760, "🇹🇷 Van"),
-        (5790, "🇹🇷 Diyarbakır"),
-        (5820, "🇹🇷 Gaziantep"),
-        (5850, "🇹🇷 Adana"),
-        (5880, "🇹🇷 Mersin"),
-        (5910, "🇹🇷 Antalya"),
-        (5940, "🇹🇷 Konya"),
-        (5970, "🇹🇷 Ankara"),
-        (6000, "🇹🇷 Istanbul")
-    ]
-    
-    etapes.extend(villes_30km)
-    
-    # Au-delà de 6000 km : tour du monde (itinéraire cohérent Istanbul → Asie → Amériques → Europe)
-    # Istanbul (6000) → Turquie → Caucase → Iran → Asie centrale → Chine → Asie du Sud-Est
-    # → Océanie/Amériques → Europe. Distances cumulées depuis Kettenis.
-    villes_500km = [
-        (6500, "🇹🇷 Ankara"),
-        (7000, "🇬🇪 Tbilissi"),
-        (7500, "🇦🇿 Bakou"),
-        (8000, "🇹🇲 Achgabat"),
-        (8500, "🇺🇿 Tachkent"),
-        (9000, "🇰🇿 Almaty"),
-        (9500, "🇨🇳 Ürümqi"),
-        (10000, "🇨🇳 Lanzhou"),
-        (10500, "🇨🇳 Xi'an"),
-        (11000, "🇨🇳 Pékin"),
-        (11500, "🇰🇷 Séoul"),
-        (12000, "🇯🇵 Tokyo"),
-        (12500, "🇯🇵 Osaka"),
-        (13000, "🇹🇼 Taipei"),
-        (13500, "🇭🇰 Hong Kong"),
-        (14000, "🇻🇳 Hô Chi Minh-Ville"),
-        (14500, "🇰🇭 Phnom Penh"),
-        (15000, "🇹🇭 Bangkok"),
-        (15500, "🇲🇲 Rangoun"),
-        (16000, "🇮🇳 Calcutta"),
-        (16500, "🇮🇳 Mumbai"),
-        (17000, "🇦🇪 Dubaï"),
-        (17500, "🇸🇦 Riyad"),
-        (18000, "🇪🇬 Le Caire"),
-        (18500, "🇱🇾 Tripoli"),
-        (19000, "🇹🇳 Tunis"),
-        (19500, "🇩🇿 Alger"),
-        (20000, "🇲🇦 Casablanca"),
-        (20500, "🇪🇸 Madrid"),
-        (21000, "🇫🇷 Paris"),
-        (21500, "🇬🇧 Londres"),
-        (22000, "🇮🇸 Reykjavik"),
-        (22500, "🇨🇦 St. John's"),
-        (23000, "🇨🇦 Québec"),
-        (23500, "🇨🇦 Toronto"),
-        (24000, "🇺🇸 New York"),
-        (24500, "🇺🇸 Washington"),
-        (25000, "🇺🇸 Atlanta"),
-        (25500, "🇺🇸 Miami"),
-        (26000, "🇲🇽 Cancún"),
-        (26500, "🇲🇽 Mexico"),
-        (27000, "🇬🇹 Guatemala"),
-        (27500, "🇨🇷 San José"),
-        (28000, "🇵🇦 Panama"),
-        (28500, "🇨🇴 Bogota"),
-        (29000, "🇪🇨 Quito"),
-        (29500, "🇵🇪 Lima"),
-        (30000, "🇧🇴 La Paz"),
-        (30500, "🇦🇷 Buenos Aires"),
-        (31000, "🇺🇾 Montevideo"),
-        (31500, "🇧🇷 São Paulo"),
-        (32000, "🇧🇷 Rio de Janeiro"),
-        (32500, "🇧🇷 Salvador"),
-        (33000, "🇸🇳 Dakar"),
-        (33500, "🇪🇸 Las Palmas"),
-        (34000, "🇪🇸 Madrid"),
-        (34500, "🇫🇷 Bordeaux"),
-        (35000, "🇫🇷 Paris"),
-        (35500, "🇧🇪 Bruxelles"),
-        (36000, "🇳🇱 Amsterdam"),
-        (36500, "🇩🇪 Hambourg"),
-        (37000, "🇩🇰 Copenhague"),
-        (37500, "🇸🇪 Stockholm"),
-        (38000, "🇫🇮 Helsinki"),
-        (38500, "🇷🇺 Saint-Pétersbourg"),
-        (39000, "🇷🇺 Moscou"),
-        (39500, "🇵🇱 Varsovie"),
-        (40000, "🇩🇪 Berlin"),
-        (40075, "🌍 Weltreise!")
-    ]
+    if USE_BASE:
+        # Une ligne de plus pour savoir s'il reste une page
+        lignes = get_tours_page_db(utilisateur, limit + 1, before_id)
+        if lignes is None:
+            return jsonify({'error': 'Supabase indisponible'}), 503
+        tours = [_tour_depuis_supabase(t) for t in lignes]
+    else:
+        df = charger_donnees()
+        if utilisateur and 'Utilisateur' in df.columns:
+            df = df[df['Utilisateur'] == utilisateur]
+        if before_id is not None:
+            df = df[df.index < before_id]
+        tours = _tours_depuis_df(df.sort_index(ascending=False).head(limit + 1))
     
-    etapes.extend(villes_500km)
-
-    def _compute_progression(total_km, etapes_list):
-        """Berechnet Fortschritt für eine gegebene Gesamtstrecke in km."""
-        ville_actuelle = etapes_list[0][1]
-        km_palier_actuel = etapes_list[0][0]
-        prochaine_ville = etapes_list[1][1]
-        km_palier_suivant = etapes_list[1][0]
-        distance_kettenis = 0.0
-        for i in range(len(etapes_list)):
-            if total_km >= etapes_list[i][0]:
-                ville_actuelle = etapes_list[i][1]
-                km_palier_actuel = etapes_list[i][0]
-                if i + 1 < len(etapes_list):
-                    prochaine_ville = etapes_list[i+1][1]
-                    km_palier_suivant = etapes_list[i+1][0]
-                    distance_kettenis = float(etapes_list[i+1][0])
-        km_restants = max(0.0, km_palier_suivant - total_km)
-        diff_seg = km_palier_suivant - km_palier_actuel
-        prog_v = (total_km - km_palier_actuel) / diff_seg if diff_seg > 0 else 1.0
-        return {
-            'ville_actuelle': ville_actuelle,
-            'prochaine_ville': prochaine_ville,
-            'km_restants': float(km_restants),
-            'progression': float(prog_v),
-            'distance_kettenis': float(distance_kettenis)
+    has_more = len(tours) > limit
+    tours = tours[:limit]
+    return _reponse_json_conditionnelle(jsonify({
+        'tours': tours,
+        'has_more': has_more,
+        'next_before_id': tours[-1]['_index'] if has_more else None
+    }).get_data())
+
+@app.route('/api/tours/head', methods=['GET'])
+def get_tours_head():
+    """
+    Résumé léger pour la détection de changements (polling) : dernier ID, nombre de tours,
+    version des données et version de déploiement. Servi depuis le cache de /api/tours
+    s'il est à jour, sinon par une seule petite requête (Supabase) ou lecture du CSV
+    """
+    cle = _cle_cache_tours()
+    with _tours_cache_lock:
+        entrees = [e for e in (_tours_cache.get('resume'), _tours_cache.get('complet')) if e]
+    entree = next((e for e in entrees
+                   if e['cle'] == cle and time.monotonic() - e['cree_a'] < TOURS_CACHE_MAX_AGE), None)
+    if entree:
+        head = dict(entree['head'])
+    elif USE_BASE:
+        head = get_tours_head_db()
+        if head is None:
+            return jsonify({'error': 'Supabase indisponible'}), 503
+    else:
+        df = charger_donnees()
+        # En mode CSV, _index est l'Id stable du tour : le plus récent a le plus grand
+        head = {'latest_id': int(df.index.max()) if len(df) else None, 'count': int(len(df))}
+    # Version des données : change à chaque écriture (photo, Wetter différé, modification),
+    # pas seulement quand le nombre de tours ou le dernier ID changent
+    head['data_version'] = _etag(f"{head['latest_id']}:{head['count']}:{_version_donnees()}".encode())[:16]
+    head['app_version'] = str(APP_START_TIME)
+    return _reponse_json_conditionnelle(jsonify(head).get_data())
+
+# Export en flux (GET /api/export) : tours lus par pages de EXPORT_PAGE_SIZE
+EXPORT_PAGE_SIZE = int(os.getenv('EXPORT_PAGE_SIZE', '500'))
+
+def _tours_export(utilisateur, debut, fin):
+    """
+    Tours au format API filtrés par utilisateur et période (bornes incluses), lus page
+    par page (base) ou en flux (CSV) : la mémoire utilisée ne dépend pas de l'historique
+    """
+    def retenu(tour):
+        if debut is None and fin is None:
+            return True
+        jour = parse_date_tour(tour['Date'])
+        return jour is not None and (debut is None or jour >= debut) and (fin is None or jour <= fin)
+
+    if USE_BASE:
+        before_id = None
+        while True:
+            lignes = get_tours_page_db(utilisateur, EXPORT_PAGE_SIZE, before_id, debut, fin)
+            if lignes is None:
+                # Première page : 503 ; ensuite, export interrompu de façon visible (voir export_tours)
+                raise RuntimeError("Base indisponible pendant l'export")
+            for ligne in lignes:
+                tour = _tour_depuis_supabase(ligne)
+                if retenu(tour):
+                    yield tour
+            if len(lignes) < EXPORT_PAGE_SIZE:
+                return
+            before_id = lignes[-1]['id']
+    else:
+        # Lots parsés comme le cache du journal : mêmes valeurs que /api/tours ('N/A' -> '', types)
+        for df in JOURNAL_CSV.iterer_lots(EXPORT_PAGE_SIZE):
+            if utilisateur:
+                df = df[df['Utilisateur'] == utilisateur]
+            for tour in _tours_depuis_df(df):
+                if retenu(tour):
+                    yield tour
+
+@app.route('/api/export', methods=['GET'])
+def export_tours():
+    """
+    Export des tours en flux : ?format=csv|ndjson&user=Oswald&from=2024-01-01&to=2024-12-31
+    csv : colonnes du journal (réimportable avec migrate_to_supabase.py) ; ndjson : un tour
+    au format API (avec photos) par ligne. Envoyé par blocs de EXPORT_PAGE_SIZE tours,
+    par ID décroissant en base, dans l'ordre du fichier en mode CSV
+    """
+    format_export = request.args.get('format', 'csv').lower()
+    if format_export not in ('csv', 'ndjson'):
+        return jsonify({'error': "format doit valoir 'csv' ou 'ndjson'"}), 400
+    utilisateur = request.args.get('user')
+    if utilisateur:
+        utilisateur = _normalize_utilisateur(utilisateur)
+    try:
+        debut, fin = (datetime.date.fromisoformat(request.args[p]) if request.args.get(p) else None
+                      for p in ('from', 'to'))
+    except ValueError:
+        return jsonify({'error': 'from et to doivent être des dates AAAA-MM-JJ'}), 400
+
+    # Première page lue avant d'envoyer l'en-tête : une base indisponible donne un 503, pas un fichier vide
+    tours = _tours_export(utilisateur, debut, fin)
+    try:
+        premier = next(tours, None)
+    except Exception as e:
+        print(f"[ERROR] Export impossible: {e}")
+        return jsonify({'error': 'Lecture des tours impossible'}), 503
+
+    def blocs():
+        tampon = io.StringIO()
+        writer = csv.writer(tampon, lineterminator='\n')
+        if format_export == 'csv':
+            writer.writerow(COLONNES_EXPORT_CSV)
+        n = 0
+        try:
+            for tour in itertools.chain([premier] if premier is not None else [], tours):
+                if format_export == 'csv':
+                    writer.writerow([tour['_index'] if c == 'Id' else tour.get(c, '') for c in COLONNES_EXPORT_CSV])
+                else:
+                    tampon.write(json.dumps(tour, ensure_ascii=False) + '\n')
+                n += 1
+                if n % EXPORT_PAGE_SIZE == 0:
+                    yield tampon.getvalue()
+                    tampon.seek(0)
+                    tampon.truncate()
+        except Exception as e:
+            print(f"[ERROR] Export interrompu après {n} tours: {e}")
+            if format_export == 'csv':
+                # Pas de marqueur possible dans un CSV réimportable : la réponse est coupée
+                # (transfert chunked incomplet), le client voit une erreur
+                raise
+            # NDJSON : dernière ligne d'erreur, distincte des tours (pas de _index)
+            tampon.write(json.dumps({'error': f"Export interrompu après {n} tours"}, ensure_ascii=False) + '\n')
+        yield tampon.getvalue()
+
+    mimetype = 'text/csv' if format_export == 'csv' else 'application/x-ndjson'
+    nom = f"tours{'_' + utilisateur.lower() if utilisateur else ''}.{format_export}"
+    return Response(stream_with_context(blocs()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{nom}"'})
+
+def invalider_cache_tours():
+    """Vide le cache de /api/tours"""
+    with _tours_cache_lock:
+        _tours_cache.clear()
+
+def _payload_vide():
+    """Payload de /api/tours quand aucun tour n'est enregistré"""
+    empty_prog = {
+        'ville_actuelle': '🏠 Kettenis',
+        'prochaine_ville': '🇧🇪 Liège',
+        'km_restants': 30.0,
+        'progression': 0.0,
+        'distance_kettenis': 30.0,
+        'world_tour_pct': 0.0
+    }
+    empty_stats = {
+        'total_global': 0,
+        'total_aujourdhui': 0,
+        'total_semaine': 0,
+        'total_mois': 0,
+        'total_annee': 0
+    }
+    return {
+        'tours': [],
+        'stats': empty_stats,
+        'stats_oswald': empty_stats.copy(),
+        'stats_titine': empty_stats.copy(),
+        'stats_alexandre': empty_stats.copy(),
+        'stats_damien': empty_stats.copy(),
+        'progression': empty_prog,
+        'progression_oswald': empty_prog.copy(),
+        'progression_titine': empty_prog.copy(),
+        'progression_alexandre': empty_prog.copy(),
+        'progression_damien': empty_prog.copy(),
+        'challenge': {
+            'total_oswald': 0,
+            'total_titine': 0,
+            'total_alexandre': 0,
+            'total_damien': 0,
+            'leader': 'Unentschieden',
+            'difference': 0,
+            'world_tour_oswald': {'km': 0, 'pct': 0, 'target': TOUR_DU_MONDE_KM},
+            'world_tour_titine': {'km': 0, 'pct': 0, 'target': TOUR_DU_MONDE_KM},
+            'world_tour_alexandre': {'km': 0, 'pct': 0, 'target': TOUR_DU_MONDE_KM},
+            'world_tour_damien': {'km': 0, 'pct': 0, 'target': TOUR_DU_MONDE_KM}
         }
+    }
 
+def _payload_depuis_stats(stats_global, stats_par_utilisateur):
+    """Stats, challenge et progression de /api/tours à partir de la matrice utilisateur × période"""
+    total_global = stats_global['total_global']
+    stats_oswald = stats_par_utilisateur['Oswald']
+    stats_titine = stats_par_utilisateur['Titine']
+    stats_alexandre = stats_par_utilisateur['Alexandre']
+    stats_damien = stats_par_utilisateur['Damien']
+    
     # Calcul du Challenge Generationen-Duell (Oswald, Titine, Alexandre, Damien)
     total_oswald = stats_oswald['total_global']
     total_titine = stats_titine['total_global']
@@ -537,57 +585,15 @@ def get_tours():
         'world_tour_damien': {'km': float(total_damien), 'pct': float(pct_damien), 'target': TOUR_DU_MONDE_KM}
     }
 
-    progression_oswald = _compute_progression(total_oswald, etapes)
-    progression_titine = _compute_progression(total_titine, etapes)
-    progression_alexandre = _compute_progression(total_alexandre, etapes)
-    progression_damien = _compute_progression(total_damien, etapes)
-    progression_global = _compute_progression(total_global, etapes)
+    (progression_oswald, progression_titine, progression_alexandre,
+     progression_damien, progression_global) = calculer_progressions(
+        [total_oswald, total_titine, total_alexandre, total_damien, total_global])
     progression_oswald['world_tour_pct'] = float(pct_oswald)
     progression_titine['world_tour_pct'] = float(pct_titine)
     progression_alexandre['world_tour_pct'] = float(pct_alexandre)
     progression_damien['world_tour_pct'] = float(pct_damien)
 
-    # Convertir en format pour l'API
-    if USE_SUPABASE:
-        # Utiliser les données Supabase directement
-        tours_data = get_all_tours()
-        tours = []
-        for tour in tours_data:
-            photos = tour.get('photos')
-            if not isinstance(photos, list):
-                photos = photos if photos else []
-            tour_dict = {
-                'Date': tour.get('date', ''),
-                'Start': tour.get('start', ''),
-                'Etape': tour.get('etape', '') if tour.get('etape') else '',
-                'Ziel': tour.get('ziel', ''),
-                'Wetter': tour.get('wetter', ''),
-                'Km': float(tour.get('km', 0)),
-                'Bemerkungen': tour.get('bemerkungen', '') if tour.get('bemerkungen') else '',
-                'Utilisateur': _normalize_utilisateur(tour.get('utilisateur', 'Oswald')),
-                '_index': tour.get('id'),  # Utiliser l'ID Supabase comme index
-                'photos': photos
-            }
-            tours.append(tour_dict)
-    else:
-        # Utiliser le DataFrame (CSV)
-        df_visu = df.sort_index(ascending=False)
-        if 'Date_dt' in df_visu.columns:
-            df_visu = df_visu.drop(columns=['Date_dt'])
-        df_visu = df_visu.fillna('')
-        tours = []
-        for idx, row in df_visu.iterrows():
-            tour_dict = row.to_dict()
-            tour_dict['_index'] = int(idx)
-            if 'Utilisateur' not in tour_dict or pd.isna(tour_dict.get('Utilisateur')):
-                tour_dict['Utilisateur'] = 'Oswald'
-            else:
-                tour_dict['Utilisateur'] = _normalize_utilisateur(tour_dict['Utilisateur'])
-            tour_dict['photos'] = []  # Pas de photos en mode CSV
-            tours.append(tour_dict)
-    
-    return jsonify({
-        'tours': tours,
+    return {
         'stats': stats_global,
         'stats_oswald': stats_oswald,
         'stats_titine': stats_titine,
@@ -599,7 +605,117 @@ def get_tours():
         'progression_alexandre': progression_alexandre,
         'progression_damien': progression_damien,
         'challenge': challenge
-    })
+    }
+
+def _calculer_payload_tours():
+    """Calcule le payload complet de /api/tours (tous les tours + stats)"""
+    try:
+        df, tours_supabase = charger_donnees_et_tours()
+    except Exception as e:
+        print(f"[ERROR] Erreur lors du chargement des données: {e}")
+        # Retourner des données vides plutôt que de planter
+        df = pd.DataFrame(columns=["Date", "Start", "Etape", "Ziel", "Wetter", "Km", "Bemerkungen", "Utilisateur"])
+        tours_supabase = []
+    
+    if df.empty:
+        return _payload_vide()
+    
+    # Stats temporelles : matrice utilisateur × période calculée en une passe
+    payload = _payload_depuis_stats(*_agreger_periodes(df))
+    
+    # Convertir en format pour l'API
+    if USE_BASE:
+        # Réutiliser les lignes déjà chargées (un seul appel Supabase par requête)
+        payload['tours'] = tours_supabase
+    else:
+        # Utiliser le DataFrame (CSV)
+        payload['tours'] = _tours_depuis_df(df.sort_index(ascending=False))
+    return payload
+
+def _stats_postgres():
+    """
+    Stats calculées par Postgres (fonction ride_aggregates, une ligne par utilisateur)
+    au format de _agreger_periodes, plus le head {'latest_id', 'count'}
+    Retourne None en mode CSV ou si la fonction n'est pas installée (Supabase)
+    """
+    if not USE_BASE:
+        return None
+    lignes = get_ride_aggregates_db(datetime.date.today())
+    if lignes is None:
+        return None
+    stats_par_utilisateur = {u: dict.fromkeys(PERIODES, 0.0) for u in USERS}
+    count = 0
+    latest_id = None
+    for ligne in lignes:
+        # Plusieurs valeurs brutes (Opa, MOI, NULL...) peuvent viser le même utilisateur
+        stats = stats_par_utilisateur[_normalize_utilisateur(ligne.get('utilisateur'))]
+        for p in PERIODES:
+            stats[p] += float(ligne.get(p) or 0)
+        count += int(ligne.get('nb_tours') or 0)
+        if ligne.get('dernier_id') is not None:
+            latest_id = max(latest_id or 0, int(ligne['dernier_id']))
+    stats_global = {p: float(sum(st[p] for st in stats_par_utilisateur.values())) for p in PERIODES}
+    return stats_global, stats_par_utilisateur, {'latest_id': latest_id, 'count': count}
+
+def _calculer_payload_resume():
+    """
+    Payload de /api/tours?tours=0 (sans la liste des tours)
+    Supabase : agrégation faite par Postgres (O(utilisateurs) octets transférés) si la
+    fonction ride_aggregates est installée ; sinon agrégats incrémentaux, qui ne relisent
+    l'historique qu'au démarrage ou sur dérive
+    """
+    stats = None
+    try:
+        resultat = _stats_postgres()
+        if resultat is not None:
+            stats_global, stats_par_utilisateur, head = resultat
+            if head['count'] > 0:
+                stats = (stats_global, stats_par_utilisateur)
+        else:
+            agregats = _agregats_a_jour()
+            if agregats.count > 0:
+                stats = agregats.stats()
+                latest_id = agregats.dernier_id()
+                head = {'latest_id': latest_id, 'count': agregats.count}
+    except Exception as e:
+        print(f"[ERROR] Erreur lors du calcul des agrégats: {e}")
+        stats = None
+    if stats is None:
+        payload = _payload_vide()
+        payload.pop('tours')
+        payload['head'] = {'latest_id': None, 'count': 0}
+        return payload
+    payload = _payload_depuis_stats(*stats)
+    payload['head'] = head
+    return payload
+
+def _planifier_meteo_tour(villes, tour_id):
+    """Mode différé : résout la météo du tour en arrière-plan puis met à jour Wetter"""
+    def appliquer(meteos):
+        wetter = ' / '.join(meteos)
+        if USE_BASE:
+            if not update_tour_db(tour_id, {'Wetter': wetter}):
+                print(f"[ERROR] Météo du tour {tour_id} non enregistrée")
+                return
+            publish_event('tour_updated', {'id': tour_id})
+        else:
+            if _enregistrer_meteo_csv(tour_id, wetter) is None:
+                return
+            publish_event('tour_updated', {'id': tour_id})
+    planifier_meteo(villes, appliquer)
+
+def _enregistrer_meteo_csv(tour_id, wetter):
+    """Renseigne Wetter d'un tour CSV encore sans météo ; retourne son ID, None s'il a disparu"""
+    def en_attente(ligne):
+        return ('' if pd.isna(ligne['Wetter']) else str(ligne['Wetter']).strip()) == ''
+    
+    ecriture = JOURNAL_CSV.modifier(tour_id, {'Wetter': wetter}, condition=en_attente)
+    if ecriture is None:
+        return None
+    # Km inchangés : seuls les agrégats sont resynchronisés sur la nouvelle version du fichier
+    _agregats_csv_ecriture(ecriture, lambda: None)
+    invalider_cache_tours()
+    return ecriture.index
 
 @app.route('/api/tours', methods=['POST'])
 def add_tour():
@@ -630,8 +746,13 @@ def add_tour():
         h_ret = str(data.get('heure_arrivee', '12:30')).strip()
         notes = str(data.get('notes', '')).strip()
         
-        m_dep = obtenir_meteo(v_dep)
-        m_ret = obtenir_meteo(v_ret)
+        if METEO_DEFERRED:
+            # Enregistrement immédiat, Wetter renseigné en arrière-plan (_planifier_meteo_tour)
+            wetter = ""
+        else:
+            # Départ et arrivée en parallèle, échéance commune (voir meteo.py)
+            m_dep, m_ret = obtenir_meteos([v_dep, v_ret])
+            wetter = f"{m_dep} / {m_ret}"
         
         utilisateur = _normalize_utilisateur(data.get('utilisateur', 'Oswald'))
         
@@ -640,17 +761,20 @@ def add_tour():
             "Start": f"{v_dep} ({h_dep})",
             "Etape": f"{v_etp} ({h_etp})" if v_etp else "N/A",
             "Ziel": f"{v_ret} ({h_ret})",
-            "Wetter": f"{m_dep} / {m_ret}",
+            "Wetter": wetter,
             "Km": dist,
             "Bemerkungen": notes,
             "Utilisateur": utilisateur
         }
         
-        if USE_SUPABASE:
+        if USE_BASE:
             # Sauvegarder dans Supabase
             try:
                 success, message = add_tour_db(nouvelle_entree)
                 if success:
+                    if METEO_DEFERRED:
+                        _planifier_meteo_tour([v_dep, v_ret], message)
+                    publish_event('tour_added', {'utilisateur': utilisateur, 'km': dist, 'date': nouvelle_entree['Date']})
                     return jsonify({'success': True, 'message': 'Tour gespeichert!'})
                 else:
                     # Retourner le message d'erreur explicite
@@ -666,14 +790,13 @@ def add_tour():
         else:
             # Fallback sur CSV
             try:
-                df = charger_donnees()
-                if 'Date_dt' in df.columns:
-                    df = df.drop(columns=['Date_dt'])
-                # S'assurer que la colonne Utilisateur existe
-                if 'Utilisateur' not in df.columns:
-                    df['Utilisateur'] = 'Oswald'
-                df = pd.concat([df, pd.DataFrame([nouvelle_entree])], ignore_index=True)
-                df.to_csv(FICHIER_DATA, index=False)
+                # Ajout en fin de fichier, sans relire ni réécrire le journal
+                ecriture = JOURNAL_CSV.ajouter(nouvelle_entree)
+                _agregats_csv_ecriture(ecriture, lambda: AGREGATS.ajouter(utilisateur, date_tour, dist, ecriture.index))
+                invalider_cache_tours()
+                if METEO_DEFERRED:
+                    _planifier_meteo_tour([v_dep, v_ret], ecriture.index)
+                publish_event('tour_added', {'utilisateur': utilisateur, 'km': dist, 'date': nouvelle_entree['Date']})
                 return jsonify({'success': True, 'message': 'Tour gespeichert!'})
             except Exception as e:
                 print(f"[ERROR] Exception lors de l'enregistrement CSV: {e}")
@@ -688,12 +811,30 @@ def add_tour():
         traceback.print_exc()
         return jsonify({'success': False, 'error': f'Erreur serveur: {str(e)}'}), 500
 
+@app.route('/fichiers/<path:chemin>')
+def fichier_local(chemin):
+    """Photos et factures du backend SQLite (enregistrées sous SQLITE_FILES_DIR)"""
+    if STORAGE_BACKEND != 'sqlite':
+        return jsonify({'error': 'Introuvable'}), 404
+    from stockage_sqlite import SQLITE_FILES_DIR
+    return send_from_directory(os.path.abspath(SQLITE_FILES_DIR), chemin, max_age=31536000)
+
 MAX_PHOTO_SIZE = 5 * 1024 * 1024  # 5 Mo
+MAX_PHOTOS_PER_BATCH = 10
+
+def _refus_tour_photos(tour_id):
+    """Réponse d'erreur si le tour ne peut pas recevoir de photos (avant toute écriture dans le stockage)"""
+    existe = tour_exists_db(tour_id)
+    if existe is None:
+        return jsonify({'success': False, 'error': 'Base indisponible'}), 503
+    if not existe:
+        return jsonify({'success': False, 'error': f'Tour {tour_id} introuvable'}), 404
+    return None
 
 @app.route('/api/tours/<int:tour_id>/photos', methods=['POST'])
 def add_photo(tour_id):
-    """Envoie une photo vers Supabase et la lie au tour (Supabase uniquement)"""
-    if not USE_SUPABASE:
+    """Envoie une photo vers le stockage et la lie au tour (Supabase ou SQLite)"""
+    if not USE_BASE:
         return jsonify({'success': False, 'error': 'Photos non disponibles en mode CSV'}), 400
 
     if 'photo' not in request.files and 'file' not in request.files:
@@ -713,58 +854,128 @@ def add_photo(tour_id):
             'error': f'Image trop lourde (max 5 Mo). Taille reçue : {size // (1024 * 1024)} Mo'
         }), 400
 
+    contenu = file.read()
+    erreur = verifier_photo(contenu, file.filename, file.content_type)
+    if erreur:
+        return jsonify({'success': False, 'error': erreur}), 400
+    refus = _refus_tour_photos(tour_id)
+    if refus:
+        return refus
+
     try:
         content_type = file.content_type or 'image/jpeg'
-        success, result = upload_photo_db(tour_id, file.read(), file.filename or 'photo.jpg', content_type)
+        success, result = upload_photo_db(tour_id, contenu, file.filename or 'photo.jpg', content_type)
         if success:
-            return jsonify({'success': True, 'url': result})
+            # result : {'url', 'medium', 'thumb'} ou l'URL seule (photo stockée telle quelle)
+            url = result['url'] if isinstance(result, dict) else result
+            publish_event('photo_added', {'tour_id': tour_id, 'url': url})
+            return jsonify({'success': True, 'url': url, 'photo': result})
         return jsonify({'success': False, 'error': result}), 500
     except Exception as e:
         print(f"[ERROR] Erreur upload photo: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/tours/<int:tour_id>/photos/batch', methods=['POST'])
+def add_photos(tour_id):
+    """
+    Envoie plusieurs photos en une requête (champ multipart 'photos' répété) :
+    tout est validé avant l'envoi, les uploads sont parallèles et le tour est mis à jour une fois
+    Retourne {'success', 'results': [{'filename', 'success', 'photo' | 'error'}]}
+    """
+    if not USE_BASE:
+        return jsonify({'success': False, 'error': 'Photos non disponibles en mode CSV'}), 400
+
+    files = [f for f in request.files.getlist('photos') + request.files.getlist('photo') if f and f.filename]
+    if not files:
+        return jsonify({'success': False, 'error': 'Aucun fichier reçu'}), 400
+    if len(files) > MAX_PHOTOS_PER_BATCH:
+        return jsonify({'success': False, 'error': f'Trop de photos (max {MAX_PHOTOS_PER_BATCH} par envoi)'}), 400
+
+    # Valider tous les fichiers (taille, type, décodage) et le tour avant le moindre upload
+    refus, fichiers = [], []
+    for file in files:
+        file.seek(0, 2)
+        size = file.tell()
+        file.seek(0)
+        if size == 0:
+            refus.append({'filename': file.filename, 'success': False, 'error': 'Fichier vide'})
+        elif size > MAX_PHOTO_SIZE:
+            refus.append({'filename': file.filename, 'success': False,
+                          'error': f'Image trop lourde (max 5 Mo). Taille reçue : {size // (1024 * 1024)} Mo'})
+        else:
+            contenu = file.read()
+            erreur = verifier_photo(contenu, file.filename, file.content_type)
+            if erreur:
+                refus.append({'filename': file.filename, 'success': False, 'error': erreur})
+            fichiers.append((contenu, file.filename or 'photo.jpg', file.content_type or 'image/jpeg'))
+    if refus:
+        return jsonify({'success': False, 'error': 'Fichiers refusés', 'results': refus}), 400
+    refus = _refus_tour_photos(tour_id)
+    if refus:
+        return refus
+
+    try:
+        success, result = upload_photos_db(tour_id, fichiers)
+        if not success:
+            return jsonify({'success': False, 'error': result}), 500
+        urls = [r['photo']['url'] if isinstance(r['photo'], dict) else r['photo'] for r in result if r['success']]
+        if urls:
+            # Un seul événement pour tout l'envoi (chaque événement recharge les tours côté client)
+            publish_event('photo_added', {'tour_id': tour_id, 'url': urls[0], 'urls': urls})
+        return jsonify({'success': len(urls) == len(result), 'results': result})
+    except Exception as e:
+        print(f"[ERROR] Erreur upload photos: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/tours/<int:tour_id>', methods=['DELETE'])
 def delete_tour(tour_id):
-    if USE_SUPABASE:
+    if USE_BASE:
         # Supprimer depuis Supabase (tour_id est l'ID Supabase)
         success = delete_tour_db(tour_id)
         if success:
+            publish_event('tour_deleted', {'id': tour_id})
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'Erreur lors de la suppression'}), 500
     else:
-        # Fallback sur CSV (tour_id est l'index du DataFrame)
-        df = charger_donnees()
-        if tour_id < len(df):
-            df = df.drop(tour_id)
-            if 'Date_dt' in df.columns:
-                df = df.drop(columns=['Date_dt'])
-            df.to_csv(FICHIER_DATA, index=False)
-            return jsonify({'success': True})
-        return jsonify({'success': False, 'error': 'Index invalide'}), 400
+        # Fallback sur CSV (tour_id est l'Id stable de la ligne) : pierre tombale, pas de réécriture
+        ecriture = JOURNAL_CSV.supprimer(tour_id)
+        if ecriture is None:
+            return jsonify({'success': False, 'error': 'Index invalide'}), 400
+        def retirer():
+            if not AGREGATS.retirer_id(tour_id):
+                AGREGATS.pret = False
+        _agregats_csv_ecriture(ecriture, retirer)
+        invalider_cache_tours()
+        publish_event('tour_deleted', {'id': tour_id})
+        return jsonify({'success': True})
 
 
 # --- Entretien (Garage) ---
 
 @app.route('/api/entretien', methods=['GET'])
 def get_entretien():
-    """Récupère tous les vélos en entretien + km_from_tours par utilisateur (Supabase uniquement)"""
-    if not USE_SUPABASE:
+    """Récupère tous les vélos en entretien + km_from_tours par utilisateur (Supabase ou SQLite)"""
+    if not USE_BASE:
         return jsonify({'bikes': [], 'km_from_tours': {}})
     try:
         bikes = get_all_entretien()
         # Sync km: total des sorties par utilisateur
         km_from_tours = {'Oswald': 0, 'Titine': 0, 'Alexandre': 0, 'Damien': 0}
         try:
-            df = charger_donnees()
-            if not df.empty and 'Km' in df.columns and 'Utilisateur' in df.columns:
-                for u in ['Oswald', 'Titine', 'Alexandre', 'Damien']:
-                    subset = df[df['Utilisateur'] == u]
-                    km_from_tours[u] = float(subset['Km'].sum()) if not subset.empty else 0
+            # Totaux calculés par Postgres, sinon agrégats incrémentaux : pas de relecture de l'historique
+            resultat = _stats_postgres()
+            if resultat is not None:
+                totaux = {u: st['total_global'] for u, st in resultat[1].items()}
+            else:
+                totaux = _agregats_a_jour().totaux()
+            for u, total in totaux.items():
+                km_from_tours[u] = total if total else 0
         except Exception:
             pass
-        return jsonify({'bikes': bikes, 'km_from_tours': km_from_tours})
+        return _reponse_json_conditionnelle(jsonify({'bikes': bikes, 'km_from_tours': km_from_tours}).get_data())
     except Exception as e:
         print(f"[ERROR] get_entretien: {e}")
         return jsonify({'bikes': [], 'km_from_tours': {}})
@@ -773,12 +984,13 @@ def get_entretien():
 @app.route('/api/entretien', methods=['POST'])
 def post_entretien():
     """Ajoute un nouveau vélo"""
-    if not USE_SUPABASE:
-        return jsonify({'success': False, 'error': 'Entretien nur mit Supabase'}), 400
+    if not USE_BASE:
+        return jsonify({'success': False, 'error': 'Entretien nur mit Datenbank (Supabase oder SQLite)'}), 400
     try:
         data = request.get_json() or {}
         success, result = add_entretien_db(data)
         if success:
+            publish_event('entretien_changed', {'id': result})
             return jsonify({'success': True, 'id': result})
         return jsonify({'success': False, 'error': str(result)}), 400
     except Exception as e:
@@ -789,11 +1001,12 @@ def post_entretien():
 @app.route('/api/entretien/<int:bike_id>', methods=['PUT'])
 def put_entretien(bike_id):
     """Met à jour un vélo"""
-    if not USE_SUPABASE:
-        return jsonify({'success': False, 'error': 'Entretien nur mit Supabase'}), 400
+    if not USE_BASE:
+        return jsonify({'success': False, 'error': 'Entretien nur mit Datenbank (Supabase oder SQLite)'}), 400
     try:
         data = request.get_json() or {}
         if update_entretien_db(bike_id, data):
+            publish_event('entretien_changed', {'id': bike_id})
             return jsonify({'success': True})
         return jsonify({'success': False, 'error': 'Update fehlgeschlagen'}), 400
     except Exception as e:
@@ -804,10 +1017,11 @@ def put_entretien(bike_id):
 @app.route('/api/entretien/<int:bike_id>', methods=['DELETE'])
 def delete_entretien_route(bike_id):
     """Supprime un vélo"""
-    if not USE_SUPABASE:
-        return jsonify({'success': False, 'error': 'Entretien nur mit Supabase'}), 400
+    if not USE_BASE:
+        return jsonify({'success': False, 'error': 'Entretien nur mit Datenbank (Supabase oder SQLite)'}), 400
     try:
         if delete_entretien_db(bike_id):
+            publish_event('entretien_changed', {'id': bike_id, 'deleted': True})
             return jsonify({'success': True})
         return jsonify({'success': False, 'error': 'Löschen fehlgeschlagen'}), 400
     except Exception as e:
@@ -818,8 +1032,8 @@ def delete_entretien_route(bike_id):
 @app.route('/api/entretien/<int:bike_id>/upload', methods=['POST'])
 def upload_entretien_photo(bike_id):
     """Upload photo vélo ou facture. field=photo_velo|facture en form-data"""
-    if not USE_SUPABASE:
-        return jsonify({'success': False, 'error': 'Entretien nur mit Supabase'}), 400
+    if not USE_BASE:
+        return jsonify({'success': False, 'error': 'Entretien nur mit Datenbank (Supabase oder SQLite)'}), 400
     if 'photo' not in request.files and 'file' not in request.files:
         return jsonify({'success': False, 'error': 'Aucun fichier'}), 400
     file = request.files.get('photo') or request.files.get('file')
@@ -840,6 +1054,7 @@ def upload_entretien_photo(bike_id):
         content_type = file.content_type or 'image/jpeg'
         success, result = upload_entretien_file_db(bike_id, file.read(), file.filename or 'photo.jpg', content_type, field)
         if success:
+            publish_event('entretien_changed', {'id': bike_id, 'field': field})
             return jsonify({'success': True, 'url': result})
         return jsonify({'success': False, 'error': result}), 500
     except Exception as e:
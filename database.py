@@ -1,10 +1,17 @@
 """
 Module pour gérer la connexion à Supabase
 """
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
+from postgrest import ReturnMethod
+import httpx
 import os
+import threading
+import time
 import uuid
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from images import preparer_photo
+from utilisateurs import MOTIFS_UTILISATEUR, normaliser_utilisateur
+from datetime import date, datetime, timezone
 from typing import List, Dict, Optional, Tuple
 
 TABLE_NAME = 'rides'
@@ -13,6 +20,40 @@ ENTRETIEN_TABLE = 'entretien'
 ENTRETIEN_BUCKET = 'entretien_velo'
 DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
 
+# Client Supabase partagé par worker (pool de connexions keep-alive)
+SUPABASE_POOL_SIZE = int(os.getenv('SUPABASE_POOL_SIZE', '10'))
+SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', '10'))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv('SUPABASE_CONNECT_TIMEOUT', '5'))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv('SUPABASE_KEEPALIVE_EXPIRY', '30'))
+# Uploads simultanés vers Storage pour un envoi de plusieurs photos
+PHOTO_UPLOAD_WORKERS = int(os.getenv('PHOTO_UPLOAD_WORKERS', '4'))
+# Lignes par requête lors de la synchronisation de la réplique locale (limite PostgREST : 1000)
+SYNC_PAGE_SIZE = int(os.getenv('SYNC_PAGE_SIZE', '1000'))
+
+_client: Optional[Client] = None
+_client_pid: Optional[int] = None
+_http_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+# Vérification du schéma (tables rides/entretien, colonnes photos/utilisateur/ride_date)
+SCHEMA_CACHE_TTL = int(os.getenv('SCHEMA_CACHE_TTL', '3600'))
+
+_schema_state: Optional[Dict[str, bool]] = None
+_schema_checked_at = 0.0
+_schema_lock = threading.Lock()
+
+# Version des données des tours : incrémentée à chaque écriture réussie de ce worker
+# (et par la réplique locale quand elle reçoit des changements, voir replique.py)
+_data_version = 0
+_data_version_lock = threading.Lock()
+_write_listeners = []
+
+# Fonctions Postgres optionnelles (migrations supabase_migration_*.sql)
+AGGREGATES_RPC = 'ride_aggregates'          # supabase_migration_stats.sql
+APPEND_PHOTOS_RPC = 'append_ride_photos'    # supabase_migration_append_photo.sql
+# Fonction -> instant où elle a été trouvée absente (revérifiée après SCHEMA_CACHE_TTL)
+_rpc_missing_at: Dict[str, float] = {}
+
 def log_debug(message: str):
     """Log uniquement si DEBUG est activé"""
     if DEBUG:
@@ -22,11 +63,27 @@ def log_error(message: str):
     """Log les erreurs toujours"""
     print(f"[ERROR] {message}")
 
-def get_supabase_client() -> Optional[Client]:
+def _build_http_client() -> httpx.Client:
     """
-    Crée et retourne un client Supabase
+    Construit le client HTTP partagé (keep-alive + pool de connexions)
+    utilisé par PostgREST et Storage
+    """
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=SUPABASE_POOL_SIZE,
+            max_keepalive_connections=SUPABASE_POOL_SIZE,
+            keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT),
+        follow_redirects=True,
+    )
+
+def _build_supabase_client() -> Optional[Client]:
+    """
+    Crée un nouveau client Supabase
     Retourne None si les variables d'environnement ne sont pas configurées
     """
+    global _http_client
     supabase_url = os.getenv('SUPABASE_URL')
     supabase_key = os.getenv('SUPABASE_KEY')
     
@@ -46,8 +103,15 @@ def get_supabase_client() -> Optional[Client]:
         return None
     
     try:
-        log_debug("Création du client Supabase...")
-        client = create_client(supabase_url, supabase_key)
+        log_debug(f"Création du client Supabase (pool={SUPABASE_POOL_SIZE}, timeout={SUPABASE_TIMEOUT}s)...")
+        http_client = _build_http_client()
+        options = ClientOptions(
+            httpx_client=http_client,
+            postgrest_client_timeout=SUPABASE_TIMEOUT,
+            storage_client_timeout=int(SUPABASE_TIMEOUT),
+        )
+        client = create_client(supabase_url, supabase_key, options=options)
+        _http_client = http_client
         log_debug("Client Supabase créé avec succès")
         return client
     except Exception as e:
@@ -58,6 +122,47 @@ def get_supabase_client() -> Optional[Client]:
             traceback.print_exc()
         return None
 
+def get_supabase_client() -> Optional[Client]:
+    """
+    Retourne le client Supabase partagé du worker (créé à la première utilisation)
+    Le client est reconstruit automatiquement si le processus a été forké
+    Retourne None si les variables d'environnement ne sont pas configurées
+    """
+    global _client, _client_pid
+    client = _client
+    if client is not None and _client_pid == os.getpid():
+        return client
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            return _client
+        if _client_pid is not None and _client_pid != os.getpid():
+            # Processus forké : ne pas réutiliser les sockets du parent
+            _drop_client(close=False)
+        _client = _build_supabase_client()
+        _client_pid = os.getpid() if _client is not None else None
+        return _client
+
+def _drop_client(close: bool):
+    """Oublie le client courant (à appeler avec _client_lock détenu)"""
+    global _client, _client_pid, _http_client
+    if close and _http_client is not None:
+        try:
+            _http_client.close()
+        except Exception as e:
+            log_error(f"Erreur lors de la fermeture du client HTTP: {e}")
+    _client = None
+    _client_pid = None
+    _http_client = None
+
+def reset_supabase_client(close: bool = True):
+    """
+    Réinitialise le client partagé ; le prochain appel en recrée un
+    À appeler avec close=False après un fork (hook post_fork de gunicorn) :
+    les connexions héritées appartiennent au processus parent
+    """
+    with _client_lock:
+        _drop_client(close=close)
+
 def create_table_if_not_exists():
     """
     Crée la table 'rides' dans Supabase si elle n'existe pas
@@ -102,39 +207,127 @@ def create_table_if_not_exists():
         print(f"Erreur lors de la vérification/création de la table: {e}")
         return False
 
-def ensure_table_exists():
-    """
-    S'assure que la table existe, sinon tente de la créer via une requête SQL directe
-    """
-    client = get_supabase_client()
-    if not client:
-        return False
-    
-    # Utiliser l'API REST pour exécuter du SQL
-    # Note: Cela nécessite la clé service_role, pas la clé anon
-    # Pour une solution plus simple, on vérifie juste si on peut lire la table
+def _print_rides_table_instructions():
+    """Affiche le SQL de création de la table rides"""
+    print(f"\n⚠️  ATTENTION: La table '{TABLE_NAME}' n'existe pas dans Supabase!")
+    print(f"   Veuillez créer la table en exécutant ce SQL dans Supabase SQL Editor:\n")
+    print(f"   CREATE TABLE {TABLE_NAME} (")
+    print(f"       id SERIAL PRIMARY KEY,")
+    print(f"       date VARCHAR(10) NOT NULL,")
+    print(f"       ride_date DATE,")
+    print(f"       start VARCHAR(255) NOT NULL,")
+    print(f"       etape VARCHAR(255),")
+    print(f"       ziel VARCHAR(255) NOT NULL,")
+    print(f"       wetter VARCHAR(255),")
+    print(f"       km DECIMAL(10, 1) NOT NULL,")
+    print(f"       bemerkungen TEXT,")
+    print(f"       created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()")
+    print(f"   );")
+    print(f"\n   Ou utilisez le fichier supabase_setup.sql\n")
+
+def is_missing_schema_error(error) -> bool:
+    """True si l'erreur Supabase signale une table ou une colonne inexistante"""
+    error_msg = str(error).lower()
+    if 'does not exist' in error_msg and ('relation' in error_msg or 'column' in error_msg):
+        return True
+    # Messages PostgREST (cache de schéma) : PGRST204 / PGRST205
+    return 'could not find the' in error_msg or 'pgrst204' in error_msg or 'pgrst205' in error_msg
+
+def _probe(client, table: str, columns: str) -> bool:
+    """Vérifie qu'une table (et des colonnes) existe en lisant au plus une ligne"""
     try:
-        client.table(TABLE_NAME).select('id').limit(1).execute()
+        client.table(table).select(columns).limit(1).execute()
         return True
     except Exception as e:
-        # Si l'erreur indique que la table n'existe pas, on affiche les instructions
-        error_msg = str(e).lower()
-        if 'relation' in error_msg and 'does not exist' in error_msg:
-            print(f"\n⚠️  ATTENTION: La table '{TABLE_NAME}' n'existe pas dans Supabase!")
-            print(f"   Veuillez créer la table en exécutant ce SQL dans Supabase SQL Editor:\n")
-            print(f"   CREATE TABLE {TABLE_NAME} (")
-            print(f"       id SERIAL PRIMARY KEY,")
-            print(f"       date VARCHAR(10) NOT NULL,")
-            print(f"       start VARCHAR(255) NOT NULL,")
-            print(f"       etape VARCHAR(255),")
-            print(f"       ziel VARCHAR(255) NOT NULL,")
-            print(f"       wetter VARCHAR(255),")
-            print(f"       km DECIMAL(10, 1) NOT NULL,")
-            print(f"       bemerkungen TEXT,")
-            print(f"       created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()")
-            print(f"   );")
-            print(f"\n   Ou utilisez le fichier supabase_setup.sql\n")
-        return False
+        if is_missing_schema_error(e):
+            return False
+        raise
+
+def check_schema(force: bool = False) -> Dict[str, bool]:
+    """
+    Retourne l'état du schéma Supabase, mis en cache pendant SCHEMA_CACHE_TTL secondes :
+    {'rides': bool, 'entretien': bool, 'photos': bool, 'utilisateur': bool, 'ride_date': bool,
+     'updated_at': bool, 'import_key': bool}
+    Un état où la table rides manque n'est pas mis en cache (revérifié au prochain appel) ;
+    si la vérification échoue (réseau), retourne le dernier état connu ou, à défaut,
+    toutes les colonnes présentes
+    """
+    global _schema_state, _schema_checked_at
+    state = _schema_state
+    if not force and state is not None and time.monotonic() - _schema_checked_at < SCHEMA_CACHE_TTL:
+        return state
+    with _schema_lock:
+        if not force and _schema_state is not None and time.monotonic() - _schema_checked_at < SCHEMA_CACHE_TTL:
+            return _schema_state
+        state = {'rides': False, 'entretien': False, 'photos': False, 'utilisateur': False, 'ride_date': False,
+                 'updated_at': False, 'import_key': False}
+        client = get_supabase_client()
+        if not client:
+            return state
+        try:
+            state['rides'] = _probe(client, TABLE_NAME, 'id')
+            if state['rides']:
+                state['photos'] = _probe(client, TABLE_NAME, 'photos')
+                state['utilisateur'] = _probe(client, TABLE_NAME, 'utilisateur')
+                state['ride_date'] = _probe(client, TABLE_NAME, 'ride_date')
+                state['updated_at'] = _probe(client, TABLE_NAME, 'updated_at')
+                state['import_key'] = _probe(client, TABLE_NAME, 'import_key')
+            state['entretien'] = _probe(client, ENTRETIEN_TABLE, 'id')
+        except Exception as e:
+            # Erreur réseau/authentification : rien n'est conclu sur le schéma (pas de cache).
+            # Dernier état connu, sinon colonnes supposées présentes : une écriture ne doit
+            # jamais perdre une colonne (utilisateur, ride_date...) à cause d'un timeout
+            log_error(f"Erreur lors de la vérification du schéma: {e}")
+            if _schema_state is not None:
+                return _schema_state
+            return dict.fromkeys(state, True)
+        log_debug(f"Schéma Supabase: {state}")
+        if state['rides']:
+            _schema_state = state
+            _schema_checked_at = time.monotonic()
+        else:
+            _print_rides_table_instructions()
+            _schema_state = None
+        return state
+
+def invalidate_schema_cache():
+    """Oublie l'état du schéma (après une erreur 'relation/column does not exist')"""
+    global _schema_state
+    with _schema_lock:
+        _schema_state = None
+
+def ensure_table_exists():
+    """
+    S'assure que la table existe (vérification mise en cache, voir check_schema)
+    """
+    return check_schema()['rides']
+
+def get_data_version() -> int:
+    """Retourne la version courante des données des tours (sert de clé de cache)"""
+    return _data_version
+
+def bump_data_version() -> int:
+    """Signale une écriture sur les tours (ajout, suppression, photo)"""
+    global _data_version
+    with _data_version_lock:
+        _data_version += 1
+        return _data_version
+
+def add_write_listener(listener):
+    """
+    Enregistre listener(event, rows) appelé après chaque écriture réussie sur les tours
+    event : 'add', 'update' ou 'delete' ; rows : lignes Supabase concernées
+    (pour un ajout de photos : {'id', 'photos'} seulement)
+    """
+    _write_listeners.append(listener)
+
+def _notify_write(event: str, rows: List[Dict]):
+    """Prévient les listeners ; une erreur d'un listener ne fait pas échouer l'écriture"""
+    for listener in _write_listeners:
+        try:
+            listener(event, rows)
+        except Exception as e:
+            log_error(f"Erreur listener d'écriture ({event}): {e}")
 
 def get_all_tours() -> List[Dict]:
     """Récupère tous les tours depuis Supabase"""
@@ -161,10 +354,203 @@ def get_all_tours() -> List[Dict]:
         log_error(f"Exception dans get_all_tours: {e}")
         return []
 
-def add_tour(tour_data: Dict) -> tuple[bool, str]:
+def _filter_utilisateur(query, utilisateur: str):
+    """
+    Applique côté Supabase le filtre sur un utilisateur normalisé : mêmes valeurs que
+    normaliser_utilisateur (espaces, casse de MOI), toute valeur inconnue ou NULL allant à Oswald
+    """
+    if utilisateur in MOTIFS_UTILISATEUR:
+        return query.filter('utilisateur', 'match', MOTIFS_UTILISATEUR[utilisateur])
+    autres = ','.join(f'utilisateur.not.match."{motif}"' for motif in MOTIFS_UTILISATEUR.values())
+    return query.or_(f'utilisateur.is.null,and({autres})')
+
+def get_tours_page(utilisateur: Optional[str] = None, limit: int = 50, before_id: Optional[int] = None,
+                   date_from: Optional[date] = None, date_to: Optional[date] = None) -> Optional[List[Dict]]:
+    """
+    Récupère une page de tours par ID décroissant (pagination par clé : id < before_id)
+    Les filtres utilisateur et période (bornes incluses, sur ride_date) sont appliqués par
+    Supabase ; sans colonne ride_date, la période n'est pas filtrée (à refaire par l'appelant)
+    Retourne None en cas d'erreur
+    """
+    client = get_supabase_client()
+    if not client:
+        return None
+    try:
+        query = client.table(TABLE_NAME).select('*')
+        if utilisateur:
+            query = _filter_utilisateur(query, utilisateur)
+        if before_id is not None:
+            query = query.lt('id', before_id)
+        if (date_from or date_to) and check_schema()['ride_date']:
+            if date_from:
+                query = query.gte('ride_date', date_from.isoformat())
+            if date_to:
+                query = query.lte('ride_date', date_to.isoformat())
+        response = query.order('id', desc=True).limit(limit).execute()
+        return response.data if response.data else []
+    except Exception as e:
+        if is_missing_schema_error(e):
+            return []
+        log_error(f"Erreur get_tours_page: {e}")
+        return None
+
+def get_tours_head() -> Optional[Dict]:
+    """
+    Résumé léger de la table des tours : {'latest_id': int|None, 'count': int}
+    Une seule requête (dernière ligne + count exact) au lieu du téléchargement complet
+    Retourne None en cas d'erreur
+    """
+    client = get_supabase_client()
+    if not client:
+        return None
+    try:
+        response = client.table(TABLE_NAME).select('id', count='exact').order('id', desc=True).limit(1).execute()
+        latest_id = response.data[0].get('id') if response.data else None
+        return {'latest_id': latest_id, 'count': response.count or 0}
+    except Exception as e:
+        if is_missing_schema_error(e):
+            return {'latest_id': None, 'count': 0}
+        log_error(f"Erreur get_tours_head: {e}")
+        return None
+
+def tour_exists(tour_id: int) -> Optional[bool]:
+    """True si le tour existe, None en cas d'erreur (à vérifier avant d'envoyer des fichiers)"""
+    client = get_supabase_client()
+    if not client:
+        return None
+    try:
+        response = client.table(TABLE_NAME).select('id').eq('id', tour_id).limit(1).execute()
+        return bool(response.data)
+    except Exception as e:
+        log_error(f"Erreur tour_exists({tour_id}): {e}")
+        return None
+
+def get_rows_since(table: str, after_id: Optional[int] = None, updated_after: Optional[str] = None) -> Optional[List[Dict]]:
+    """
+    Lignes d'une table par ID croissant, paginées par clé (SYNC_PAGE_SIZE lignes par requête)
+    Avec after_id (et updated_after si la table a une colonne updated_at) : seulement les
+    lignes créées après after_id ou modifiées après updated_after (synchronisation incrémentale)
+    Retourne None en cas d'erreur, pour la distinguer d'une table vide
+    """
+    client = get_supabase_client()
+    if not client:
+        return None
+    rows = []
+    cursor = None
+    try:
+        while True:
+            query = client.table(table).select('*')
+            if after_id is not None and updated_after:
+                query = query.or_(f'id.gt.{after_id},updated_at.gt."{updated_after}"')
+            elif after_id is not None:
+                query = query.gt('id', after_id)
+            if cursor is not None:
+                query = query.gt('id', cursor)
+            page = query.order('id').limit(SYNC_PAGE_SIZE).execute().data or []
+            rows.extend(page)
+            if len(page) < SYNC_PAGE_SIZE:
+                return rows
+            cursor = page[-1]['id']
+    except Exception as e:
+        if is_missing_schema_error(e):
+            invalidate_schema_cache()
+        log_error(f"Erreur get_rows_since({table}): {e}")
+        return None
+
+def _rpc_available(name: str) -> bool:
+    """False si la fonction Postgres a été trouvée absente il y a moins de SCHEMA_CACHE_TTL"""
+    missing_at = _rpc_missing_at.get(name)
+    return missing_at is None or time.monotonic() - missing_at >= SCHEMA_CACHE_TTL
+
+def _mark_rpc_missing(name: str, migration: str):
+    log_debug(f"Fonction {name} absente : exécutez {migration}")
+    _rpc_missing_at[name] = time.monotonic()
+
+def get_ride_aggregates(today: Optional[date] = None) -> Optional[List[Dict]]:
+    """
+    Totaux de km calculés par Postgres (fonction ride_aggregates) : une ligne par valeur
+    de rides.utilisateur avec total_global, total_aujourdhui, total_semaine, total_mois,
+    total_annee, nb_tours et dernier_id
+    Retourne None si la fonction n'est pas installée (revérifié après SCHEMA_CACHE_TTL)
+    ou en cas d'erreur : l'appelant calcule alors les stats lui-même
+    """
+    if not _rpc_available(AGGREGATES_RPC):
+        return None
+    client = get_supabase_client()
+    if not client:
+        return None
+    today = today or date.today()
+    try:
+        response = client.rpc(AGGREGATES_RPC, {'p_today': today.isoformat()}).execute()
+        return response.data if response.data else []
+    except Exception as e:
+        if is_missing_schema_error(e):
+            _mark_rpc_missing(AGGREGATES_RPC, 'supabase_migration_stats.sql')
+            return None
+        log_error(f"Erreur get_ride_aggregates: {e}")
+        return None
+
+def build_ride_row(tour_data: Dict, schema: Dict[str, bool]) -> Dict:
+    """
+    Ligne de la table rides à partir d'un tour au format CSV (Date, Start, Etape, Ziel,
+    Wetter, Km, Bemerkungen, Utilisateur), selon les colonnes présentes dans `schema`
+    """
+    # Conversion et validation des types de données SQL
+    date_str = str(tour_data.get('Date', '')).strip()
+    start_str = str(tour_data.get('Start', '')).strip()
+    ziel_str = str(tour_data.get('Ziel', '')).strip()
+    km_value = tour_data.get('Km', 0)
+
+    # Convertir km en float (DECIMAL en SQL)
+    try:
+        km_float = float(km_value) if km_value else 0.0
+    except (ValueError, TypeError):
+        km_float = 0.0
+
+    # Préparer les données avec les noms de colonnes EXACTS (minuscules)
+    utilisateur = normaliser_utilisateur(tour_data.get('Utilisateur'))
+
+    supabase_data = {
+        'date': date_str,  # VARCHAR(10) NOT NULL
+        'start': start_str,  # VARCHAR(255) NOT NULL
+        'ziel': ziel_str,  # VARCHAR(255) NOT NULL
+        'km': km_float,  # DECIMAL(10, 1) NOT NULL - converti en float
+        'utilisateur': utilisateur,  # Oswald, Alexandre ou Damien
+        # Champs optionnels (peuvent être NULL)
+        'etape': None,
+        'wetter': None,
+        'bemerkungen': None
+    }
+
+    # Gérer les champs optionnels
+    etape_val = tour_data.get('Etape', '')
+    if etape_val and etape_val != 'N/A' and str(etape_val).strip():
+        supabase_data['etape'] = str(etape_val).strip()
+
+    wetter_val = tour_data.get('Wetter', '')
+    if wetter_val and str(wetter_val).strip():
+        supabase_data['wetter'] = str(wetter_val).strip()
+
+    bemerkungen_val = tour_data.get('Bemerkungen', '')
+    if bemerkungen_val and str(bemerkungen_val).strip():
+        supabase_data['bemerkungen'] = str(bemerkungen_val).strip()
+
+    # Date typée (voir supabase_migration_ride_date.sql) : écrite en plus de 'date' pendant la transition
+    if schema['ride_date']:
+        try:
+            supabase_data['ride_date'] = datetime.strptime(date_str, '%d/%m/%Y').date().isoformat()
+        except ValueError:
+            supabase_data['ride_date'] = None
+
+    # Ancien schéma sans colonne utilisateur (voir supabase_migration_utilisateur.sql)
+    if not schema['utilisateur']:
+        supabase_data.pop('utilisateur')
+    return supabase_data
+
+def add_tour(tour_data: Dict) -> Tuple[bool, any]:
     """
     Ajoute un nouveau tour dans Supabase
-    Retourne (success: bool, message: str)
+    Retourne (success, id du tour ou message d'erreur)
     """
     log_debug("===== DÉBUT add_tour =====")
     log_debug(f"Données reçues: {tour_data}")
@@ -176,8 +562,9 @@ def add_tour(tour_data: Dict) -> tuple[bool, str]:
         return False, error_msg
     
     # Vérifier que la table existe
-    log_debug(f"Vérification de l'existence de la table '{TABLE_NAME}'...")
-    if not ensure_table_exists():
+    log_debug(f"Vérification de l'existence de la table '{TABLE_NAME}' (cache)...")
+    schema = check_schema()
+    if not schema['rides']:
         error_msg = f"La table '{TABLE_NAME}' n'existe pas dans Supabase. Veuillez l'exécuter dans SQL Editor."
         log_error(error_msg)
         return False, error_msg
@@ -187,48 +574,9 @@ def add_tour(tour_data: Dict) -> tuple[bool, str]:
         # Préparer les données pour Supabase - ALIGNEMENT EXACT avec les colonnes de la table
         # Colonnes Supabase: date, start, etape, ziel, wetter, km, bemerkungen (toutes en minuscules)
         log_debug("Préparation des données pour Supabase...")
-        
-        # Conversion et validation des types de données SQL
-        date_str = str(tour_data.get('Date', '')).strip()
-        start_str = str(tour_data.get('Start', '')).strip()
-        ziel_str = str(tour_data.get('Ziel', '')).strip()
-        km_value = tour_data.get('Km', 0)
-        
-        # Convertir km en float (DECIMAL en SQL)
-        try:
-            km_float = float(km_value) if km_value else 0.0
-        except (ValueError, TypeError):
-            km_float = 0.0
-        
-        # Préparer les données avec les noms de colonnes EXACTS (minuscules)
-        utilisateur = str(tour_data.get('Utilisateur', 'Oswald')).strip()
-        if utilisateur not in ('Oswald', 'Titine', 'Alexandre', 'Damien'):
-            utilisateur = 'Damien' if utilisateur.upper() == 'MOI' else 'Oswald'
-        
-        supabase_data = {
-            'date': date_str,  # VARCHAR(10) NOT NULL
-            'start': start_str,  # VARCHAR(255) NOT NULL
-            'ziel': ziel_str,  # VARCHAR(255) NOT NULL
-            'km': km_float,  # DECIMAL(10, 1) NOT NULL - converti en float
-            'utilisateur': utilisateur,  # Oswald, Alexandre ou Damien
-            # Champs optionnels (peuvent être NULL)
-            'etape': None,
-            'wetter': None,
-            'bemerkungen': None
-        }
-        
-        # Gérer les champs optionnels
-        etape_val = tour_data.get('Etape', '')
-        if etape_val and etape_val != 'N/A' and str(etape_val).strip():
-            supabase_data['etape'] = str(etape_val).strip()
-        
-        wetter_val = tour_data.get('Wetter', '')
-        if wetter_val and str(wetter_val).strip():
-            supabase_data['wetter'] = str(wetter_val).strip()
-        
-        bemerkungen_val = tour_data.get('Bemerkungen', '')
-        if bemerkungen_val and str(bemerkungen_val).strip():
-            supabase_data['bemerkungen'] = str(bemerkungen_val).strip()
+        supabase_data = build_ride_row(tour_data, schema)
+        if not schema['utilisateur']:
+            log_debug("Colonne 'utilisateur' absente, champ ignoré")
         
         # Log des données préparées
         log_debug("Données préparées pour Supabase (colonnes en minuscules):")
@@ -261,7 +609,9 @@ def add_tour(tour_data: Dict) -> tuple[bool, str]:
         if response.data:
             tour_id = response.data[0].get('id', 'N/A') if response.data else 'N/A'
             log_debug(f"Tour enregistré avec succès. ID: {tour_id}")
-            return True, "Tour enregistré avec succès"
+            bump_data_version()
+            _notify_write('add', response.data)
+            return True, response.data[0].get('id')
         else:
             error_msg = "Aucune donnée retournée par Supabase"
             log_error(error_msg)
@@ -284,6 +634,9 @@ def add_tour(tour_data: Dict) -> tuple[bool, str]:
             traceback.print_exc()
         log_error("===========================================")
         
+        if is_missing_schema_error(error_msg):
+            invalidate_schema_cache()
+        
         # Messages d'erreur plus explicites
         if 'relation' in error_msg.lower() and 'does not exist' in error_msg.lower():
             return False, f"La table '{TABLE_NAME}' n'existe pas. Exécutez le SQL dans Supabase SQL Editor."
@@ -296,6 +649,41 @@ def add_tour(tour_data: Dict) -> tuple[bool, str]:
         else:
             return False, f"Erreur Supabase ({error_type}): {error_msg}"
 
+def upsert_tours(rows: List[Dict]):
+    """
+    Insère ou met à jour un lot de tours en une seule requête, sur la clé import_key
+    (voir supabase_migration_import.sql) : rejouer un lot ne crée pas de doublon
+    Lève l'exception Supabase en cas d'erreur (l'appelant décide de réessayer)
+    """
+    client = get_supabase_client()
+    if not client:
+        raise RuntimeError("Supabase non configuré: SUPABASE_URL ou SUPABASE_KEY manquants")
+    client.table(TABLE_NAME).upsert(rows, on_conflict='import_key', returning=ReturnMethod.minimal).execute()
+    bump_data_version()
+
+def update_tour(tour_id: int, data: Dict) -> bool:
+    """Met à jour les champs descriptifs d'un tour (Wetter, Bemerkungen)"""
+    client = get_supabase_client()
+    if not client:
+        return False
+    try:
+        updates = {}
+        if 'Wetter' in data:
+            updates['wetter'] = str(data['Wetter']).strip() or None
+        if 'Bemerkungen' in data:
+            updates['bemerkungen'] = str(data['Bemerkungen']).strip() or None
+        if not updates:
+            return True
+        response = client.table(TABLE_NAME).update(updates).eq('id', tour_id).execute()
+        if not response.data:
+            return False
+        bump_data_version()
+        _notify_write('update', response.data)
+        return True
+    except Exception as e:
+        log_error(f"Erreur update_tour: {e}")
+        return False
+
 def delete_tour(tour_id: int) -> bool:
     """Supprime un tour de Supabase par son ID"""
     client = get_supabase_client()
@@ -303,51 +691,140 @@ def delete_tour(tour_id: int) -> bool:
         return False
     
     try:
-        client.table(TABLE_NAME).delete().eq('id', tour_id).execute()
+        response = client.table(TABLE_NAME).delete().eq('id', tour_id).execute()
+        bump_data_version()
+        _notify_write('delete', response.data or [])
         return True
     except Exception as e:
         print(f"Erreur lors de la suppression du tour: {e}")
         return False
 
 
-def upload_photo_to_tour(tour_id: int, file_content: bytes, filename: str, content_type: str) -> Tuple[bool, str]:
+def _upload_photo_files(client, bucket: str, base_path: str, file_content: bytes, ext: str, content_type: str) -> Dict[str, str]:
     """
-    Envoie une photo vers le bucket tour-photos et enregistre l'URL dans la colonne photos du tour.
-    Retourne (success: bool, url_ou_erreur: str)
+    Envoie une photo et ses déclinaisons (voir images.py) dans un bucket :
+    base.jpg, base_medium.webp, base_thumb.webp
+    Retourne {'url', 'medium', 'thumb'} ; seulement {'url'} si la photo est stockée telle quelle
     """
-    client = get_supabase_client()
-    if not client:
-        return False, "Supabase non configuré"
+    fichiers = preparer_photo(file_content)
+    if fichiers is None:
+        fichiers = {'original': (file_content, ext, content_type or "image/jpeg")}
+    urls = {}
+    for nom, (contenu, extension, type_contenu) in fichiers.items():
+        chemin = f"{base_path}{extension}" if nom == 'original' else f"{base_path}_{nom}{extension}"
+        client.storage.from_(bucket).upload(chemin, contenu, file_options={"content-type": type_contenu})
+        urls['url' if nom == 'original' else nom] = client.storage.from_(bucket).get_public_url(chemin)
+    return urls
 
+def _store_tour_photo(client, tour_id: int, file_content: bytes, filename: str, content_type: str):
+    """Envoie une photo de tour dans Storage ; retourne l'élément à ajouter à la colonne photos"""
     # Extension et nom unique pour éviter les collisions
     ext = os.path.splitext(filename)[1].lower() or '.jpg'
     if ext not in ('.jpg', '.jpeg', '.png', '.gif', '.webp'):
         ext = '.jpg'
-    storage_path = f"{tour_id}/{uuid.uuid4().hex}{ext}"
+    base_path = f"{tour_id}/{uuid.uuid4().hex}"
+    # Original sans EXIF + déclinaisons WebP
+    urls = _upload_photo_files(client, PHOTOS_BUCKET, base_path, file_content, ext, content_type)
+    return urls if len(urls) > 1 else urls['url']
+
+def upload_photo_to_tour(tour_id: int, file_content: bytes, filename: str, content_type: str) -> Tuple[bool, any]:
+    """
+    Envoie une photo (et ses déclinaisons) vers le bucket tour-photos et l'ajoute à la colonne photos du tour.
+    Élément ajouté : {'url', 'medium', 'thumb'}, ou l'URL seule sans Pillow (format historique)
+    Retourne (success, élément_ou_erreur)
+    """
+    client = get_supabase_client()
+    if not client:
+        return False, "Supabase non configuré"
+    if not check_schema()['photos']:
+        return False, "Colonne 'photos' absente : exécutez supabase_migration_photos.sql"
 
     try:
-        # Upload vers Supabase Storage
-        client.storage.from_(PHOTOS_BUCKET).upload(
-            storage_path,
-            file_content,
-            file_options={"content-type": content_type or "image/jpeg"}
-        )
-        # Récupérer l'URL publique
-        public_url = client.storage.from_(PHOTOS_BUCKET).get_public_url(storage_path)
-
-        # Récupérer les photos actuelles, ajouter la nouvelle URL
-        response = client.table(TABLE_NAME).select('photos').eq('id', tour_id).single().execute()
-        photos = response.data.get('photos') if response.data else []
-        if not isinstance(photos, list):
-            photos = photos if photos else []
-        photos.append(public_url)
-
-        # Mettre à jour la colonne photos
-        client.table(TABLE_NAME).update({'photos': photos}).eq('id', tour_id).execute()
-        return True, public_url
+        photo = _store_tour_photo(client, tour_id, file_content, filename, content_type)
+        if not append_tour_photos(tour_id, [photo]):
+            return False, f"Tour {tour_id} introuvable"
+        return True, photo
     except Exception as e:
         log_error(f"Erreur lors de l'upload photo pour tour {tour_id}: {e}")
+        if is_missing_schema_error(e):
+            invalidate_schema_cache()
+        return False, str(e)
+
+
+def upload_photos_to_tour(tour_id: int, files: List[Tuple[bytes, str, str]]) -> Tuple[bool, any]:
+    """
+    Envoie plusieurs photos (contenu, nom, type) en parallèle (au plus PHOTO_UPLOAD_WORKERS
+    à la fois) puis les ajoute au tour en une seule mise à jour
+    Retourne (success, résultats par fichier [{'filename', 'success', 'photo' | 'error'}] ou message d'erreur)
+    """
+    client = get_supabase_client()
+    if not client:
+        return False, "Supabase non configuré"
+    if not check_schema()['photos']:
+        return False, "Colonne 'photos' absente : exécutez supabase_migration_photos.sql"
+
+    def envoyer(fichier):
+        file_content, filename, content_type = fichier
+        return _store_tour_photo(client, tour_id, file_content, filename, content_type)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, min(PHOTO_UPLOAD_WORKERS, len(files)))) as executor:
+        futures = [executor.submit(envoyer, fichier) for fichier in files]
+        for (_, filename, _), future in zip(files, futures):
+            try:
+                results.append({'filename': filename, 'success': True, 'photo': future.result()})
+            except Exception as e:
+                log_error(f"Erreur lors de l'upload photo {filename} pour tour {tour_id}: {e}")
+                results.append({'filename': filename, 'success': False, 'error': str(e)})
+
+    photos = [r['photo'] for r in results if r['success']]
+    if not photos:
+        return True, results
+    try:
+        if not append_tour_photos(tour_id, photos):
+            return False, f"Tour {tour_id} introuvable"
+    except Exception as e:
+        log_error(f"Erreur lors de l'ajout des photos au tour {tour_id}: {e}")
+        if is_missing_schema_error(e):
+            invalidate_schema_cache()
         return False, str(e)
+    return True, results
+
+
+def append_tour_photos(tour_id: int, new_photos: List) -> bool:
+    """
+    Ajoute des éléments à la colonne photos d'un tour en une requête atomique
+    (fonction append_ride_photos) ; sans la fonction, lecture puis réécriture du tableau
+    Retourne False si le tour n'existe pas ; lève l'exception Supabase en cas d'erreur
+    """
+    client = get_supabase_client()
+    if not client:
+        return False
+    if _rpc_available(APPEND_PHOTOS_RPC):
+        try:
+            response = client.rpc(APPEND_PHOTOS_RPC, {'p_id': tour_id, 'p_photos': new_photos}).execute()
+            if response.data is None:
+                return False
+            bump_data_version()
+            _notify_write('update', [{'id': tour_id, 'photos': response.data}])
+            return True
+        except Exception as e:
+            if not is_missing_schema_error(e):
+                raise
+            _mark_rpc_missing(APPEND_PHOTOS_RPC, 'supabase_migration_append_photo.sql')
+
+    # Fallback : récupérer les photos actuelles, ajouter les nouvelles (non atomique)
+    response = client.table(TABLE_NAME).select('photos').eq('id', tour_id).single().execute()
+    photos = response.data.get('photos') if response.data else []
+    if not isinstance(photos, list):
+        photos = photos if photos else []
+    photos.extend(new_photos)
+
+    # Mettre à jour la colonne photos
+    client.table(TABLE_NAME).update({'photos': photos}).eq('id', tour_id).execute()
+    bump_data_version()
+    _notify_write('update', [{'id': tour_id, 'photos': photos}])
+    return True
 
 
 # --- Entretien (Garage) ---
@@ -392,6 +869,8 @@ def add_entretien(data: Dict) -> Tuple[bool, any]:
         return False, "Aucune donnée retournée"
     except Exception as e:
         log_error(f"Erreur add_entretien: {e}")
+        if is_missing_schema_error(e):
+            invalidate_schema_cache()
         return False, str(e)
 
 
@@ -437,6 +916,8 @@ def upload_entretien_file(entretien_id: int, file_content: bytes, filename: str,
     """
     Upload vers bucket entretien_velo et met à jour url_photo_velo ou url_facture.
     field: 'photo_velo' | 'facture'
+    Une photo de vélo est stockée sans EXIF avec ses déclinaisons ; url_photo_velo
+    reçoit la déclinaison moyenne (WebP) affichée dans le Garage
     """
     client = get_supabase_client()
     if not client:
@@ -445,14 +926,19 @@ def upload_entretien_file(entretien_id: int, file_content: bytes, filename: str,
     if ext not in ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.pdf'):
         ext = '.jpg'
     prefix = 'photo' if field == 'photo_velo' else 'facture'
-    storage_path = f"{entretien_id}/{prefix}_{uuid.uuid4().hex}{ext}"
+    base_path = f"{entretien_id}/{prefix}_{uuid.uuid4().hex}"
     try:
-        client.storage.from_(ENTRETIEN_BUCKET).upload(
-            storage_path,
-            file_content,
-            file_options={"content-type": content_type or "image/jpeg"}
-        )
-        public_url = client.storage.from_(ENTRETIEN_BUCKET).get_public_url(storage_path)
+        if field == 'photo_velo' and ext != '.pdf':
+            urls = _upload_photo_files(client, ENTRETIEN_BUCKET, base_path, file_content, ext, content_type)
+            public_url = urls.get('medium', urls['url'])
+        else:
+            storage_path = f"{base_path}{ext}"
+            client.storage.from_(ENTRETIEN_BUCKET).upload(
+                storage_path,
+                file_content,
+                file_options={"content-type": content_type or "image/jpeg"}
+            )
+            public_url = client.storage.from_(ENTRETIEN_BUCKET).get_public_url(storage_path)
         col = 'url_photo_velo' if field == 'photo_velo' else 'url_facture'
         client.table(ENTRETIEN_TABLE).update({
             col: public_url,
@@ -0,0 +1,115 @@
+"""
+Canal d'événements temps réel (Server-Sent Events) pour /api/events
+Les routes d'écriture publient ici ; chaque connexion SSE lit le même tampon.
+Le tampon est propre au processus : avec plusieurs workers gunicorn, un client
+ne reçoit que les événements publiés par le worker qui le sert.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, Optional
+
+EVENTS_HISTORY = int(os.getenv('EVENTS_HISTORY', '200'))
+EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', '15'))
+# Durée max d'une connexion : le navigateur se reconnecte (Last-Event-ID) et libère le thread
+EVENTS_STREAM_MAX_AGE = float(os.getenv('EVENTS_STREAM_MAX_AGE', '300'))
+EVENTS_RETRY_MS = 5000
+# Flux ouverts en même temps par processus : chacun occupe un thread gunicorn, les autres
+# threads restent aux requêtes /api/* (par défaut un quart des threads du worker)
+EVENTS_MAX_STREAMS = int(os.getenv('EVENTS_MAX_STREAMS', str(max(1, int(os.getenv('GUNICORN_THREADS', '32')) // 4))))
+# Délai avant un nouvel essai quand tous les flux sont occupés
+EVENTS_BUSY_RETRY_MS = 60000
+
+# Identifiant du processus : préfixe des IDs d'événements (change à chaque déploiement/redémarrage)
+BOOT_ID = f"{int(time.time() * 1000):x}"
+
+_events = deque(maxlen=EVENTS_HISTORY)
+_seq = 0
+_cond = threading.Condition()
+_streams = 0
+_streams_lock = threading.Lock()
+
+
+def publish_event(event_type: str, data: Optional[Dict] = None) -> str:
+    """Publie un événement (tour_added, tour_updated, tour_deleted, photo_added, entretien_changed...) et retourne son ID"""
+    global _seq
+    with _cond:
+        _seq += 1
+        _events.append((_seq, event_type, data or {}))
+        _cond.notify_all()
+        return f"{BOOT_ID}-{_seq}"
+
+
+def acquire_stream_slot() -> bool:
+    """Réserve une place pour un flux SSE ; False si EVENTS_MAX_STREAMS flux sont déjà ouverts"""
+    global _streams
+    with _streams_lock:
+        if _streams >= EVENTS_MAX_STREAMS:
+            return False
+        _streams += 1
+        return True
+
+
+def release_stream_slot():
+    """Libère la place d'un flux SSE terminé (fin, déconnexion du client)"""
+    global _streams
+    with _streams_lock:
+        _streams = max(0, _streams - 1)
+
+
+def _format_sse(event_type: str, data: Dict, event_id: Optional[str] = None) -> str:
+    """Formate un message SSE"""
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _parse_last_event_id(last_event_id: Optional[str]):
+    """Retourne (boot_id, seq) depuis l'en-tête Last-Event-ID, ou (None, None)"""
+    if not last_event_id or '-' not in last_event_id:
+        return None, None
+    boot, _, seq = last_event_id.rpartition('-')
+    try:
+        return boot, int(seq)
+    except ValueError:
+        return None, None
+
+
+def event_stream(last_event_id: Optional[str] = None, app_version: str = '') -> Iterator[str]:
+    """
+    Générateur SSE : rejoue les événements manqués depuis Last-Event-ID, puis attend
+    les nouveaux avec un heartbeat régulier. S'arrête après EVENTS_STREAM_MAX_AGE.
+    """
+    yield f"retry: {EVENTS_RETRY_MS}\n\n"
+    boot, last_seq = _parse_last_event_id(last_event_id)
+    with _cond:
+        current_seq = _seq
+        oldest_seq = _events[0][0] if _events else current_seq + 1
+    if boot is not None and boot != BOOT_ID:
+        # Le client était connecté à un autre processus : nouveau déploiement ou redémarrage
+        yield _format_sse('version_changed', {'version': app_version}, f"{BOOT_ID}-{current_seq}")
+        last_seq = current_seq
+    elif last_seq is None or last_seq > current_seq:
+        last_seq = current_seq
+    elif last_seq + 1 < oldest_seq:
+        # Événements déjà sortis du tampon : le client doit tout recharger
+        yield _format_sse('resync', {}, f"{BOOT_ID}-{current_seq}")
+        last_seq = current_seq
+
+    deadline = time.monotonic() + EVENTS_STREAM_MAX_AGE
+    while time.monotonic() < deadline:
+        with _cond:
+            if _seq <= last_seq:
+                _cond.wait(timeout=min(EVENTS_HEARTBEAT, max(0.0, deadline - time.monotonic())))
+            pending = [e for e in _events if e[0] > last_seq]
+        if pending:
+            for seq, event_type, data in pending:
+                last_seq = seq
+                yield _format_sse(event_type, data, f"{BOOT_ID}-{seq}")
+        else:
+            yield ": heartbeat\n\n"
@@ -0,0 +1,19 @@
+"""
+Configuration gunicorn (chargée automatiquement depuis le répertoire courant)
+"""
+import os
+
+# Workers à threads : une connexion SSE (/api/events) occupe un thread, pas un worker entier.
+# Les flux SSE sont limités à EVENTS_MAX_STREAMS (un quart des threads par défaut, voir events.py)
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+
+
+def post_fork(server, worker):
+    """Chaque worker repart d'un client Supabase neuf (pas de sockets partagées avec le master)"""
+    from database import reset_supabase_client, check_schema
+    from stockage import STORAGE_BACKEND
+    reset_supabase_client(close=False)
+    # Vérification du schéma une fois au démarrage du worker (ensuite mise en cache)
+    if STORAGE_BACKEND == 'supabase':
+        check_schema()
@@ -0,0 +1,94 @@
+"""
+Traitement des photos à l'upload : rotation selon l'EXIF puis suppression des
+métadonnées (position GPS, appareil...), et création de deux déclinaisons WebP
+(miniature pour les listes, moyenne pour l'affichage). Pillow est optionnel :
+sans lui, les photos sont stockées telles quelles.
+"""
+import io
+import os
+from typing import Dict, NamedTuple, Optional
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow non installé : pas de déclinaisons
+    Image = None
+    ImageOps = None
+
+PHOTO_THUMB_SIZE = int(os.getenv('PHOTO_THUMB_SIZE', '320'))
+PHOTO_MEDIUM_SIZE = int(os.getenv('PHOTO_MEDIUM_SIZE', '1280'))
+PHOTO_WEBP_QUALITY = int(os.getenv('PHOTO_WEBP_QUALITY', '80'))
+PHOTO_JPEG_QUALITY = 90
+
+# Déclinaisons produites (nom -> côté max en pixels)
+DECLINAISONS = {'medium': PHOTO_MEDIUM_SIZE, 'thumb': PHOTO_THUMB_SIZE}
+
+# Extensions acceptées pour une photo de tour (sans extension : type MIME et décodage seuls)
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+
+class Fichier(NamedTuple):
+    contenu: bytes
+    extension: str
+    content_type: str
+
+
+def verifier_photo(contenu: bytes, filename: str, content_type: Optional[str]) -> Optional[str]:
+    """
+    Motif de refus d'un fichier envoyé comme photo (extension, type MIME, image illisible
+    si Pillow est installé), None s'il est accepté
+    """
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext and ext not in PHOTO_EXTENSIONS:
+        return f"Extension non autorisée ({ext})"
+    if content_type and not content_type.startswith('image/'):
+        return f"Type de fichier non autorisé ({content_type})"
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(contenu)) as image:
+                image.verify()
+        except Exception:
+            return "Image illisible"
+    return None
+
+
+def _encoder(image, format_: str, **options) -> bytes:
+    tampon = io.BytesIO()
+    image.save(tampon, format=format_, **options)
+    return tampon.getvalue()
+
+
+def preparer_photo(contenu: bytes) -> Optional[Dict[str, Fichier]]:
+    """
+    Retourne {'original', 'medium', 'thumb'} : l'original réencodé sans EXIF (JPEG,
+    ou PNG s'il a de la transparence) et les déclinaisons WebP
+    None si Pillow est absent, si l'image est illisible ou animée (stockée telle quelle)
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(contenu)) as image:
+            if getattr(image, 'is_animated', False):
+                return None
+            icc = image.info.get('icc_profile')
+            # Applique l'orientation EXIF aux pixels ; l'EXIF n'est pas recopié à l'encodage
+            image = ImageOps.exif_transpose(image)
+            transparent = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+            image = image.convert('RGBA' if transparent else 'RGB')
+            options_icc = {'icc_profile': icc} if icc else {}
+
+            if transparent:
+                fichiers = {'original': Fichier(_encoder(image, 'PNG', optimize=True, **options_icc), '.png', 'image/png')}
+            else:
+                fichiers = {'original': Fichier(
+                    _encoder(image, 'JPEG', quality=PHOTO_JPEG_QUALITY, optimize=True, **options_icc),
+                    '.jpg', 'image/jpeg')}
+            for nom, cote in DECLINAISONS.items():
+                declinaison = image.copy()
+                declinaison.thumbnail((cote, cote), Image.LANCZOS)
+                fichiers[nom] = Fichier(
+                    _encoder(declinaison, 'WEBP', quality=PHOTO_WEBP_QUALITY, method=4, **options_icc),
+                    '.webp', 'image/webp')
+            return fichiers
+    except Exception as e:
+        print(f"[ERROR] Traitement de la photo impossible, stockage de l'original: {e}")
+        return None
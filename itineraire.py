@@ -0,0 +1,346 @@
+"""
+Itinéraire du tour du monde depuis Kettenis : étapes et calcul de progression
+L'index est construit une seule fois à l'import ; la recherche se fait par bisection
+"""
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Étapes basées sur distances routières réelles depuis Kettenis (tous les 30 km jusqu'à 6000 km, puis tous les 500 km)
+# De 0 à 6000 km : une ville tous les 30 km
+VILLES_30KM = (
+    (0, "🏠 Kettenis"),
+    (30, "🇧🇪 Liège"),
+    (60, "🇳🇱 Maastricht"),
+    (90, "🇧🇪 Hasselt"),
+    (120, "🇧🇪 Leuven"),
+    (150, "🇧🇪 Bruxelles"),
+    (180, "🇧🇪 Anvers"),
+    (210, "🇧🇪 Gand"),
+    (240, "🇧🇪 Bruges"),
+    (270, "🇧🇪 Ostende"),
+    (300, "🇫🇷 Lille"),
+    (330, "🇫🇷 Arras"),
+    (360, "🇫🇷 Amiens"),
+    (390, "🇫🇷 Beauvais"),
+    (420, "🇫🇷 Paris"),
+    (450, "🇫🇷 Chartres"),
+    (480, "🇫🇷 Orléans"),
+    (510, "🇫🇷 Tours"),
+    (540, "🇫🇷 Poitiers"),
+    (570, "🇫🇷 Angoulême"),
+    (600, "🇫🇷 Bordeaux"),
+    (630, "🇫🇷 Arcachon"),
+    (660, "🇫🇷 Bayonne"),
+    (690, "🇪🇸 San Sebastian"),
+    (720, "🇪🇸 Bilbao"),
+    (750, "🇪🇸 Santander"),
+    (780, "🇪🇸 Oviedo"),
+    (810, "🇪🇸 Gijón"),
+    (840, "🇪🇸 Avilés"),
+    (870, "🇪🇸 La Coruña"),
+    (900, "🇪🇸 Vigo"),
+    (930, "🇵🇹 Porto"),
+    (960, "🇵🇹 Coimbra"),
+    (990, "🇵🇹 Leiria"),
+    (1020, "🇵🇹 Lisbonne"),
+    (1050, "🇵🇹 Setúbal"),
+    (1080, "🇵🇹 Évora"),
+    (1110, "🇪🇸 Badajoz"),
+    (1140, "🇪🇸 Mérida"),
+    (1170, "🇪🇸 Cáceres"),
+    (1200, "🇪🇸 Plasencia"),
+    (1230, "🇪🇸 Ávila"),
+    (1260, "🇪🇸 Madrid"),
+    (1290, "🇪🇸 Guadalajara"),
+    (1320, "🇪🇸 Sigüenza"),
+    (1350, "🇪🇸 Calatayud"),
+    (1380, "🇪🇸 Saragosse"),
+    (1410, "🇪🇸 Huesca"),
+    (1440, "🇪🇸 Jaca"),
+    (1470, "🇫🇷 Pau"),
+    (1500, "🇫🇷 Tarbes"),
+    (1530, "🇫🇷 Toulouse"),
+    (1560, "🇫🇷 Carcassonne"),
+    (1590, "🇫🇷 Narbonne"),
+    (1620, "🇫🇷 Montpellier"),
+    (1650, "🇫🇷 Nîmes"),
+    (1680, "🇫🇷 Avignon"),
+    (1710, "🇫🇷 Orange"),
+    (1740, "🇫🇷 Valence"),
+    (1770, "🇫🇷 Romans-sur-Isère"),
+    (1800, "🇫🇷 Grenoble"),
+    (1830, "🇫🇷 Chambéry"),
+    (1860, "🇫🇷 Annecy"),
+    (1890, "🇫🇷 Genève"),
+    (1920, "🇨🇭 Lausanne"),
+    (1950, "🇨🇭 Berne"),
+    (1980, "🇨🇭 Lucerne"),
+    (2010, "🇨🇭 Zurich"),
+    (2040, "🇨🇭 Schaffhausen"),
+    (2070, "🇩🇪 Constance"),
+    (2100, "🇩🇪 Ulm"),
+    (2130, "🇩🇪 Augsbourg"),
+    (2160, "🇩🇪 Munich"),
+    (2190, "🇩🇪 Rosenheim"),
+    (2220, "🇦🇹 Salzbourg"),
+    (2250, "🇦🇹 Linz"),
+    (2280, "🇦🇹 Vienne"),
+    (2310, "🇸🇰 Bratislava"),
+    (2340, "🇭🇺 Győr"),
+    (2370, "🇭🇺 Budapest"),
+    (2400, "🇭🇺 Székesfehérvár"),
+    (2430, "🇭🇺 Szombathely"),
+    (2460, "🇦🇹 Graz"),
+    (2490, "🇸🇮 Ljubljana"),
+    (2520, "🇭🇷 Zagreb"),
+    (2550, "🇭🇷 Karlovac"),
+    (2580, "🇭🇷 Rijeka"),
+    (2610, "🇭🇷 Pula"),
+    (2640, "🇮🇹 Trieste"),
+    (2670, "🇮🇹 Venise"),
+    (2700, "🇮🇹 Padoue"),
+    (2730, "🇮🇹 Vérone"),
+    (2760, "🇮🇹 Brescia"),
+    (2790, "🇮🇹 Milan"),
+    (2820, "🇮🇹 Pavie"),
+    (2850, "🇮🇹 Gênes"),
+    (2880, "🇮🇹 La Spezia"),
+    (2910, "🇮🇹 Pise"),
+    (2940, "🇮🇹 Florence"),
+    (2970, "🇮🇹 Arezzo"),
+    (3000, "🇮🇹 Pérouse"),
+    (3030, "🇮🇹 Terni"),
+    (3060, "🇮🇹 Rome"),
+    (3090, "🇮🇹 Latina"),
+    (3120, "🇮🇹 Naples"),
+    (3150, "🇮🇹 Salerne"),
+    (3180, "🇮🇹 Potenza"),
+    (3210, "🇮🇹 Bari"),
+    (3240, "🇮🇹 Brindisi"),
+    (3270, "🇬🇷 Igoumenitsa"),
+    (3300, "🇬🇷 Ioannina"),
+    (3330, "🇬🇷 Larissa"),
+    (3360, "🇬🇷 Lamia"),
+    (3390, "🇬🇷 Athènes"),
+    (3420, "🇬🇷 Le Pirée"),
+    (3450, "🇬🇷 Corinthe"),
+    (3480, "🇬🇷 Patras"),
+    (3510, "🇬🇷 Pyrgos"),
+    (3540, "🇬🇷 Kalamata"),
+    (3570, "🇬🇷 Sparte"),
+    (3600, "🇬🇷 Tripoli"),
+    (3630, "🇬🇷 Argos"),
+    (3660, "🇬🇷 Nauplie"),
+    (3690, "🇬🇷 Épidaure"),
+    (3720, "🇬🇷 Mycènes"),
+    (3750, "🇬🇷 Corinthe"),
+    (3780, "🇬🇷 Thèbes"),
+    (3810, "🇬🇷 Chalkida"),
+    (3840, "🇬🇷 Volos"),
+    (3870, "🇬🇷 Thessalonique"),
+    (3900, "🇬🇷 Kavala"),
+    (3930, "🇧🇬 Plovdiv"),
+    (3960, "🇧🇬 Sofia"),
+    (3990, "🇧🇬 Pernik"),
+    (4020, "🇷🇸 Niš"),
+    (4050, "🇷🇸 Belgrade"),
+    (4080, "🇷🇸 Novi Sad"),
+    (4110, "🇭🇺 Szeged"),
+    (4140, "🇭🇺 Kecskemét"),
+    (4170, "🇭🇺 Debrecen"),
+    (4200, "🇷🇴 Oradea"),
+    (4230, "🇷🇴 Cluj-Napoca"),
+    (4260, "🇷🇴 Târgu Mureș"),
+    (4290, "🇷🇴 Brașov"),
+    (4320, "🇷🇴 Bucarest"),
+    (4350, "🇷🇴 Ploiești"),
+    (4380, "🇷🇴 Pitești"),
+    (4410, "🇷🇴 Craiova"),
+    (4440, "🇷🇴 Drobeta-Turnu Severin"),
+    (4470, "🇷🇴 Timișoara"),
+    (4500, "🇷🇸 Subotica"),
+    (4530, "🇭🇺 Szeged"),
+    (4560, "🇭🇺 Békéscsaba"),
+    (4590, "🇭🇺 Arad"),
+    (4620, "🇷🇴 Arad"),
+    (4650, "🇷🇴 Deva"),
+    (4680, "🇷🇴 Alba Iulia"),
+    (4710, "🇷🇴 Sibiu"),
+    (4740, "🇷🇴 Sighișoara"),
+    (4770, "🇷🇴 Târgu Mureș"),
+    (4800, "🇷🇴 Miercurea Ciuc"),
+    (4830, "🇷🇴 Bacău"),
+    (4860, "🇷🇴 Iași"),
+    (4890, "🇲🇩 Chișinău"),
+    (4920, "🇺🇦 Odessa"),
+    (4950, "🇺🇦 Mykolaïv"),
+    (4980, "🇺🇦 Kherson"),
+    (5010, "🇺🇦 Melitopol"),
+    (5040, "🇺🇦 Marioupol"),
+    (5070, "🇺🇦 Donetsk"),
+    (5100, "🇺🇦 Luhansk"),
+    (5130, "🇷🇺 Rostov-sur-le-Don"),
+    (5160, "🇷🇺 Krasnodar"),
+    (5190, "🇷🇺 Sotchi"),
+    (5220, "🇬🇪 Batoumi"),
+    (5250, "🇬🇪 Koutaïssi"),
+    (5280, "🇬🇪 Tbilissi"),
+    (5310, "🇬🇪 Gori"),
+    (5340, "🇬🇪 Mtskheta"),
+    (5370, "🇦🇲 Erevan"),
+    (5400, "🇦🇲 Gyumri"),
+    (5430, "🇬🇪 Tbilissi"),
+    (5460, "🇦🇿 Bakou"),
+    (5490, "🇦🇿 Sumqayıt"),
+    (5520, "🇦🇿 Ganja"),
+    (5550, "🇦🇿 Şəki"),
+    (5580, "🇬🇪 Tbilissi"),
+    (5610, "🇹🇷 Trabzon"),
+    (5640, "🇹🇷 Rize"),
+    (5670, "🇹🇷 Erzurum"),
+    (5700, "🇹🇷 Kars"),
+    (5730, "🇹🇷 Ağrı"),
+    (5760, "🇹🇷 Van"),
+    (5790, "🇹🇷 Diyarbakır"),
+    (5820, "🇹🇷 Gaziantep"),
+    (5850, "🇹🇷 Adana"),
+    (5880, "🇹🇷 Mersin"),
+    (5910, "🇹🇷 Antalya"),
+    (5940, "🇹🇷 Konya"),
+    (5970, "🇹🇷 Ankara"),
+    (6000, "🇹🇷 Istanbul")
+)
+
+# Au-delà de 6000 km : tour du monde (itinéraire cohérent Istanbul → Asie → Amériques → Europe)
+# Istanbul (6000) → Turquie → Caucase → Iran → Asie centrale → Chine → Asie du Sud-Est
+# → Océanie/Amériques → Europe. Distances cumulées depuis Kettenis.
+VILLES_500KM = (
+    (6500, "🇹🇷 Ankara"),
+    (7000, "🇬🇪 Tbilissi"),
+    (7500, "🇦🇿 Bakou"),
+    (8000, "🇹🇲 Achgabat"),
+    (8500, "🇺🇿 Tachkent"),
+    (9000, "🇰🇿 Almaty"),
+    (9500, "🇨🇳 Ürümqi"),
+    (10000, "🇨🇳 Lanzhou"),
+    (10500, "🇨🇳 Xi'an"),
+    (11000, "🇨🇳 Pékin"),
+    (11500, "🇰🇷 Séoul"),
+    (12000, "🇯🇵 Tokyo"),
+    (12500, "🇯🇵 Osaka"),
+    (13000, "🇹🇼 Taipei"),
+    (13500, "🇭🇰 Hong Kong"),
+    (14000, "🇻🇳 Hô Chi Minh-Ville"),
+    (14500, "🇰🇭 Phnom Penh"),
+    (15000, "🇹🇭 Bangkok"),
+    (15500, "🇲🇲 Rangoun"),
+    (16000, "🇮🇳 Calcutta"),
+    (16500, "🇮🇳 Mumbai"),
+    (17000, "🇦🇪 Dubaï"),
+    (17500, "🇸🇦 Riyad"),
+    (18000, "🇪🇬 Le Caire"),
+    (18500, "🇱🇾 Tripoli"),
+    (19000, "🇹🇳 Tunis"),
+    (19500, "🇩🇿 Alger"),
+    (20000, "🇲🇦 Casablanca"),
+    (20500, "🇪🇸 Madrid"),
+    (21000, "🇫🇷 Paris"),
+    (21500, "🇬🇧 Londres"),
+    (22000, "🇮🇸 Reykjavik"),
+    (22500, "🇨🇦 St. John's"),
+    (23000, "🇨🇦 Québec"),
+    (23500, "🇨🇦 Toronto"),
+    (24000, "🇺🇸 New York"),
+    (24500, "🇺🇸 Washington"),
+    (25000, "🇺🇸 Atlanta"),
+    (25500, "🇺🇸 Miami"),
+    (26000, "🇲🇽 Cancún"),
+    (26500, "🇲🇽 Mexico"),
+    (27000, "🇬🇹 Guatemala"),
+    (27500, "🇨🇷 San José"),
+    (28000, "🇵🇦 Panama"),
+    (28500, "🇨🇴 Bogota"),
+    (29000, "🇪🇨 Quito"),
+    (29500, "🇵🇪 Lima"),
+    (30000, "🇧🇴 La Paz"),
+    (30500, "🇦🇷 Buenos Aires"),
+    (31000, "🇺🇾 Montevideo"),
+    (31500, "🇧🇷 São Paulo"),
+    (32000, "🇧🇷 Rio de Janeiro"),
+    (32500, "🇧🇷 Salvador"),
+    (33000, "🇸🇳 Dakar"),
+    (33500, "🇪🇸 Las Palmas"),
+    (34000, "🇪🇸 Madrid"),
+    (34500, "🇫🇷 Bordeaux"),
+    (35000, "🇫🇷 Paris"),
+    (35500, "🇧🇪 Bruxelles"),
+    (36000, "🇳🇱 Amsterdam"),
+    (36500, "🇩🇪 Hambourg"),
+    (37000, "🇩🇰 Copenhague"),
+    (37500, "🇸🇪 Stockholm"),
+    (38000, "🇫🇮 Helsinki"),
+    (38500, "🇷🇺 Saint-Pétersbourg"),
+    (39000, "🇷🇺 Moscou"),
+    (39500, "🇵🇱 Varsovie"),
+    (40000, "🇩🇪 Berlin"),
+    (40075, "🌍 Weltreise!")
+)
+
+ETAPES = VILLES_30KM + VILLES_500KM
+
+
+class IndexEtapes:
+    """
+    Index immuable d'un itinéraire : étapes triées par km cumulé
+    Permet de définir d'autres itinéraires que celui de Kettenis
+    """
+    __slots__ = ('etapes', 'kms')
+
+    def __init__(self, etapes: Iterable[Tuple[float, str]]):
+        etapes = tuple(sorted(etapes, key=lambda e: e[0]))
+        if len(etapes) < 2:
+            raise ValueError("Un itinéraire doit contenir au moins deux étapes")
+        self.etapes = etapes
+        self.kms = tuple(float(km) for km, _ in etapes)
+
+    def progression(self, total_km: float) -> Dict:
+        """Berechnet Fortschritt für eine gegebene Gesamtstrecke in km."""
+        etapes, kms = self.etapes, self.kms
+        # Dernière étape atteinte (km <= total) ; NaN = aucune étape atteinte
+        i = bisect_right(kms, total_km) - 1 if total_km == total_km else -1
+        if i < 0:
+            actuelle, suivante, distance_kettenis = 0, 1, 0.0
+        else:
+            actuelle = i
+            # Au-delà de la dernière étape, la « prochaine » reste la dernière
+            suivante = min(i + 1, len(kms) - 1)
+            distance_kettenis = kms[suivante]
+        km_palier_actuel = kms[actuelle]
+        km_palier_suivant = kms[suivante]
+        km_restants = max(0.0, km_palier_suivant - total_km)
+        diff_seg = km_palier_suivant - km_palier_actuel
+        prog_v = (total_km - km_palier_actuel) / diff_seg if diff_seg > 0 else 1.0
+        return {
+            'ville_actuelle': etapes[actuelle][1],
+            'prochaine_ville': etapes[suivante][1],
+            'km_restants': float(km_restants),
+            'progression': float(prog_v),
+            'distance_kettenis': float(distance_kettenis)
+        }
+
+    def progressions(self, totaux: Sequence[float]) -> List[Dict]:
+        """Calcule la progression pour plusieurs totaux (utilisateurs) en un appel"""
+        return [self.progression(total) for total in totaux]
+
+
+ITINERAIRE_KETTENIS = IndexEtapes(ETAPES)
+
+
+def calculer_progression(total_km: float) -> Dict:
+    """Progression sur l'itinéraire par défaut (Kettenis → tour du monde)"""
+    return ITINERAIRE_KETTENIS.progression(total_km)
+
+
+def calculer_progressions(totaux: Sequence[float]) -> List[Dict]:
+    """Progression sur l'itinéraire par défaut pour plusieurs totaux"""
+    return ITINERAIRE_KETTENIS.progressions(totaux)
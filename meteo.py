@@ -0,0 +1,240 @@
+"""
+Météo des tours (wttr.in) avec cache borné : clé = nom de ville normalisé,
+TTL configurable, échecs mis en cache moins longtemps (cache négatif)
+Les appels passent par une session HTTP partagée (keep-alive), sont lancés en
+parallèle avec une échéance globale et coupés par un disjoncteur après des
+échecs répétés. En mode différé (METEO_DEFERRED), la météo d'un tour déjà
+enregistré est résolue en arrière-plan (planifier_meteo)
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+METEO_CACHE_TTL = float(os.getenv('METEO_CACHE_TTL', '1800'))
+METEO_CACHE_NEGATIVE_TTL = float(os.getenv('METEO_CACHE_NEGATIVE_TTL', '120'))
+METEO_CACHE_MAX = int(os.getenv('METEO_CACHE_MAX', '256'))
+METEO_TIMEOUT = float(os.getenv('METEO_TIMEOUT', '5'))
+METEO_CONNECT_TIMEOUT = float(os.getenv('METEO_CONNECT_TIMEOUT', '2'))
+# Temps max passé à attendre la météo dans une requête (toutes villes confondues)
+METEO_DEADLINE = float(os.getenv('METEO_DEADLINE', '3'))
+METEO_WORKERS = int(os.getenv('METEO_WORKERS', '4'))
+# Disjoncteur : après N échecs consécutifs, plus d'appel pendant le délai de refroidissement
+METEO_BREAKER_THRESHOLD = int(os.getenv('METEO_BREAKER_THRESHOLD', '3'))
+METEO_BREAKER_COOLDOWN = float(os.getenv('METEO_BREAKER_COOLDOWN', '300'))
+# Enrichissement différé : le tour est enregistré sans attendre la météo
+METEO_DEFERRED = os.getenv('METEO_DEFERRED', 'false').lower() == 'true'
+METEO_ENRICH_RETRIES = int(os.getenv('METEO_ENRICH_RETRIES', '3'))
+METEO_ENRICH_RETRY_DELAY = float(os.getenv('METEO_ENRICH_RETRY_DELAY', '180'))
+
+_cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # ville -> (météo, expire_a)
+_cache_lock = threading.Lock()
+_compteurs = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'breaker_skips': 0}
+
+# Session et pool de threads propres au processus (recréés après un fork gunicorn)
+_session: Optional[requests.Session] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_enrichisseur: Optional[ThreadPoolExecutor] = None  # Tâches d'enrichissement (attendent _executor)
+_pid: Optional[int] = None
+_init_lock = threading.Lock()
+
+_echecs_consecutifs = 0
+_coupe_jusqua = 0.0
+_breaker_lock = threading.Lock()
+
+
+def _normaliser_ville(ville: str) -> str:
+    """Clé de cache : espaces réduits, insensible à la casse"""
+    return ' '.join(ville.split()).casefold()
+
+
+def _f_to_c(match) -> str:
+    f = float(match.group(1))
+    c = (f - 32) * 5/9
+    return f"{c:.0f}°C"
+
+
+def _ressources() -> Tuple[requests.Session, ThreadPoolExecutor, ThreadPoolExecutor]:
+    """Session HTTP (pool keep-alive) et pools de threads (appels, enrichissement) du processus courant"""
+    global _session, _executor, _enrichisseur, _pid
+    if _pid != os.getpid():
+        with _init_lock:
+            if _pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=METEO_WORKERS)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+                _executor = ThreadPoolExecutor(max_workers=METEO_WORKERS, thread_name_prefix='meteo')
+                _enrichisseur = ThreadPoolExecutor(max_workers=2, thread_name_prefix='meteo-enrichissement')
+                _pid = os.getpid()
+    return _session, _executor, _enrichisseur
+
+
+def _disjoncteur_ouvert() -> bool:
+    """True si wttr.in est coupé (refroidissement en cours)"""
+    with _breaker_lock:
+        return time.monotonic() < _coupe_jusqua
+
+
+def _signaler_resultat(succes: bool):
+    """Met à jour le disjoncteur après un appel"""
+    global _echecs_consecutifs, _coupe_jusqua
+    with _breaker_lock:
+        if succes:
+            _echecs_consecutifs = 0
+            return
+        _echecs_consecutifs += 1
+        if _echecs_consecutifs >= METEO_BREAKER_THRESHOLD:
+            print(f"[ERROR] Météo : {_echecs_consecutifs} échecs consécutifs, wttr.in coupé pendant {METEO_BREAKER_COOLDOWN:.0f}s")
+            _coupe_jusqua = time.monotonic() + METEO_BREAKER_COOLDOWN
+            _echecs_consecutifs = 0
+
+
+def _recuperer_meteo(ville: str) -> Optional[str]:
+    """Appel wttr.in ; None en cas d'échec (réseau, statut HTTP)"""
+    session, _, _ = _ressources()
+    try:
+        # Utiliser units=metric dans les params pour forcer les Celsius
+        url = f"https://wttr.in/{ville}"
+        params = {
+            'format': '%C+%t',
+            'lang': 'de',
+            'units': 'metric'  # Force les degrés Celsius
+        }
+        r = session.get(url, params=params, timeout=(METEO_CONNECT_TIMEOUT, METEO_TIMEOUT))
+        if r.status_code != 200:
+            # Erreur serveur : compte pour le disjoncteur ; 4xx (ville inconnue) non
+            _signaler_resultat(r.status_code < 500)
+            return None
+        _signaler_resultat(True)
+        result = r.text.strip()
+        # Vérification de sécurité : convertir °F en °C si nécessaire
+        if '°F' in result:
+            result = re.sub(r'(-?\d+(?:\.\d+)?)°F', _f_to_c, result)
+        return result
+    except Exception as e:
+        print(f"[ERROR] Erreur météo pour {ville}: {e}")
+        _signaler_resultat(False)
+        return None
+
+
+def _lire_cache(cle: str) -> Optional[str]:
+    with _cache_lock:
+        entree = _cache.get(cle)
+        if entree is None:
+            _compteurs['misses'] += 1
+            return None
+        valeur, expire_a = entree
+        if time.monotonic() >= expire_a:
+            del _cache[cle]
+            _compteurs['misses'] += 1
+            return None
+        _cache.move_to_end(cle)
+        _compteurs['hits'] += 1
+        if valeur == "N/A":
+            _compteurs['negative_hits'] += 1
+        return valeur
+
+
+def _ecrire_cache(cle: str, valeur: str, ttl: float):
+    with _cache_lock:
+        _cache[cle] = (valeur, time.monotonic() + ttl)
+        _cache.move_to_end(cle)
+        while len(_cache) > METEO_CACHE_MAX:
+            _cache.popitem(last=False)
+
+
+def _meteo_et_cache(ville: str, cle: str) -> str:
+    """Appel wttr.in puis mise en cache (positive ou négative)"""
+    valeur = _recuperer_meteo(ville)
+    if valeur is None:
+        _ecrire_cache(cle, "N/A", METEO_CACHE_NEGATIVE_TTL)
+        return "N/A"
+    _ecrire_cache(cle, valeur, METEO_CACHE_TTL)
+    return valeur
+
+
+def obtenir_meteos(villes: List[str], deadline: float = None) -> List[str]:
+    """
+    Météo de plusieurs villes : cache d'abord, puis un appel par ville distincte,
+    en parallèle. Attend au plus `deadline` secondes (METEO_DEADLINE) ; une ville
+    encore en attente vaut "N/A" (l'appel continue et remplit le cache)
+    """
+    deadline = METEO_DEADLINE if deadline is None else deadline
+    resultats = ["N/A"] * len(villes)
+    a_chercher = {}  # clé -> (ville, [positions])
+    for i, ville in enumerate(villes):
+        if not ville or ville.strip() == "":
+            continue
+        cle = _normaliser_ville(ville)
+        if cle in a_chercher:
+            a_chercher[cle][1].append(i)
+            continue
+        valeur = _lire_cache(cle)
+        if valeur is not None:
+            resultats[i] = valeur
+        else:
+            a_chercher[cle] = (ville.strip(), [i])
+    if not a_chercher:
+        return resultats
+    if _disjoncteur_ouvert():
+        with _cache_lock:
+            _compteurs['breaker_skips'] += len(a_chercher)
+        return resultats
+    
+    _, executor, _ = _ressources()
+    futures = {executor.submit(_meteo_et_cache, ville, cle): positions
+               for cle, (ville, positions) in a_chercher.items()}
+    termines, _ = wait(futures, timeout=deadline)
+    for future in termines:
+        try:
+            valeur = future.result()
+        except Exception:
+            continue
+        for i in futures[future]:
+            resultats[i] = valeur
+    return resultats
+
+
+def planifier_meteo(villes: List[str], appliquer, tentative: int = 1):
+    """
+    Résout la météo de `villes` hors de la requête puis appelle appliquer(météos)
+    Si une ville reste "N/A", nouvel essai plus tard (au plus METEO_ENRICH_RETRIES) ;
+    le résultat du dernier essai est appliqué tel quel
+    """
+    _, _, enrichisseur = _ressources()
+    enrichisseur.submit(_enrichir, list(villes), appliquer, tentative)
+
+
+def _enrichir(villes: List[str], appliquer, tentative: int):
+    try:
+        meteos = obtenir_meteos(villes, deadline=METEO_CONNECT_TIMEOUT + METEO_TIMEOUT)
+        echec = any(m == "N/A" and v and v.strip() for v, m in zip(villes, meteos))
+        if echec and tentative < METEO_ENRICH_RETRIES:
+            # Attendre au moins l'expiration du cache négatif avant de réessayer
+            delai = max(METEO_ENRICH_RETRY_DELAY, METEO_CACHE_NEGATIVE_TTL) * tentative
+            timer = threading.Timer(delai, planifier_meteo, (villes, appliquer, tentative + 1))
+            timer.daemon = True
+            timer.start()
+            return
+        appliquer(meteos)
+    except Exception as e:
+        print(f"[ERROR] Enrichissement météo ({', '.join(villes)}): {e}")
+
+
+def statistiques_cache_meteo() -> Dict[str, int]:
+    """
+    Compteurs du cache météo du processus : hits, misses, negative_hits, breaker_skips,
+    taille et état du disjoncteur (exposés par /api/version)
+    """
+    with _cache_lock:
+        stats = dict(_compteurs, size=len(_cache))
+    stats['breaker_open'] = _disjoncteur_ouvert()
+    return stats
@@ -1,65 +1,156 @@
 """
-Script pour migrer les données du CSV vers Supabase
-À exécuter une seule fois après avoir configuré Supabase
+Import en masse du journal CSV vers la table rides de Supabase
+- le CSV est lu en flux et envoyé par lots (--batch-size tours, un upsert par requête) ;
+- upsert sur import_key = '<source>:<Id du tour>' (voir supabase_migration_import.sql) :
+  relancer l'import ne crée pas de doublon, un tour modifié depuis est mis à jour ;
+- la progression est enregistrée après chaque lot dans <csv>.import.json : après une
+  erreur, relancer la même commande reprend là où l'import s'est arrêté, et une fois
+  l'import terminé elle n'envoie que les tours ajoutés depuis ;
+- le débit (tours/s) est affiché à chaque lot et à la fin.
+
+Usage : python migrate_to_supabase.py [journal_velo.csv] [--batch-size 500] [--source journal_velo] [--restart]
 """
+import argparse
+import json
 import os
-import pandas as pd
-from database import get_supabase_client
+import sys
+import time
+
+from database import build_ride_row, check_schema, get_supabase_client, upsert_tours
+from stockage_csv import COLONNE_ID, lire_pierres_tombales, parcourir_enregistrements
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_RETRIES = 3
+
+
+def _lire_checkpoint(chemin: str) -> dict:
+    try:
+        with open(chemin) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _ecrire_checkpoint(chemin: str, etat: dict):
+    """Écriture atomique (fichier temporaire + rename) : un arrêt brutal laisse l'ancien état"""
+    temporaire = chemin + '.tmp'
+    with open(temporaire, 'w') as f:
+        json.dump(etat, f)
+    os.replace(temporaire, chemin)
+
+
+def _envoyer(lot: list):
+    """Upsert d'un lot, réessayé IMPORT_RETRIES fois avec attente croissante"""
+    for tentative in range(1, IMPORT_RETRIES + 1):
+        try:
+            upsert_tours(lot)
+            return
+        except Exception as e:
+            if tentative == IMPORT_RETRIES:
+                raise
+            attente = 2 ** tentative
+            print(f"[ERROR] Lot refusé ({e}), nouvelle tentative dans {attente}s")
+            time.sleep(attente)
+
 
-def migrate_csv_to_supabase():
-    """Migre les données du CSV vers Supabase"""
-    csv_file = "journal_velo.csv"
-    
+def importer(csv_file: str, batch_size: int, source: str, restart: bool) -> bool:
+    """Importe le journal ; retourne False si l'import s'est arrêté sur une erreur (reprise possible)"""
     if not os.path.exists(csv_file):
         print("Aucun fichier CSV trouvé. Rien à migrer.")
-        return
-    
-    # Vérifier que Supabase est configuré
-    client = get_supabase_client()
-    if not client:
+        return True
+    if not get_supabase_client():
         print("ERREUR: Supabase n'est pas configuré!")
         print("Assurez-vous d'avoir défini SUPABASE_URL et SUPABASE_KEY dans vos variables d'environnement.")
-        return
-    
-    # Lire le CSV
-    df = pd.read_csv(csv_file)
-    print(f"Lecture de {len(df)} tours depuis le CSV...")
-    
-    # Vérifier si des données existent déjà dans Supabase
-    existing_tours = client.table('tours').select('id').execute()
-    if existing_tours.data:
-        response = input(f"Il y a déjà {len(existing_tours.data)} tours dans Supabase. Voulez-vous continuer? (o/n): ")
-        if response.lower() != 'o':
-            print("Migration annulée.")
-            return
-    
-    # Migrer chaque tour
-    success_count = 0
-    error_count = 0
-    
-    for idx, row in df.iterrows():
-        try:
-            tour_data = {
-                'date': row.get('Date', ''),
-                'start': row.get('Start', ''),
-                'etape': row.get('Etape', '') if pd.notna(row.get('Etape')) else '',
-                'ziel': row.get('Ziel', ''),
-                'wetter': row.get('Wetter', ''),
-                'km': float(row.get('Km', 0)),
-                'bemerkungen': row.get('Bemerkungen', '') if pd.notna(row.get('Bemerkungen')) else ''
-            }
-            
-            client.table('tours').insert(tour_data).execute()
-            success_count += 1
-            print(f"✓ Tour {idx + 1}/{len(df)} migré")
-        except Exception as e:
-            error_count += 1
-            print(f"✗ Erreur pour le tour {idx + 1}: {e}")
-    
-    print(f"\nMigration terminée!")
-    print(f"✓ {success_count} tours migrés avec succès")
-    if error_count > 0:
-        print(f"✗ {error_count} erreurs")
+        return False
+    schema = check_schema(force=True)
+    if not schema['rides'] or not schema['import_key']:
+        print("ERREUR: table rides ou colonne import_key absente : exécutez supabase_setup.sql puis supabase_migration_import.sql")
+        return False
+
+    chemin_checkpoint = csv_file + '.import.json'
+    inode = os.stat(csv_file).st_ino
+    etat = {} if restart else _lire_checkpoint(chemin_checkpoint)
+    if etat and (etat.get('inode') != inode or etat.get('source') != source):
+        # Fichier réécrit (compaction, ajout de la colonne Id) : les positions ne sont plus valables
+        print("Fichier CSV réécrit depuis le dernier import : reprise depuis le début (sans doublon)")
+        etat = {}
+    position = etat.get('position', 0)
+    numero = etat.get('numero', 0)
+    if position:
+        print(f"Reprise de l'import au tour n°{numero + 1} ({etat.get('importes', 0)} tours déjà envoyés)")
+
+    entete = next(parcourir_enregistrements(csv_file))[1]
+    a_id = COLONNE_ID in entete
+    morts = set(lire_pierres_tombales(csv_file))
+
+    debut = time.monotonic()
+    importes = ignores = 0
+    lot = {}           # import_key -> ligne (la dernière version d'un tour l'emporte)
+    reprise = None     # (position, numero) du dernier tour du lot
+
+    def envoyer_lot():
+        nonlocal importes
+        t0 = time.monotonic()
+        _envoyer(list(lot.values()))
+        importes += len(lot)
+        _ecrire_checkpoint(chemin_checkpoint, {
+            'inode': inode, 'source': source, 'position': reprise[0], 'numero': reprise[1],
+            'importes': etat.get('importes', 0) + importes,
+        })
+        duree = time.monotonic() - t0
+        print(f"✓ {len(lot)} tours envoyés en {duree:.2f}s ({len(lot) / max(duree, 1e-6):.0f} tours/s), "
+              f"{importes} au total")
+        lot.clear()
+
+    enregistrements = parcourir_enregistrements(csv_file, position)
+    if position == 0:
+        next(enregistrements)  # En-tête
+    try:
+        for offset, champs in enregistrements:
+            valeurs = dict(zip(entete, champs))
+            tour_id = int(valeurs[COLONNE_ID]) if a_id else numero
+            mort = (offset if a_id else numero) in morts
+            reprise = (offset, numero)
+            numero += 1
+            # La reprise relit le dernier tour du lot précédent : déjà envoyé et compté
+            if mort or (position and offset == position):
+                continue
+            ligne = build_ride_row(valeurs, schema)
+            if not ligne['date'] or not ligne['start'] or not ligne['ziel']:
+                ignores += 1
+                continue
+            ligne['import_key'] = f"{source}:{tour_id}"
+            lot[ligne['import_key']] = ligne
+            if len(lot) >= batch_size:
+                envoyer_lot()
+        if lot:
+            envoyer_lot()
+    except Exception as e:
+        print(f"✗ Import interrompu : {e}")
+        print(f"  Relancez la même commande pour reprendre ({importes} tours envoyés dans cette exécution)")
+        return False
+
+    duree = time.monotonic() - debut
+    print(f"\nImport terminé en {duree:.1f}s : {importes} tours envoyés "
+          f"({importes / max(duree, 1e-6):.0f} tours/s)")
+    if ignores:
+        print(f"✗ {ignores} tours ignorés (date, départ ou arrivée manquant)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import en masse du journal CSV vers Supabase (table rides)")
+    parser.add_argument('csv_file', nargs='?', default='journal_velo.csv')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                        help=f"tours par requête (défaut {IMPORT_BATCH_SIZE})")
+    parser.add_argument('--source', default=None,
+                        help="préfixe de import_key (défaut : nom du fichier sans extension)")
+    parser.add_argument('--restart', action='store_true',
+                        help="ignore la progression enregistrée et relit tout le fichier")
+    args = parser.parse_args()
+    source = args.source or os.path.splitext(os.path.basename(args.csv_file))[0]
+    sys.exit(0 if importer(args.csv_file, max(1, args.batch_size), source, args.restart) else 1)
+
 
 if __name__ == '__main__':
-    migrate_csv_to_supabase()
+    main()
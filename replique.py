@@ -0,0 +1,263 @@
+"""
+Réplique locale en mémoire des tables rides et entretien (SUPABASE_REPLICA=true) :
+- un thread par worker synchronise la copie toutes les REPLICA_SYNC_INTERVAL secondes :
+  lignes créées après le dernier ID connu ou modifiées depuis le dernier updated_at
+  (voir supabase_migration_updated_at.sql), puis contrôle du nombre de lignes pour
+  détecter les suppressions faites ailleurs (resynchronisation complète si besoin) ;
+- les écritures vont toujours à Supabase et sont appliquées à la copie dès leur
+  succès (listeners d'écriture de database.py) ;
+- les lectures sont servies par la copie tant que la dernière synchronisation réussie
+  date de moins de REPLICA_MAX_STALENESS secondes, sinon par Supabase.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from utilisateurs import normaliser_utilisateur
+
+SUPABASE_REPLICA = os.getenv('SUPABASE_REPLICA', 'false').lower() == 'true'
+REPLICA_SYNC_INTERVAL = float(os.getenv('REPLICA_SYNC_INTERVAL', '30'))
+REPLICA_MAX_STALENESS = float(os.getenv('REPLICA_MAX_STALENESS', '120'))
+# Resynchronisation complète périodique (seul moyen de voir les modifications sans colonne updated_at)
+REPLICA_FULL_SYNC_INTERVAL = float(os.getenv('REPLICA_FULL_SYNC_INTERVAL', '600'))
+
+
+class RepliqueLecture:
+    """
+    Fonctions de lecture de l'interface de stockage (voir stockage.py) servies depuis
+    une copie locale ; `backend` est le module database
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.verrou = threading.Lock()
+        self.tours: Dict[int, Dict] = {}
+        self.entretien: Optional[List[Dict]] = None
+        self.synchro_a: Optional[float] = None        # Dernière synchronisation réussie (monotonic)
+        self.synchro_complete_a: Optional[float] = None
+        self.curseur_maj: Optional[str] = None        # Plus grand updated_at vu
+        self._liste: Optional[List[Dict]] = None      # Tours par ID décroissant (cache)
+        # Écritures reçues pendant une lecture de Supabase, rejouées sur son résultat
+        self._ecritures_pendant: Optional[List] = None
+        self._pid = None
+        backend.add_write_listener(self._sur_ecriture)
+
+    # --- Synchronisation ---
+
+    def _demarrer(self):
+        """Lance le thread de synchronisation du processus courant (après un fork, le thread du parent n'existe plus)"""
+        if self._pid == os.getpid():
+            return
+        with self.verrou:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._boucle, name='replique-supabase', daemon=True).start()
+
+    def _boucle(self):
+        while True:
+            try:
+                self.synchroniser()
+            except Exception as e:
+                print(f"[ERROR] Synchronisation de la réplique: {e}")
+            time.sleep(REPLICA_SYNC_INTERVAL)
+
+    def _maj_curseur(self, lignes: List[Dict]):
+        for ligne in lignes:
+            maj = ligne.get('updated_at')
+            if maj and (self.curseur_maj is None or maj > self.curseur_maj):
+                self.curseur_maj = maj
+
+    def _lire_lignes(self, **filtres) -> Optional[List[Dict]]:
+        """
+        Lit des lignes de rides ; les écritures de ce worker faites pendant la lecture sont
+        retenues pour être rejouées sur le résultat (voir _rejouer_ecritures)
+        """
+        with self.verrou:
+            self._ecritures_pendant = []
+        lignes = self.backend.get_rows_since(self.backend.TABLE_NAME, **filtres)
+        if lignes is None:
+            with self.verrou:
+                self._ecritures_pendant = None
+        return lignes
+
+    def _rejouer_ecritures(self, tours: Dict[int, Dict]):
+        """
+        Réapplique à `tours` les écritures faites pendant la lecture (appelé sous self.verrou) :
+        la lecture a pu commencer avant elles, ses lignes ne doivent pas les annuler
+        """
+        for evenement, lignes in self._ecritures_pendant or []:
+            self._appliquer(tours, evenement, lignes)
+        self._ecritures_pendant = None
+
+    def _charger_tout(self) -> bool:
+        lignes = self._lire_lignes()
+        if lignes is None:
+            return False
+        with self.verrou:
+            avant = self.tours
+            self.tours = {ligne['id']: ligne for ligne in lignes}
+            self._rejouer_ecritures(self.tours)
+            self.curseur_maj = None
+            self._maj_curseur(lignes)
+            self.synchro_complete_a = time.monotonic()
+            if self.tours != avant:
+                self._liste = None
+                self.backend.bump_data_version()
+        return True
+
+    def synchroniser(self) -> bool:
+        """Un cycle de synchronisation ; False si Supabase n'a pas répondu (la copie vieillit)"""
+        complete = (self.synchro_complete_a is None
+                    or time.monotonic() - self.synchro_complete_a >= REPLICA_FULL_SYNC_INTERVAL)
+        if complete:
+            if not self._charger_tout():
+                return False
+        else:
+            with self.verrou:
+                dernier_id = max(self.tours, default=0)
+                curseur = self.curseur_maj
+            if not self.backend.check_schema()['updated_at']:
+                curseur = None
+            lignes = self._lire_lignes(after_id=dernier_id, updated_after=curseur)
+            if lignes is None:
+                return False
+            with self.verrou:
+                changees = [l for l in lignes if self.tours.get(l['id']) != l]
+                for ligne in changees:
+                    self.tours[ligne['id']] = ligne
+                self._rejouer_ecritures(self.tours)
+                self._maj_curseur(lignes)
+                if changees:
+                    self._liste = None
+                    self.backend.bump_data_version()
+                copie = {'latest_id': max(self.tours, default=None), 'count': len(self.tours)}
+            # Suppressions faites par un autre worker : visibles seulement dans le nombre de lignes
+            head = self.backend.get_tours_head()
+            if head is None:
+                return False
+            if head != copie and not self._charger_tout():
+                return False
+
+        entretien = self.backend.get_rows_since(self.backend.ENTRETIEN_TABLE)
+        if entretien is None:
+            return False
+        with self.verrou:
+            self.entretien = entretien
+            self.synchro_a = time.monotonic()
+        return True
+
+    @staticmethod
+    def _appliquer(tours: Dict[int, Dict], evenement: str, lignes: List[Dict]):
+        for ligne in lignes:
+            tour_id = ligne.get('id')
+            if evenement == 'delete':
+                tours.pop(tour_id, None)
+            elif evenement == 'update':
+                # Mise à jour partielle possible (ajout de photos : id + photos) ; un tour
+                # absent de la copie sera lu à la prochaine synchronisation
+                if tour_id in tours:
+                    tours[tour_id] = {**tours[tour_id], **ligne}
+            else:
+                tours[tour_id] = ligne
+
+    def _sur_ecriture(self, evenement: str, lignes: List[Dict]):
+        """Listener des écritures Supabase de ce worker : appliquées tout de suite à la copie"""
+        with self.verrou:
+            self._appliquer(self.tours, evenement, lignes)
+            if self._ecritures_pendant is not None:
+                self._ecritures_pendant.append((evenement, lignes))
+            self._liste = None
+
+    def _rafraichir_entretien(self):
+        """Après une écriture entretien (rare) : relecture de la table, petite"""
+        entretien = self.backend.get_rows_since(self.backend.ENTRETIEN_TABLE)
+        with self.verrou:
+            # En cas d'échec, la copie n'est plus fiable : lectures depuis Supabase jusqu'à la prochaine synchronisation
+            self.entretien = entretien
+
+    def fraiche(self) -> bool:
+        """True si la copie peut servir les lectures"""
+        self._demarrer()
+        synchro_a = self.synchro_a
+        return synchro_a is not None and time.monotonic() - synchro_a <= REPLICA_MAX_STALENESS
+
+    # --- Lectures (même contrat que database.py) ---
+
+    def _tours_tries(self) -> List[Dict]:
+        with self.verrou:
+            if self._liste is None:
+                self._liste = sorted(self.tours.values(), key=lambda t: t['id'], reverse=True)
+            return self._liste
+
+    def get_all_tours(self) -> List[Dict]:
+        if not self.fraiche():
+            return self.backend.get_all_tours()
+        return list(self._tours_tries())
+
+    @staticmethod
+    def _dans_periode(tour: Dict, date_from, date_to) -> bool:
+        """Même filtre que Supabase sur ride_date (sans la colonne : pas de filtre, refait par l'appelant)"""
+        if 'ride_date' not in tour or not (date_from or date_to):
+            return True
+        jour = tour['ride_date']
+        return (jour is not None
+                and (not date_from or jour >= date_from.isoformat())
+                and (not date_to or jour <= date_to.isoformat()))
+
+    def get_tours_page(self, utilisateur: Optional[str] = None, limit: int = 50, before_id: Optional[int] = None,
+                       date_from=None, date_to=None) -> Optional[List[Dict]]:
+        if not self.fraiche():
+            return self.backend.get_tours_page(utilisateur, limit, before_id, date_from, date_to)
+        page = []
+        for tour in self._tours_tries():
+            if before_id is not None and tour['id'] >= before_id:
+                continue
+            if utilisateur and normaliser_utilisateur(tour.get('utilisateur')) != utilisateur:
+                continue
+            if not self._dans_periode(tour, date_from, date_to):
+                continue
+            page.append(tour)
+            if len(page) >= limit:
+                break
+        return page
+
+    def get_tours_head(self) -> Optional[Dict]:
+        if not self.fraiche():
+            return self.backend.get_tours_head()
+        with self.verrou:
+            return {'latest_id': max(self.tours, default=None), 'count': len(self.tours)}
+
+    def get_ride_aggregates(self, today=None) -> Optional[List[Dict]]:
+        """Copie à jour : None, l'application agrège elle-même depuis la copie (sans réseau)"""
+        if self.fraiche():
+            return None
+        return self.backend.get_ride_aggregates(today)
+
+    def get_all_entretien(self) -> List[Dict]:
+        if not self.fraiche() or self.entretien is None:
+            return self.backend.get_all_entretien()
+        return list(self.entretien)
+
+    # --- Écritures entretien (les tours passent par les listeners) ---
+
+    def add_entretien(self, data: Dict):
+        resultat = self.backend.add_entretien(data)
+        self._rafraichir_entretien()
+        return resultat
+
+    def update_entretien(self, entretien_id: int, data: Dict) -> bool:
+        resultat = self.backend.update_entretien(entretien_id, data)
+        self._rafraichir_entretien()
+        return resultat
+
+    def delete_entretien(self, entretien_id: int) -> bool:
+        resultat = self.backend.delete_entretien(entretien_id)
+        self._rafraichir_entretien()
+        return resultat
+
+    def upload_entretien_file(self, entretien_id: int, file_content: bytes, filename: str, content_type: str, field: str = 'photo_velo'):
+        resultat = self.backend.upload_entretien_file(entretien_id, file_content, filename, content_type, field)
+        self._rafraichir_entretien()
+        return resultat
@@ -6,12 +6,20 @@ const API_BASE = '';
 const BADGE_STORAGE_KEY = 'opas_bicycle_badge_count';
 const TOUR_DU_MONDE_KM = 40075;
 
-let toursData = { tours: [], stats: {}, progression: {} };
+let toursData = { stats: {}, progression: {} };
 let currentModalTour = null;
 let garageKmFromTours = { Oswald: 0, Titine: 0, Alexandre: 0, Damien: 0 };
 let lastKnownVersion = null;
 let lastKnownToursCount = 0;
 let lastKnownFirstTourId = null;
+let lastToursEtag = null;
+let lastGarageEtag = null;
+let lastGarageData = null;
+
+const HISTORY_USERS = ['Oswald', 'Titine', 'Alexandre', 'Damien'];
+const HISTORY_PAGE_SIZE = 20;
+let historyState = {};
+let historyObserver = null;
 
 document.addEventListener('DOMContentLoaded', () => { initializeApp(); });
 
@@ -75,7 +83,7 @@ function initNavigation() {
     if (addForm) addForm.addEventListener('submit', handleAddBikeSubmit);
 }
 
-async function loadEntries() {
+async function loadEntries(refreshHistory) {
     const statsSection = document.getElementById('statsSection');
     const progressionSection = document.getElementById('progressionSection');
     const challengeSection = document.getElementById('challengeSection');
@@ -86,10 +94,17 @@ async function loadEntries() {
     try {
         const controller = new AbortController();
         const timeoutId = setTimeout(() => controller.abort(), 10000);
-        const response = await fetch(`${API_BASE}/api/tours`, { signal: controller.signal });
+        const headers = lastToursEtag ? { 'If-None-Match': lastToursEtag } : {};
+        const response = await fetch(`${API_BASE}/api/tours?tours=0`, { signal: controller.signal, headers, cache: 'no-store' });
         clearTimeout(timeoutId);
+        if (response.status === 304) {
+            // Stats inchangées ; une photo ou la météo d'un tour ne changent que l'historique
+            if (refreshHistory) resetHistory();
+            return;
+        }
         if (!response.ok) throw new Error(`HTTP ${response.status}`);
         const data = await response.json();
+        lastToursEtag = response.headers.get('ETag');
         toursData = data;
         if (statsSection) statsSection.style.display = 'block';
         if (progressionSection) progressionSection.style.display = 'block';
@@ -100,10 +115,11 @@ async function loadEntries() {
         const ch = data.challenge || emptyChallenge;
         updateChallenge(ch);
         updateHistoryComparativeBar(ch);
-        if (data.tours && data.tours.length > 0) displayTours(data.tours);
+        const head = data.head || { count: 0, latest_id: null };
+        if (head.count > 0) resetHistory();
         else setEmptyToursLists();
-        lastKnownToursCount = (data.tours || []).length;
-        lastKnownFirstTourId = (data.tours && data.tours[0]) ? data.tours[0]._index : null;
+        lastKnownToursCount = head.count;
+        lastKnownFirstTourId = head.latest_id;
     } catch (err) {
         console.error('Erreur chargement tours:', err);
         if (statsSection) statsSection.style.display = 'block';
@@ -141,37 +157,61 @@ function initHistoryTabs() {
     });
 }
 
-function displayTours(tours) {
-    const lists = { Oswald: document.getElementById('toursListOswald'), Titine: document.getElementById('toursListTitine'), Alexandre: document.getElementById('toursListAlexandre'), Damien: document.getElementById('toursListDamien') };
-    Object.values(lists).forEach(el => { if (el) el.innerHTML = ''; });
-    if (!tours || tours.length === 0) { Object.values(lists).forEach(el => { if (el) el.innerHTML = '<p class="empty-history">Keine Touren</p>'; }); return; }
-    const toursByUser = { Oswald: [], Titine: [], Alexandre: [], Damien: [] };
-    tours.forEach(t => { const u = normalizeUser(t.Utilisateur); if (toursByUser[u]) toursByUser[u].push(t); else toursByUser.Oswald.push(t); });
-    ['Oswald', 'Titine', 'Alexandre', 'Damien'].forEach(user => {
-        const tourList = toursByUser[user];
-        const targetList = lists[user];
-        if (!targetList) return;
-        if (tourList.length === 0) { targetList.innerHTML = '<p class="empty-history">Keine Touren</p>'; return; }
-        tourList.forEach((tour, displayIndex) => {
-            const tourItem = document.createElement('div');
-            const userClass = `tour-item-${user.toLowerCase()}`;
-            tourItem.className = `tour-item tour-item-clickable ${userClass}`;
-            const realIndex = tour._index !== undefined ? tour._index : displayIndex;
-            const tourDataAttr = JSON.stringify(tour).replace(/"/g, '&quot;');
-            const photos = tour.photos && Array.isArray(tour.photos) ? tour.photos : [];
-            const hasPhotos = photos.length > 0;
-            const firstPhotoUrl = hasPhotos ? photos[0] : '';
-            const photoPreviewHtml = hasPhotos ? `<div class="tour-photo-preview" title="Fotos anzeigen"><img src="${escapeHtml(firstPhotoUrl)}" alt="" onerror="this.style.display='none';this.nextElementSibling.style.display='flex';"><span class="tour-photo-icon-fallback" style="display:none">📸</span></div>` : '';
-            const parsed = parseTourDate(tour.Date);
-            const photoThumbHtml = hasPhotos ? `<div class="tour-photo-compact"><img src="${escapeHtml(firstPhotoUrl)}" alt="" onerror="this.style.display='none';this.nextElementSibling.style.display='flex';"><span class="tour-photo-icon-fallback" style="display:none">📸</span></div>` : '';
-            const userKey = user.toLowerCase();
-            const userEmojiMap = { Oswald: '🌳', Titine: '🌸', Alexandre: '🌴', Damien: '⚡' };
-            tourItem.innerHTML = `<div class="tour-mobile-row"><div class="tour-mobile-calendar"><div class="tour-date-icon"><span class="tour-cal-day">${parsed.day}</span><span class="tour-cal-month">${parsed.month}</span></div></div><div class="tour-mobile-center"><span class="tour-mobile-km">${formatDistance(tour.Km || 0)}</span>${photoThumbHtml}</div><button class="btn-details" type="button">Détails</button></div>${photoPreviewHtml}<div class="tour-field tour-desktop-only"><strong>Datum</strong><div class="tour-datum-row"><div class="tour-date-icon" title="${escapeHtml(tour.Date || '')}"><span class="tour-cal-day">${parsed.day}</span><span class="tour-cal-month">${parsed.month}</span></div><span>${tour.Date || ''}</span></div><span class="tour-user-pill tour-user-pill-${userKey}" title="${user}">${userEmojiMap[user] || '🚲'} ${user}</span>${tour.Wetter && String(tour.Wetter).trim() && tour.Wetter !== 'N/A' ? `<span class="tour-wetter">🌤️ ${escapeHtml(String(tour.Wetter).trim())}</span>` : ''}</div><div class="tour-field tour-desktop-only"><strong>Start</strong><span>${tour.Start || ''}</span></div><div class="tour-field tour-desktop-only"><strong>Ziel</strong><span>${tour.Ziel || ''}</span></div><div class="tour-field tour-desktop-only"><strong>Km</strong><span>${formatDistance(tour.Km || 0)}</span></div>${tour.Etape && tour.Etape !== 'NaN' && tour.Etape !== 'nan' && tour.Etape !== 'N/A' ? `<div class="tour-field tour-desktop-only"><strong>Etape</strong><span>${tour.Etape}</span></div>` : ''}${tour.Bemerkungen && String(tour.Bemerkungen).trim() ? `<div class="tour-remark tour-desktop-only">${escapeHtml(String(tour.Bemerkungen).trim())}</div>` : ''}<button class="btn-delete tour-desktop-only" onclick="event.stopPropagation(); deleteTour(${realIndex})" title="Löschen">❌</button>`;
-            tourItem.setAttribute('data-tour', tourDataAttr);
-            tourItem.addEventListener('click', (e) => { if (!e.target.closest('.btn-delete')) { const data = tourItem.getAttribute('data-tour').replace(/&quot;/g, '"'); openTourModal(JSON.parse(data)); } });
-            targetList.appendChild(tourItem);
-        });
-    });
+// Historique paginé : une page par utilisateur, la suivante quand la fin de liste devient visible
+function resetHistory() {
+    HISTORY_USERS.forEach(user => { historyState[user] = { nextBeforeId: null, hasMore: true, loading: false }; loadHistoryPage(user); });
+}
+
+async function loadHistoryPage(user) {
+    const state = historyState[user], list = document.getElementById(`toursList${user}`);
+    if (!state || !list || state.loading || !state.hasMore) return;
+    state.loading = true;
+    try {
+        const params = new URLSearchParams({ user, limit: String(HISTORY_PAGE_SIZE) });
+        if (state.nextBeforeId !== null) params.set('before_id', String(state.nextBeforeId));
+        const res = await fetch(`${API_BASE}/api/tours?${params}`, { cache: 'no-store' });
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const data = await res.json();
+        if (historyState[user] !== state) return; // Historique réinitialisé entre-temps
+        if (state.nextBeforeId === null) list.innerHTML = '';
+        (data.tours || []).forEach(tour => list.appendChild(buildTourItem(tour, user)));
+        state.hasMore = !!data.has_more;
+        state.nextBeforeId = data.next_before_id ?? null;
+        if (!list.querySelector('.tour-item')) list.innerHTML = '<p class="empty-history">Keine Touren</p>';
+    } catch (err) { console.error(`Erreur historique ${user}:`, err); state.hasMore = false; }
+    finally { state.loading = false; }
+    if (historyState[user] === state) updateHistorySentinel(user, list);
+}
+
+function updateHistorySentinel(user, list) {
+    let sentinel = list.querySelector('.history-sentinel');
+    if (!historyState[user].hasMore) { if (sentinel) { if (historyObserver) historyObserver.unobserve(sentinel); sentinel.remove(); } return; }
+    if (typeof IntersectionObserver === 'undefined') { loadHistoryPage(user); return; }
+    if (!historyObserver) historyObserver = new IntersectionObserver(entries => entries.forEach(e => { if (e.isIntersecting) loadHistoryPage(e.target.dataset.user); }), { rootMargin: '200px' });
+    if (!sentinel) { sentinel = document.createElement('div'); sentinel.className = 'history-sentinel'; sentinel.dataset.user = user; historyObserver.observe(sentinel); }
+    list.appendChild(sentinel);
+    // Page courte : la sentinelle est encore visible, l'observer ne se redéclenchera pas
+    if (sentinel.offsetParent !== null && sentinel.getBoundingClientRect().top < window.innerHeight + 200) loadHistoryPage(user);
+}
+
+function buildTourItem(tour, user) {
+    const tourItem = document.createElement('div');
+    const userClass = `tour-item-${user.toLowerCase()}`;
+    tourItem.className = `tour-item tour-item-clickable ${userClass}`;
+    const realIndex = tour._index;
+    const tourDataAttr = JSON.stringify(tour).replace(/"/g, '&quot;');
+    const photos = tour.photos && Array.isArray(tour.photos) ? tour.photos : [];
+    const hasPhotos = photos.length > 0;
+    const firstPhotoUrl = hasPhotos ? photoUrl(photos[0], 'thumb') : '';
+    const photoPreviewHtml = hasPhotos ? `<div class="tour-photo-preview" title="Fotos anzeigen"><img src="${escapeHtml(firstPhotoUrl)}" alt="" loading="lazy" onerror="this.style.display='none';this.nextElementSibling.style.display='flex';"><span class="tour-photo-icon-fallback" style="display:none">📸</span></div>` : '';
+    const parsed = parseTourDate(tour.Date);
+    const photoThumbHtml = hasPhotos ? `<div class="tour-photo-compact"><img src="${escapeHtml(firstPhotoUrl)}" alt="" loading="lazy" onerror="this.style.display='none';this.nextElementSibling.style.display='flex';"><span class="tour-photo-icon-fallback" style="display:none">📸</span></div>` : '';
+    const userKey = user.toLowerCase();
+    const userEmojiMap = { Oswald: '🌳', Titine: '🌸', Alexandre: '🌴', Damien: '⚡' };
+    tourItem.innerHTML = `<div class="tour-mobile-row"><div class="tour-mobile-calendar"><div class="tour-date-icon"><span class="tour-cal-day">${parsed.day}</span><span class="tour-cal-month">${parsed.month}</span></div></div><div class="tour-mobile-center"><span class="tour-mobile-km">${formatDistance(tour.Km || 0)}</span>${photoThumbHtml}</div><button class="btn-details" type="button">Détails</button></div>${photoPreviewHtml}<div class="tour-field tour-desktop-only"><strong>Datum</strong><div class="tour-datum-row"><div class="tour-date-icon" title="${escapeHtml(tour.Date || '')}"><span class="tour-cal-day">${parsed.day}</span><span class="tour-cal-month">${parsed.month}</span></div><span>${tour.Date || ''}</span></div><span class="tour-user-pill tour-user-pill-${userKey}" title="${user}">${userEmojiMap[user] || '🚲'} ${user}</span>${tour.Wetter && String(tour.Wetter).trim() && tour.Wetter !== 'N/A' ? `<span class="tour-wetter">🌤️ ${escapeHtml(String(tour.Wetter).trim())}</span>` : ''}</div><div class="tour-field tour-desktop-only"><strong>Start</strong><span>${tour.Start || ''}</span></div><div class="tour-field tour-desktop-only"><strong>Ziel</strong><span>${tour.Ziel || ''}</span></div><div class="tour-field tour-desktop-only"><strong>Km</strong><span>${formatDistance(tour.Km || 0)}</span></div>${tour.Etape && tour.Etape !== 'NaN' && tour.Etape !== 'nan' && tour.Etape !== 'N/A' ? `<div class="tour-field tour-desktop-only"><strong>Etape</strong><span>${tour.Etape}</span></div>` : ''}${tour.Bemerkungen && String(tour.Bemerkungen).trim() ? `<div class="tour-remark tour-desktop-only">${escapeHtml(String(tour.Bemerkungen).trim())}</div>` : ''}<button class="btn-delete tour-desktop-only" onclick="event.stopPropagation(); deleteTour(${realIndex})" title="Löschen">❌</button>`;
+    tourItem.setAttribute('data-tour', tourDataAttr);
+    tourItem.addEventListener('click', (e) => { if (!e.target.closest('.btn-delete')) { const data = tourItem.getAttribute('data-tour').replace(/&quot;/g, '"'); openTourModal(JSON.parse(data)); } });
+    return tourItem;
 }
 
 function updateStats(data) {
@@ -238,8 +278,9 @@ async function loadGarage() {
     const gallery = document.getElementById('garageGallery');
     if (!gallery) return;
     try {
-        const res = await fetch(`${API_BASE}/api/entretien`);
-        const data = await res.json();
+        const res = await fetch(`${API_BASE}/api/entretien`, { headers: lastGarageEtag && lastGarageData ? { 'If-None-Match': lastGarageEtag } : {}, cache: 'no-store' });
+        const data = res.status === 304 ? lastGarageData : await res.json();
+        if (res.status !== 304) { lastGarageEtag = res.headers.get('ETag'); lastGarageData = data; }
         garageKmFromTours = data.km_from_tours || garageKmFromTours;
         renderGarageCards(data.bikes || []);
     } catch (e) { console.error('Garage load:', e); gallery.innerHTML = '<p class="garage-empty">Fehler beim Laden.</p>'; }
@@ -387,11 +428,11 @@ function openTourModal(tour) {
     if (shareBtn) shareBtn.onclick = () => { const subject = encodeURIComponent(`Tour ${tour.Date || ''}`); const body = encodeURIComponent(`${startPlace} → ${zielPlace}\n${formatDistance(tour.Km || 0)}\nWetter: ${tour.Wetter || '—'}`); window.location.href = `mailto:?subject=${subject}&body=${body}`; };
     const photosWrap = document.getElementById('modalPhotosWrap'), photosGrid = document.getElementById('modalPhotosGrid');
     const photos = tour.photos && Array.isArray(tour.photos) ? tour.photos : [];
-    if (photos.length > 0 && photosGrid) { if (photosWrap) photosWrap.style.display = 'block'; photosGrid.innerHTML = photos.map(url => `<a href="${escapeHtml(url)}" target="_blank" rel="noopener" class="modal-photo-item"><img src="${escapeHtml(url)}" alt="Photo"></a>`).join(''); } else { if (photosWrap) photosWrap.style.display = 'none'; if (photosGrid) photosGrid.innerHTML = ''; }
+    if (photos.length > 0 && photosGrid) { if (photosWrap) photosWrap.style.display = 'block'; photosGrid.innerHTML = photos.map(p => `<a href="${escapeHtml(photoUrl(p, 'url'))}" target="_blank" rel="noopener" class="modal-photo-item"><img src="${escapeHtml(photoUrl(p, 'medium'))}" alt="Photo" loading="lazy"></a>`).join(''); } else { if (photosWrap) photosWrap.style.display = 'none'; if (photosGrid) photosGrid.innerHTML = ''; }
     const photoBtn = document.getElementById('modalPhotoBtn'), photoInput = document.getElementById('photoFileInput');
     if (photoBtn && photoInput && !photoBtn.disabled) {
         photoBtn.onclick = () => photoInput.click();
-        photoInput.onchange = (e) => { const file = e.target.files?.[0]; if (!file || !tour._index) return; if (file.size > 5 * 1024 * 1024) { showToast('Image trop lourde (max 5 Mo)', 'error'); photoInput.value = ''; return; } uploadTourPhoto(tour._index, file); photoInput.value = ''; };
+        photoInput.onchange = (e) => { const files = Array.from(e.target.files || []); if (!files.length || !tour._index) return; if (files.some(f => f.size > 5 * 1024 * 1024)) { showToast('Image trop lourde (max 5 Mo)', 'error'); photoInput.value = ''; return; } if (files.length > 10) { showToast('Max. 10 photos par envoi', 'error'); photoInput.value = ''; return; } if (files.length === 1) uploadTourPhoto(tour._index, files[0]); else uploadTourPhotos(tour._index, files); photoInput.value = ''; };
     }
 }
 
@@ -400,7 +441,20 @@ async function uploadTourPhoto(tourId, file) {
     try {
         const fd = new FormData(); fd.append('photo', file);
         const res = await fetch(`${API_BASE}/api/tours/${tourId}/photos`, { method: 'POST', body: fd }), data = await res.json();
-        if (data.success) { showToast('Photo ajoutée ! 📸', 'success'); await loadEntries(); const updated = toursData.tours && toursData.tours.find(t => t._index === tourId); if (updated && currentModalTour && currentModalTour._index === tourId) { currentModalTour.photos = updated.photos || []; openTourModal(currentModalTour); } } else showToast(data.error || 'Erreur', 'error');
+        if (data.success) { showToast('Photo ajoutée ! 📸', 'success'); await loadEntries(true); if (currentModalTour && currentModalTour._index === tourId) { currentModalTour.photos = [...(currentModalTour.photos || []), data.photo || data.url]; openTourModal(currentModalTour); } } else showToast(data.error || 'Erreur', 'error');
+    } catch (err) { showToast('Erreur upload', 'error'); }
+    finally { if (photoBtn) { photoBtn.disabled = false; photoBtn.textContent = '📸 Ajouter des photos'; } }
+}
+
+// Plusieurs photos en une requête : uploads parallèles côté serveur, résultat par fichier
+async function uploadTourPhotos(tourId, files) {
+    const photoBtn = document.getElementById('modalPhotoBtn'); if (photoBtn) { photoBtn.disabled = true; photoBtn.textContent = `⏳ Envoi (${files.length})...`; }
+    try {
+        const fd = new FormData(); files.forEach(f => fd.append('photos', f));
+        const res = await fetch(`${API_BASE}/api/tours/${tourId}/photos/batch`, { method: 'POST', body: fd }), data = await res.json();
+        const results = data.results || [], added = results.filter(r => r.success).map(r => r.photo), failed = results.length - added.length;
+        if (added.length) { showToast(failed ? `${added.length} photo(s) ajoutée(s), ${failed} en erreur` : `${added.length} photos ajoutées ! 📸`, failed ? 'error' : 'success'); await loadEntries(true); if (currentModalTour && currentModalTour._index === tourId) { currentModalTour.photos = [...(currentModalTour.photos || []), ...added]; openTourModal(currentModalTour); } }
+        else showToast(data.error || (results[0] && results[0].error) || 'Erreur', 'error');
     } catch (err) { showToast('Erreur upload', 'error'); }
     finally { if (photoBtn) { photoBtn.disabled = false; photoBtn.textContent = '📸 Ajouter des photos'; } }
 }
@@ -449,23 +503,57 @@ function setStoredBadgeCount(n) { try { localStorage.setItem(BADGE_STORAGE_KEY,
 function incrementAppBadge() { const count = getStoredBadgeCount() + 1; setStoredBadgeCount(count); setAppBadgeSafe(count); }
 function clearAppBadge() { setStoredBadgeCount(0); clearAppBadgeSafe(); }
 
+let liveCheckTimer = null;
+let liveEventSource = null;
+const LIVE_EVENTS_RETRY_MS = 60000;
+
 async function startLiveNotificationCheck() {
-    try { const verRes = await fetch(`${API_BASE}/api/version`); if (verRes.ok) { const v = await verRes.json(); lastKnownVersion = v.version || null; } } catch (_) {}
-    setInterval(checkForUpdates, 60000);
+    if (liveCheckTimer || liveEventSource) return;
+    try { const headRes = await fetch(`${API_BASE}/api/tours/head`, { cache: 'no-store' }); if (headRes.ok) { const h = await headRes.json(); lastKnownVersion = h.app_version || null; } } catch (_) {}
+    if (typeof EventSource !== 'undefined') startLiveEvents();
+    else liveCheckTimer = setInterval(checkForUpdates, 60000);
+}
+
+function startLiveEvents(reconnect) {
+    // EventSource se reconnecte tout seul et renvoie Last-Event-ID : pas de polling
+    if (liveEventSource) return;
+    liveEventSource = new EventSource(`${API_BASE}/api/events`);
+    // Nouvelle connexion sans Last-Event-ID : les événements manqués sont couverts par un rechargement
+    if (reconnect) liveEventSource.addEventListener('open', () => loadEntries(true), { once: true });
+    // 503 (trop de flux ouverts) : EventSource abandonne ; vérification ponctuelle puis nouvel essai plus tard
+    liveEventSource.onerror = () => {
+        if (!liveEventSource || liveEventSource.readyState !== EventSource.CLOSED) return;
+        liveEventSource = null;
+        checkForUpdates();
+        setTimeout(() => startLiveEvents(true), LIVE_EVENTS_RETRY_MS);
+    };
+    const onToursChanged = () => { if (document.hidden) incrementAppBadge(); loadEntries(); };
+    ['tour_added', 'tour_deleted'].forEach(type => liveEventSource.addEventListener(type, onToursChanged));
+    // Photo, météo différée ou resynchronisation : l'historique est rechargé même si les stats n'ont pas changé (304)
+    const onHistoryChanged = () => { if (document.hidden) incrementAppBadge(); loadEntries(true); };
+    ['tour_updated', 'photo_added', 'resync'].forEach(type => liveEventSource.addEventListener(type, onHistoryChanged));
+    liveEventSource.addEventListener('entretien_changed', () => { const garageEl = document.getElementById('section-garage'); if (garageEl && !garageEl.classList.contains('section-hidden')) loadGarage(); });
+    liveEventSource.addEventListener('version_changed', () => { const banner = document.getElementById('liveNotificationBanner'); if (banner) banner.style.display = 'flex'; incrementAppBadge(); });
 }
 
 function checkForUpdates() {
     (async () => {
         let hasNew = false;
-        try { const verRes = await fetch(`${API_BASE}/api/version`); if (verRes.ok) { const v = await verRes.json(); const cur = v.version || null; if (lastKnownVersion !== null && cur !== null && cur !== lastKnownVersion) hasNew = true; } } catch (_) {}
-        if (!hasNew) { try { const res = await fetch(`${API_BASE}/api/tours`); if (res.ok) { const data = await res.json(); const tours = data.tours || []; if (tours.length > lastKnownToursCount) hasNew = true; if (!hasNew && tours.length > 0 && tours[0]._index !== lastKnownFirstTourId) hasNew = true; } } catch (_) {} }
+        try {
+            const res = await fetch(`${API_BASE}/api/tours/head`, { cache: 'no-store' });
+            if (res.ok) {
+                const h = await res.json();
+                if (lastKnownVersion !== null && h.app_version && h.app_version !== lastKnownVersion) hasNew = true;
+                if ((h.count || 0) > lastKnownToursCount) hasNew = true;
+                if (!hasNew && h.count > 0 && h.latest_id !== lastKnownFirstTourId) hasNew = true;
+            }
+        } catch (_) {}
         if (hasNew) { const banner = document.getElementById('liveNotificationBanner'); if (banner) banner.style.display = 'flex'; incrementAppBadge(); }
     })();
 }
 
 function initLiveNotification() { const btn = document.getElementById('liveNotificationBtn'); if (btn) btn.addEventListener('click', () => { clearAppBadge(); window.location.reload(true); }); }
 
-function normalizeUser(u) { const v = (u || 'Oswald').trim(); if (v === 'Opa') return 'Oswald'; return ['Oswald', 'Titine', 'Alexandre', 'Damien'].includes(v) ? v : 'Oswald'; }
 
 function parseTourDate(dateStr) {
     if (!dateStr || typeof dateStr !== 'string') return { day: '?', month: '?' };
@@ -480,6 +568,8 @@ function formatNumber(num, decimals) { const n = Number(num); if (isNaN(n)) retu
 function formatDistance(km) { return `${formatNumber(km, 1)} km`; }
 function formatPercent(pct) { return `${formatNumber(pct, 1)} %`; }
 function escapeHtml(text) { const div = document.createElement('div'); div.textContent = text; return div.innerHTML; }
+// Élément de tour.photos : URL seule (anciennes photos) ou { url, medium, thumb }
+function photoUrl(photo, size) { if (!photo) return ''; if (typeof photo === 'string') return photo; return photo[size] || photo.url || ''; }
 function showToast(message, type) { const toast = document.getElementById('toast'); if (!toast) return; toast.textContent = message; toast.className = `toast ${type || 'success'} show`; setTimeout(() => toast.classList.remove('show'), 3000); }
 function celebrate() { for (let i = 0; i < 50; i++) createConfetti(); }
 function getRandomColor() { const colors = ['#4caf50', '#2196f3', '#ff9800', '#f44336', '#9c27b0', '#00bcd4']; return colors[Math.floor(Math.random() * colors.length)]; }
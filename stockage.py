@@ -0,0 +1,79 @@
+"""
+Choix du backend de stockage des tours et de l'entretien (variable STORAGE_BACKEND) :
+- supabase : database.py (Postgres + Storage distants) ;
+- sqlite : stockage_sqlite.py (fichier local en mode WAL, fichiers sur disque) ;
+- csv : journal_velo.csv (stockage_csv.py), tours seulement, sans photos ni Garage.
+Par défaut supabase si SUPABASE_URL et SUPABASE_KEY sont définis, sinon csv.
+Avec Supabase et SUPABASE_REPLICA=true, les lectures passent par une réplique locale
+(replique.py).
+
+Supabase et SQLite implémentent les mêmes fonctions (INTERFACE) avec le même format
+de lignes (colonnes de la table rides) ; app.py les importe depuis ce module.
+"""
+import importlib
+import os
+
+BACKENDS = {'supabase': 'database', 'sqlite': 'stockage_sqlite', 'csv': None}
+
+# Fonctions communes aux backends en base
+INTERFACE = (
+    'get_all_tours', 'get_tours_page', 'get_tours_head', 'get_ride_aggregates', 'tour_exists',
+    'add_tour', 'update_tour', 'delete_tour',
+    'upload_photo_to_tour', 'upload_photos_to_tour',
+    'get_all_entretien', 'add_entretien', 'update_entretien', 'delete_entretien', 'upload_entretien_file',
+    'get_data_version', 'add_write_listener',
+)
+
+
+def _backend_configure() -> str:
+    nom = os.getenv('STORAGE_BACKEND', '').strip().lower()
+    if nom in BACKENDS:
+        return nom
+    if nom:
+        print(f"[ERROR] STORAGE_BACKEND inconnu '{nom}' (supabase, sqlite ou csv) : choix par défaut")
+    return 'supabase' if os.getenv('SUPABASE_URL') and os.getenv('SUPABASE_KEY') else 'csv'
+
+
+def charger_backend(nom: str):
+    """Module implémentant INTERFACE pour le backend `nom` (database pour csv : fonctions non utilisées)"""
+    module = importlib.import_module(BACKENDS[nom] or 'database')
+    manquantes = [f for f in INTERFACE if not callable(getattr(module, f, None))]
+    if manquantes:
+        raise ImportError(f"Backend {nom} incomplet : {', '.join(manquantes)}")
+    return module
+
+
+STORAGE_BACKEND = _backend_configure()
+_backend = charger_backend(STORAGE_BACKEND)
+
+get_all_tours = _backend.get_all_tours
+get_tours_page = _backend.get_tours_page
+get_tours_head = _backend.get_tours_head
+get_ride_aggregates = _backend.get_ride_aggregates
+tour_exists = _backend.tour_exists
+add_tour = _backend.add_tour
+update_tour = _backend.update_tour
+delete_tour = _backend.delete_tour
+upload_photo_to_tour = _backend.upload_photo_to_tour
+upload_photos_to_tour = _backend.upload_photos_to_tour
+get_all_entretien = _backend.get_all_entretien
+add_entretien = _backend.add_entretien
+update_entretien = _backend.update_entretien
+delete_entretien = _backend.delete_entretien
+upload_entretien_file = _backend.upload_entretien_file
+get_data_version = _backend.get_data_version
+add_write_listener = _backend.add_write_listener
+
+if STORAGE_BACKEND == 'supabase':
+    from replique import SUPABASE_REPLICA, RepliqueLecture
+    if SUPABASE_REPLICA:
+        _replique = RepliqueLecture(_backend)
+        get_all_tours = _replique.get_all_tours
+        get_tours_page = _replique.get_tours_page
+        get_tours_head = _replique.get_tours_head
+        get_ride_aggregates = _replique.get_ride_aggregates
+        get_all_entretien = _replique.get_all_entretien
+        add_entretien = _replique.add_entretien
+        update_entretien = _replique.update_entretien
+        delete_entretien = _replique.delete_entretien
+        upload_entretien_file = _replique.upload_entretien_file
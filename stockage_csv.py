@@ -0,0 +1,358 @@
+"""
+Journal CSV des tours (mode sans Supabase) en ajout seul :
+- chaque tour a un identifiant stable (colonne Id), croissant et jamais réutilisé ;
+- un ajout écrit une ligne en fin de fichier, sans relire ni réécrire le reste ;
+- une suppression ajoute la position (octet) de la ligne dans un fichier de pierres
+  tombales (<csv>.supprimes), compacté quand elles deviennent nombreuses ; une
+  modification ajoute la nouvelle version de la ligne (même Id) et enterre l'ancienne ;
+- les accès sont protégés par un verrou fcntl (<csv>.lock) partagé en lecture et
+  exclusif en écriture, valable entre les workers gunicorn ;
+- le fichier parsé et l'index Id -> position restent en mémoire tant que la date de
+  modification et la taille du fichier (et des pierres tombales) ne changent pas.
+Un ancien fichier sans colonne Id est lu avec Id = numéro de ligne, puis réécrit avec
+la colonne à la première écriture.
+"""
+import csv
+import fcntl
+import io
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+COLONNES = ["Date", "Start", "Etape", "Ziel", "Wetter", "Km", "Bemerkungen", "Utilisateur"]
+COLONNE_ID = 'Id'
+ENTETE = COLONNES + [COLONNE_ID]
+
+# Compaction quand il y a au moins CSV_COMPACT_MIN pierres tombales représentant
+# au moins CSV_COMPACT_RATIO des lignes du fichier
+CSV_COMPACT_MIN = int(os.getenv('CSV_COMPACT_MIN', '50'))
+CSV_COMPACT_RATIO = float(os.getenv('CSV_COMPACT_RATIO', '0.2'))
+
+
+class Ecriture(NamedTuple):
+    """Résultat d'une écriture : Id du tour, ligne (suppression) et versions encadrantes"""
+    index: int
+    ligne: Optional[pd.Series]
+    version_avant: tuple
+    version_apres: tuple
+
+
+def _formater(valeurs) -> bytes:
+    """Une ligne CSV encodée (valeurs manquantes -> champ vide)"""
+    tampon = io.StringIO()
+    csv.writer(tampon, lineterminator='\n').writerow(
+        ['' if v is None or (isinstance(v, float) and v != v) else v for v in valeurs])
+    return tampon.getvalue().encode('utf-8')
+
+
+def parcourir_enregistrements(chemin: str, debut: int = 0) -> Iterator[Tuple[int, List[str]]]:
+    """(position, champs) de chaque enregistrement non vide à partir de l'octet `debut` (en-tête compris)"""
+    with open(chemin, 'rb') as f:
+        f.seek(debut)
+        position = debut
+
+        def lignes():
+            nonlocal position
+            for brute in f:
+                position += len(brute)
+                yield brute.decode('utf-8')
+
+        # Un champ entre guillemets peut s'étendre sur plusieurs lignes : la position
+        # d'un enregistrement est celle atteinte à la fin du précédent
+        debut_enregistrement = position
+        for champs in csv.reader(lignes()):
+            if champs:
+                yield debut_enregistrement, champs
+            debut_enregistrement = position
+
+
+def lire_pierres_tombales(chemin: str) -> List[int]:
+    """
+    Pierres tombales du journal `chemin` : positions (octet) des lignes mortes, ou
+    numéros de ligne pour un ancien fichier sans colonne Id
+    """
+    if not os.path.exists(chemin + '.supprimes'):
+        return []
+    with open(chemin + '.supprimes') as f:
+        return [int(l) for l in f if l.strip().isdigit()]
+
+
+class JournalCsv:
+    """
+    Accès au fichier CSV des tours ; les DataFrames retournés sont indexés par Id
+    `preparer(df)` complète une seule fois chaque DataFrame lu (colonnes dérivées,
+    normalisation) ; les lectures retournent une copie du cache
+    """
+
+    def __init__(self, chemin: str, preparer: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None):
+        self.chemin = chemin
+        self.chemin_supprimes = chemin + '.supprimes'
+        self.chemin_verrou = chemin + '.lock'
+        self.preparer = preparer
+        self._verrou = threading.RLock()
+        self._version = None
+        self._df = None           # Tours vivants, préparés, indexés par Id
+        self._entete = ENTETE     # En-tête du fichier tel que lu
+        self._positions = {}      # Id -> position (octet) de la version vivante du tour
+        self._morts = set()       # Positions des lignes supprimées ou remplacées
+        self._nb_lignes = 0
+        self._prochain_id = 0
+
+    # --- Verrou et version ---
+
+    @contextmanager
+    def _verrou_fichier(self, exclusif: bool):
+        with open(self.chemin_verrou, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusif else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def version(self) -> tuple:
+        """(mtime_ns, taille) du CSV et des pierres tombales : change à chaque écriture"""
+        resultat = ()
+        for chemin in (self.chemin, self.chemin_supprimes):
+            try:
+                st = os.stat(chemin)
+                resultat += (st.st_mtime_ns, st.st_size)
+            except OSError:
+                resultat += (None, None)
+        return resultat
+
+    # --- Lecture ---
+
+    def _preparer(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.preparer(df) if self.preparer else df
+
+    def _parcourir(self, debut: int = 0) -> Iterator[Tuple[int, List[str]]]:
+        return parcourir_enregistrements(self.chemin, debut)
+
+    def _lire_a(self, position: int) -> Dict[str, str]:
+        """Valeurs brutes de l'enregistrement situé à `position`"""
+        _, champs = next(self._parcourir(position))
+        return dict(zip(self._entete, champs))
+
+    def _charger(self):
+        """Relit le fichier, les pierres tombales et reconstruit l'index (appelé sous verrou fcntl)"""
+        if os.path.exists(self.chemin) and os.path.getsize(self.chemin) > 0:
+            brut = pd.read_csv(self.chemin)
+            positions = [p for p, _ in self._parcourir()][1:]  # Sans l'en-tête
+        else:
+            brut = pd.DataFrame(columns=ENTETE)
+            positions = []
+        self._entete = list(brut.columns)
+        for colonne in COLONNES:
+            if colonne not in brut.columns:
+                brut[colonne] = None
+        tombes = lire_pierres_tombales(self.chemin)
+
+        if COLONNE_ID in brut.columns:
+            ids = pd.to_numeric(brut[COLONNE_ID], errors='coerce').fillna(-1).astype(int).tolist()
+            morts = set(tombes)
+        else:
+            # Ancien format : Id = numéro de ligne, pierres tombales = numéros de ligne
+            ids = list(range(len(brut)))
+            morts = {positions[i] for i in tombes if 0 <= i < len(positions)}
+
+        # Id -> numéro de ligne de sa version vivante ; si une version remplacée n'a pas
+        # été enterrée (écriture interrompue), la dernière du fichier l'emporte
+        vivantes = {}
+        for i, (tour_id, position) in enumerate(zip(ids, positions)):
+            if tour_id >= 0 and position not in morts:
+                vivantes[tour_id] = i
+        self._positions = {tour_id: positions[i] for tour_id, i in vivantes.items()}
+        df = brut.iloc[list(vivantes.values())].drop(columns=[COLONNE_ID], errors='ignore')
+        df.index = pd.Index(list(vivantes.keys()), dtype=int)
+        self._df = self._preparer(df.sort_index())
+        self._morts = morts
+        self._nb_lignes = len(positions)
+        self._prochain_id = max(ids, default=-1) + 1
+        self._version = self.version()
+
+    def _perime(self) -> bool:
+        return self._df is None or self._version != self.version()
+
+    def _a_jour(self):
+        """Recharge le cache si le fichier a changé (appelé sous self._verrou)"""
+        if self._perime():
+            with self._verrou_fichier(exclusif=False):
+                self._charger()
+
+    def lire(self) -> pd.DataFrame:
+        """Tours vivants (index = Id), sans reparse si le fichier n'a pas changé"""
+        with self._verrou:
+            self._a_jour()
+            return self._df.copy()
+
+    def iterer(self) -> Iterator[Tuple[int, Dict[str, str]]]:
+        """
+        Tours vivants (Id, valeurs brutes) dans l'ordre du fichier, lus en flux sans charger
+        le fichier ni le cache. Le fichier reste ouvert pendant la lecture : une compaction
+        (nouveau fichier renommé) n'affecte pas un parcours en cours
+        """
+        if not os.path.exists(self.chemin) or os.path.getsize(self.chemin) == 0:
+            return
+        with self._verrou_fichier(exclusif=False):
+            # Pierres tombales et ouverture du fichier cohérentes entre elles
+            morts = set(lire_pierres_tombales(self.chemin))
+            enregistrements = parcourir_enregistrements(self.chemin)
+            entete = next(enregistrements)[1]
+        a_id = COLONNE_ID in entete
+        for numero, (position, champs) in enumerate(enregistrements):
+            if (position if a_id else numero) in morts:
+                continue
+            valeurs = dict(zip(entete, champs))
+            yield int(valeurs[COLONNE_ID]) if a_id else numero, valeurs
+
+    def iterer_lots(self, taille: int) -> Iterator[pd.DataFrame]:
+        """
+        Tours vivants par DataFrames d'au plus `taille` lignes, parsés et préparés comme
+        ceux de lire() (index = Id) : même format que le cache, mémoire bornée par le lot
+        """
+        lot = []
+        for tour_id, valeurs in self.iterer():
+            lot.append((tour_id, valeurs))
+            if len(lot) >= taille:
+                yield self._parser_lignes(lot)
+                lot = []
+        if lot:
+            yield self._parser_lignes(lot)
+
+    def _parser_lignes(self, lignes: List[Tuple[int, Dict]]) -> pd.DataFrame:
+        """Lignes (Id, valeurs) parsées comme read_csv l'aurait fait sur le fichier (valeurs manquantes, types)"""
+        brut = _formater(COLONNES) + b''.join(_formater([valeurs.get(c) for c in COLONNES]) for _, valeurs in lignes)
+        df = pd.read_csv(io.BytesIO(brut))
+        df.index = pd.Index([tour_id for tour_id, _ in lignes], dtype=int)
+        return self._preparer(df)
+
+    # --- Écriture (sous verrou exclusif ; appeler _charger, jamais _a_jour, pour ne pas
+    # reprendre le verrou fcntl partagé sur un autre descripteur) ---
+
+    def _ecrire_tout(self, lignes: List[list]) -> List[int]:
+        """Réécrit le fichier complet de façon atomique (fichier temporaire + rename) ; retourne les positions"""
+        temporaire = self.chemin + '.tmp'
+        positions = []
+        with open(temporaire, 'wb') as f:
+            f.write(_formater(ENTETE))
+            for valeurs in lignes:
+                positions.append(f.tell())
+                f.write(_formater(valeurs))
+        os.replace(temporaire, self.chemin)
+        return positions
+
+    def _reecrire(self):
+        """
+        Réécrit le fichier avec les seules versions vivantes, au format avec Id. Le plus
+        grand Id est conservé (enterré) s'il a été supprimé, pour ne jamais être réutilisé
+        """
+        plus_grand = self._prochain_id - 1
+        lignes, enterrees = [], []
+        if os.path.exists(self.chemin) and os.path.getsize(self.chemin) > 0:
+            a_id = COLONNE_ID in self._entete
+            for numero, (position, champs) in enumerate(list(self._parcourir())[1:]):
+                valeurs = dict(zip(self._entete, champs))
+                tour_id = int(valeurs[COLONNE_ID]) if a_id else numero
+                vivante = self._positions.get(tour_id) == position
+                if vivante or (tour_id == plus_grand and tour_id not in self._positions):
+                    if not vivante:
+                        enterrees.append(len(lignes))
+                        plus_grand = None  # Une seule version morte conservée
+                    lignes.append([valeurs.get(c) for c in COLONNES] + [tour_id])
+        positions = self._ecrire_tout(lignes)
+        with open(self.chemin_supprimes, 'w') as f:
+            f.writelines(f"{positions[i]}\n" for i in enterrees)
+        self._charger()
+
+    def _format_a_jour(self):
+        """Ancien fichier sans colonne Id (ou colonnes manquantes) : réécrit une fois au format complet"""
+        if os.path.exists(self.chemin) and os.path.getsize(self.chemin) > 0 and self._entete != ENTETE:
+            self._reecrire()
+
+    def _ajouter_ligne(self, valeurs: Dict, tour_id: int) -> int:
+        """Écrit une version du tour en fin de fichier ; retourne sa position"""
+        taille = os.path.getsize(self.chemin) if os.path.exists(self.chemin) else 0
+        fin_de_ligne = True
+        if taille:
+            with open(self.chemin, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                fin_de_ligne = f.read(1) == b'\n'
+        with open(self.chemin, 'ab') as f:
+            if not taille:
+                f.write(_formater(ENTETE))
+            elif not fin_de_ligne:
+                f.write(b'\n')
+            position = f.tell()
+            f.write(_formater([valeurs.get(c) for c in COLONNES] + [tour_id]))
+        self._entete = ENTETE
+        self._nb_lignes += 1
+        return position
+
+    def _mettre_en_cache(self, valeurs: Dict, tour_id: int):
+        """Ajoute au cache la ligne seule, parsée comme à la lecture du fichier"""
+        ligne = self._parser_lignes([(tour_id, valeurs)])
+        self._df = pd.concat([self._df, ligne]).sort_index() if len(self._df) else ligne
+
+    def _enterrer(self, position: int):
+        with open(self.chemin_supprimes, 'a') as f:
+            f.write(f"{position}\n")
+        self._morts.add(position)
+
+    def ajouter(self, valeurs: Dict) -> Ecriture:
+        """Ajoute un tour en fin de fichier ; retourne son Id"""
+        with self._verrou, self._verrou_fichier(exclusif=True):
+            if self._perime():
+                self._charger()
+            self._format_a_jour()
+            version_avant = self._version
+            tour_id = self._prochain_id
+            # Cache et index mis à jour sans relire le fichier
+            self._positions[tour_id] = self._ajouter_ligne(valeurs, tour_id)
+            self._prochain_id += 1
+            self._mettre_en_cache(valeurs, tour_id)
+            self._version = self.version()
+            return Ecriture(tour_id, None, version_avant, self._version)
+
+    def supprimer(self, tour_id: int) -> Optional[Ecriture]:
+        """Supprime un tour (pierre tombale à sa position) ; None si l'Id n'existe pas"""
+        with self._verrou, self._verrou_fichier(exclusif=True):
+            if self._perime():
+                self._charger()
+            if tour_id not in self._positions:
+                return None
+            self._format_a_jour()
+            version_avant = self._version
+            ligne = self._df.loc[tour_id].copy()
+            self._enterrer(self._positions.pop(tour_id))
+            self._df = self._df.drop(index=tour_id)
+            if len(self._morts) >= CSV_COMPACT_MIN and len(self._morts) >= CSV_COMPACT_RATIO * self._nb_lignes:
+                self._reecrire()
+            self._version = self.version()
+            return Ecriture(tour_id, ligne, version_avant, self._version)
+
+    def modifier(self, tour_id: int, valeurs: Dict, condition: Optional[Callable[[pd.Series], bool]] = None) -> Optional[Ecriture]:
+        """
+        Modifie des champs d'un tour : la nouvelle version est ajoutée (même Id), l'ancienne enterrée
+        `condition(ligne)` est vérifiée sous verrou ; None si le tour n'existe pas ou ne la remplit pas
+        """
+        with self._verrou, self._verrou_fichier(exclusif=True):
+            if self._perime():
+                self._charger()
+            if tour_id not in self._positions:
+                return None
+            if condition is not None and not condition(self._df.loc[tour_id]):
+                return None
+            self._format_a_jour()
+            version_avant = self._version
+            ancienne = self._positions[tour_id]
+            nouvelles = self._lire_a(ancienne)
+            nouvelles.update(valeurs)
+            self._positions[tour_id] = self._ajouter_ligne(nouvelles, tour_id)
+            self._enterrer(ancienne)
+            self._df = self._df.drop(index=tour_id)
+            self._mettre_en_cache(nouvelles, tour_id)
+            self._version = self.version()
+            return Ecriture(tour_id, None, version_avant, self._version)
@@ -0,0 +1,490 @@
+"""
+Backend SQLite local (STORAGE_BACKEND=sqlite) : mêmes fonctions et même format de
+lignes que database.py (tables rides et entretien), sans réseau.
+- base en mode WAL : lectures concurrentes pendant une écriture, écritures des
+  workers gunicorn sérialisées par SQLite (BEGIN IMMEDIATE + busy_timeout) ;
+- une connexion par thread, recréée après un fork ;
+- photos et factures écrites sous SQLITE_FILES_DIR et servies par l'application
+  sous FICHIERS_URL (voir la route /fichiers de app.py).
+"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from images import preparer_photo
+from utilisateurs import normaliser_utilisateur
+
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'velo.db')
+SQLITE_FILES_DIR = os.getenv('SQLITE_FILES_DIR', 'fichiers')
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '5'))
+FICHIERS_URL = '/fichiers'
+
+TABLE_NAME = 'rides'
+PHOTOS_BUCKET = 'tour-photos'
+ENTRETIEN_TABLE = 'entretien'
+ENTRETIEN_BUCKET = 'entretien_velo'
+
+# Schéma équivalent à supabase_setup.sql + migrations ; la table meta porte la version
+# des données des tours, incrémentée par trigger (partagée entre les workers)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rides (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    ride_date TEXT,
+    start TEXT NOT NULL,
+    etape TEXT,
+    ziel TEXT NOT NULL,
+    wetter TEXT,
+    km REAL NOT NULL DEFAULT 0,
+    bemerkungen TEXT,
+    utilisateur TEXT NOT NULL DEFAULT 'Oswald',
+    photos TEXT NOT NULL DEFAULT '[]',
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_rides_utilisateur_id ON rides(utilisateur, id);
+CREATE INDEX IF NOT EXISTS idx_rides_utilisateur_ride_date ON rides(utilisateur, ride_date);
+CREATE INDEX IF NOT EXISTS idx_rides_ride_date ON rides(ride_date);
+
+CREATE TABLE IF NOT EXISTS entretien (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    utilisateur TEXT NOT NULL DEFAULT 'Oswald',
+    nom_velo TEXT NOT NULL DEFAULT 'Mon vélo',
+    km_actuel REAL DEFAULT 0,
+    date_prochain_entretien TEXT,
+    url_photo_velo TEXT,
+    url_facture TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_entretien_utilisateur ON entretien(utilisateur);
+
+CREATE TABLE IF NOT EXISTS meta (cle TEXT PRIMARY KEY, valeur INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (cle, valeur) VALUES ('version_rides', 0);
+CREATE TRIGGER IF NOT EXISTS rides_version_insert AFTER INSERT ON rides
+BEGIN UPDATE meta SET valeur = valeur + 1 WHERE cle = 'version_rides'; END;
+CREATE TRIGGER IF NOT EXISTS rides_version_update AFTER UPDATE ON rides
+BEGIN UPDATE meta SET valeur = valeur + 1 WHERE cle = 'version_rides'; END;
+CREATE TRIGGER IF NOT EXISTS rides_version_delete AFTER DELETE ON rides
+BEGIN UPDATE meta SET valeur = valeur + 1 WHERE cle = 'version_rides'; END;
+"""
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_pret = False
+_write_listeners = []
+
+
+def _connexion() -> sqlite3.Connection:
+    """Connexion du thread courant (schéma créé à la première connexion du processus)"""
+    global _schema_pret
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+    # Mode autocommit : les écritures ouvrent explicitement leur transaction (_transaction)
+    conn = sqlite3.connect(SQLITE_PATH, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None,
+                           check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    if not _schema_pret:
+        with _schema_lock:
+            if not _schema_pret:
+                conn.executescript(SCHEMA)
+                _schema_pret = True
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+@contextmanager
+def _transaction():
+    """Transaction d'écriture : le verrou d'écriture est pris dès le début (pas d'erreur 'database is locked' en cours de route)"""
+    conn = _connexion()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def _ligne(row: sqlite3.Row) -> Dict:
+    """Ligne SQLite -> dict au format des lignes Supabase (photos décodées)"""
+    ligne = dict(row)
+    if 'photos' in ligne:
+        try:
+            ligne['photos'] = json.loads(ligne['photos'] or '[]')
+        except ValueError:
+            ligne['photos'] = []
+    return ligne
+
+
+def _maintenant() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# --- Version et listeners (même contrat que database.py) ---
+
+def get_data_version() -> int:
+    """Version des données des tours, commune à tous les workers (trigger sur rides)"""
+    row = _connexion().execute("SELECT valeur FROM meta WHERE cle = 'version_rides'").fetchone()
+    return row[0] if row else 0
+
+
+def add_write_listener(listener):
+    """
+    Enregistre listener(event, rows) appelé après chaque écriture réussie sur les tours
+    event : 'add', 'update' ou 'delete' ; rows : lignes concernées
+    """
+    _write_listeners.append(listener)
+
+
+def _notify_write(event: str, rows: List[Dict]):
+    for listener in _write_listeners:
+        try:
+            listener(event, rows)
+        except Exception as e:
+            print(f"[ERROR] Erreur listener d'écriture ({event}): {e}")
+
+
+# --- Tours ---
+
+def get_all_tours() -> List[Dict]:
+    """Récupère tous les tours (ID décroissant)"""
+    try:
+        return [_ligne(r) for r in _connexion().execute('SELECT * FROM rides ORDER BY id DESC')]
+    except sqlite3.Error as e:
+        print(f"[ERROR] Erreur lors de la récupération des tours: {e}")
+        return []
+
+
+def get_tours_page(utilisateur: Optional[str] = None, limit: int = 50, before_id: Optional[int] = None,
+                   date_from: Optional[date] = None, date_to: Optional[date] = None) -> Optional[List[Dict]]:
+    """Page de tours par ID décroissant (id < before_id), période bornes incluses ; None en cas d'erreur"""
+    conditions, parametres = [], []
+    if utilisateur:
+        conditions.append('utilisateur = ?')
+        parametres.append(utilisateur)
+    if before_id is not None:
+        conditions.append('id < ?')
+        parametres.append(before_id)
+    if date_from:
+        conditions.append('ride_date >= ?')
+        parametres.append(date_from.isoformat())
+    if date_to:
+        conditions.append('ride_date <= ?')
+        parametres.append(date_to.isoformat())
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    try:
+        rows = _connexion().execute(f'SELECT * FROM rides {where} ORDER BY id DESC LIMIT ?', parametres + [limit])
+        return [_ligne(r) for r in rows]
+    except sqlite3.Error as e:
+        print(f"[ERROR] Erreur get_tours_page: {e}")
+        return None
+
+
+def get_tours_head() -> Optional[Dict]:
+    """Résumé de la table des tours : {'latest_id': int|None, 'count': int}"""
+    try:
+        row = _connexion().execute('SELECT MAX(id), COUNT(*) FROM rides').fetchone()
+        return {'latest_id': row[0], 'count': row[1]}
+    except sqlite3.Error as e:
+        print(f"[ERROR] Erreur get_tours_head: {e}")
+        return None
+
+
+def tour_exists(tour_id: int) -> Optional[bool]:
+    """True si le tour existe, None en cas d'erreur"""
+    try:
+        return _connexion().execute('SELECT 1 FROM rides WHERE id = ?', (tour_id,)).fetchone() is not None
+    except sqlite3.Error as e:
+        print(f"[ERROR] Erreur tour_exists: {e}")
+        return None
+
+
+def get_ride_aggregates(today: Optional[date] = None) -> Optional[List[Dict]]:
+    """Totaux de km par utilisateur, au format de la fonction Postgres ride_aggregates"""
+    today = today or date.today()
+    lundi = today - timedelta(days=today.weekday())
+    try:
+        rows = _connexion().execute(
+            """
+            SELECT utilisateur,
+                   COALESCE(SUM(km), 0) AS total_global,
+                   COALESCE(SUM(CASE WHEN ride_date = :auj THEN km END), 0) AS total_aujourdhui,
+                   COALESCE(SUM(CASE WHEN ride_date >= :semaine THEN km END), 0) AS total_semaine,
+                   COALESCE(SUM(CASE WHEN ride_date >= :mois THEN km END), 0) AS total_mois,
+                   COALESCE(SUM(CASE WHEN ride_date >= :annee THEN km END), 0) AS total_annee,
+                   COUNT(*) AS nb_tours,
+                   MAX(id) AS dernier_id
+            FROM rides GROUP BY utilisateur
+            """,
+            {'auj': today.isoformat(), 'semaine': lundi.isoformat(),
+             'mois': today.replace(day=1).isoformat(), 'annee': today.replace(month=1, day=1).isoformat()})
+        return [dict(r) for r in rows]
+    except sqlite3.Error as e:
+        print(f"[ERROR] Erreur get_ride_aggregates: {e}")
+        return None
+
+
+def add_tour(tour_data: Dict) -> Tuple[bool, any]:
+    """Ajoute un tour ; retourne (success, id du tour ou message d'erreur)"""
+    def optionnel(cle):
+        valeur = str(tour_data.get(cle) or '').strip()
+        return valeur if valeur and valeur != 'N/A' else None
+
+    date_str = str(tour_data.get('Date', '')).strip()
+    try:
+        km = float(tour_data.get('Km') or 0)
+    except (ValueError, TypeError):
+        km = 0.0
+    try:
+        ride_date = datetime.strptime(date_str, '%d/%m/%Y').date().isoformat()
+    except ValueError:
+        ride_date = None
+    ligne = {
+        'date': date_str,
+        'ride_date': ride_date,
+        'start': str(tour_data.get('Start', '')).strip(),
+        'etape': optionnel('Etape'),
+        'ziel': str(tour_data.get('Ziel', '')).strip(),
+        'wetter': optionnel('Wetter'),
+        'km': km,
+        'bemerkungen': optionnel('Bemerkungen'),
+        # Stocké déjà normalisé : le filtre par utilisateur reste une égalité indexée
+        'utilisateur': normaliser_utilisateur(tour_data.get('Utilisateur')),
+    }
+    if not ligne['date']:
+        return False, "La date est requise"
+    if not ligne['start']:
+        return False, "Le lieu de départ est requis"
+    if not ligne['ziel']:
+        return False, "Le lieu d'arrivée est requis"
+    try:
+        with _transaction() as conn:
+            colonnes = ', '.join(ligne)
+            row = conn.execute(
+                f"INSERT INTO rides ({colonnes}) VALUES ({', '.join('?' * len(ligne))}) RETURNING *",
+                list(ligne.values())).fetchone()
+            ajoutee = _ligne(row)
+    except sqlite3.Error as e:
+        print(f"[ERROR] Erreur SQLite add_tour: {e}")
+        return False, f"Erreur SQLite: {e}"
+    _notify_write('add', [ajoutee])
+    return True, ajoutee['id']
+
+
+def update_tour(tour_id: int, data: Dict) -> bool:
+    """Met à jour les champs descriptifs d'un tour (Wetter, Bemerkungen)"""
+    updates = {}
+    if 'Wetter' in data:
+        updates['wetter'] = str(data['Wetter']).strip() or None
+    if 'Bemerkungen' in data:
+        updates['bemerkungen'] = str(data['Bemerkungen']).strip() or None
+    if not updates:
+        return True
+    try:
+        with _transaction() as conn:
+            row = conn.execute(
+                f"UPDATE rides SET {', '.join(f'{c} = ?' for c in updates)} WHERE id = ? RETURNING *",
+                list(updates.values()) + [tour_id]).fetchone()
+    except sqlite3.Error as e:
+        print(f"[ERROR] Erreur update_tour: {e}")
+        return False
+    if row is None:
+        return False
+    _notify_write('update', [_ligne(row)])
+    return True
+
+
+def delete_tour(tour_id: int) -> bool:
+    """Supprime un tour par son ID"""
+    try:
+        with _transaction() as conn:
+            rows = [_ligne(r) for r in conn.execute('DELETE FROM rides WHERE id = ? RETURNING *', (tour_id,))]
+    except sqlite3.Error as e:
+        print(f"[ERROR] Erreur lors de la suppression du tour: {e}")
+        return False
+    _notify_write('delete', rows)
+    return True
+
+
+# --- Fichiers (photos, factures) ---
+
+def _enregistrer_fichier(bucket: str, chemin: str, contenu: bytes) -> str:
+    """Écrit un fichier sous SQLITE_FILES_DIR/bucket ; retourne son URL publique"""
+    destination = os.path.join(SQLITE_FILES_DIR, bucket, chemin)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temporaire = f"{destination}.{uuid.uuid4().hex}.tmp"
+    with open(temporaire, 'wb') as f:
+        f.write(contenu)
+    os.replace(temporaire, destination)
+    return f"{FICHIERS_URL}/{bucket}/{chemin}"
+
+
+def _enregistrer_photo(bucket: str, base_path: str, file_content: bytes, ext: str) -> Dict[str, str]:
+    """Photo sans EXIF et déclinaisons WebP (voir images.py) ; retourne {'url', 'medium', 'thumb'} ou {'url'}"""
+    fichiers = preparer_photo(file_content) or {'original': (file_content, ext, None)}
+    urls = {}
+    for nom, (contenu, extension, _) in fichiers.items():
+        chemin = f"{base_path}{extension}" if nom == 'original' else f"{base_path}_{nom}{extension}"
+        urls['url' if nom == 'original' else nom] = _enregistrer_fichier(bucket, chemin, contenu)
+    return urls
+
+
+def _extension(filename: str, autorisees: Tuple[str, ...]) -> str:
+    ext = os.path.splitext(filename)[1].lower() or '.jpg'
+    return ext if ext in autorisees else '.jpg'
+
+
+def _store_tour_photo(tour_id: int, file_content: bytes, filename: str):
+    ext = _extension(filename, ('.jpg', '.jpeg', '.png', '.gif', '.webp'))
+    urls = _enregistrer_photo(PHOTOS_BUCKET, f"{tour_id}/{uuid.uuid4().hex}", file_content, ext)
+    return urls if len(urls) > 1 else urls['url']
+
+
+def append_tour_photos(tour_id: int, new_photos: List) -> bool:
+    """Ajoute des éléments à la colonne photos d'un tour (atomique : une transaction d'écriture)"""
+    with _transaction() as conn:
+        row = conn.execute('SELECT photos FROM rides WHERE id = ?', (tour_id,)).fetchone()
+        if row is None:
+            return False
+        photos = _ligne(row)['photos']
+        photos.extend(new_photos)
+        conn.execute('UPDATE rides SET photos = ? WHERE id = ?', (json.dumps(photos), tour_id))
+    _notify_write('update', [{'id': tour_id, 'photos': photos}])
+    return True
+
+
+def upload_photo_to_tour(tour_id: int, file_content: bytes, filename: str, content_type: str) -> Tuple[bool, any]:
+    """Enregistre une photo (et ses déclinaisons) et l'ajoute au tour ; retourne (success, élément_ou_erreur)"""
+    try:
+        photo = _store_tour_photo(tour_id, file_content, filename)
+        if not append_tour_photos(tour_id, [photo]):
+            return False, f"Tour {tour_id} introuvable"
+        return True, photo
+    except (OSError, sqlite3.Error) as e:
+        print(f"[ERROR] Erreur lors de l'enregistrement photo pour tour {tour_id}: {e}")
+        return False, str(e)
+
+
+def upload_photos_to_tour(tour_id: int, files: List[Tuple[bytes, str, str]]) -> Tuple[bool, any]:
+    """
+    Enregistre plusieurs photos (contenu, nom, type) puis les ajoute au tour en une transaction
+    Retourne (success, résultats par fichier [{'filename', 'success', 'photo' | 'error'}] ou message d'erreur)
+    """
+    results = []
+    for file_content, filename, _ in files:
+        try:
+            results.append({'filename': filename, 'success': True,
+                            'photo': _store_tour_photo(tour_id, file_content, filename)})
+        except OSError as e:
+            print(f"[ERROR] Erreur lors de l'enregistrement photo {filename} pour tour {tour_id}: {e}")
+            results.append({'filename': filename, 'success': False, 'error': str(e)})
+    photos = [r['photo'] for r in results if r['success']]
+    if not photos:
+        return True, results
+    try:
+        if not append_tour_photos(tour_id, photos):
+            return False, f"Tour {tour_id} introuvable"
+    except sqlite3.Error as e:
+        print(f"[ERROR] Erreur lors de l'ajout des photos au tour {tour_id}: {e}")
+        return False, str(e)
+    return True, results
+
+
+# --- Entretien (Garage) ---
+
+def get_all_entretien() -> List[Dict]:
+    """Récupère tous les enregistrements entretien"""
+    try:
+        return [_ligne(r) for r in _connexion().execute('SELECT * FROM entretien ORDER BY id')]
+    except sqlite3.Error as e:
+        print(f"[ERROR] Erreur get_all_entretien: {e}")
+        return []
+
+
+def add_entretien(data: Dict) -> Tuple[bool, any]:
+    """Ajoute un vélo dans entretien. Retourne (success, id ou message_erreur)."""
+    try:
+        row = {
+            'utilisateur': normaliser_utilisateur(data.get('utilisateur')),
+            'nom_velo': str(data.get('nom_velo', 'Mon vélo')).strip()[:255] or 'Mon vélo',
+            'km_actuel': float(data.get('km_actuel', 0) or 0),
+            'date_prochain_entretien': data.get('date_prochain_entretien') or None,
+            'url_photo_velo': data.get('url_photo_velo') or None,
+            'url_facture': data.get('url_facture') or None,
+        }
+        with _transaction() as conn:
+            curseur = conn.execute(
+                f"INSERT INTO entretien ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                list(row.values()))
+            return True, curseur.lastrowid
+    except (ValueError, sqlite3.Error) as e:
+        print(f"[ERROR] Erreur add_entretien: {e}")
+        return False, str(e)
+
+
+def update_entretien(entretien_id: int, data: Dict) -> bool:
+    """Met à jour un enregistrement entretien"""
+    try:
+        updates = {}
+        if 'nom_velo' in data:
+            updates['nom_velo'] = str(data['nom_velo']).strip()[:255] or 'Mon vélo'
+        if 'km_actuel' in data:
+            updates['km_actuel'] = float(data['km_actuel'] or 0)
+        if 'date_prochain_entretien' in data:
+            updates['date_prochain_entretien'] = data['date_prochain_entretien'] or None
+        if 'url_photo_velo' in data:
+            updates['url_photo_velo'] = data['url_photo_velo']
+        if 'url_facture' in data:
+            updates['url_facture'] = data['url_facture']
+        updates['updated_at'] = _maintenant()
+        with _transaction() as conn:
+            conn.execute(f"UPDATE entretien SET {', '.join(f'{c} = ?' for c in updates)} WHERE id = ?",
+                         list(updates.values()) + [entretien_id])
+        return True
+    except (ValueError, sqlite3.Error) as e:
+        print(f"[ERROR] Erreur update_entretien: {e}")
+        return False
+
+
+def delete_entretien(entretien_id: int) -> bool:
+    """Supprime un enregistrement entretien"""
+    try:
+        with _transaction() as conn:
+            conn.execute('DELETE FROM entretien WHERE id = ?', (entretien_id,))
+        return True
+    except sqlite3.Error as e:
+        print(f"[ERROR] Erreur delete_entretien: {e}")
+        return False
+
+
+def upload_entretien_file(entretien_id: int, file_content: bytes, filename: str, content_type: str, field: str = 'photo_velo') -> Tuple[bool, str]:
+    """
+    Enregistre une photo de vélo (sans EXIF, déclinaison moyenne dans url_photo_velo)
+    ou une facture (url_facture). field: 'photo_velo' | 'facture'
+    """
+    ext = _extension(filename, ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.pdf'))
+    prefix = 'photo' if field == 'photo_velo' else 'facture'
+    base_path = f"{entretien_id}/{prefix}_{uuid.uuid4().hex}"
+    try:
+        if field == 'photo_velo' and ext != '.pdf':
+            urls = _enregistrer_photo(ENTRETIEN_BUCKET, base_path, file_content, ext)
+            public_url = urls.get('medium', urls['url'])
+        else:
+            public_url = _enregistrer_fichier(ENTRETIEN_BUCKET, f"{base_path}{ext}", file_content)
+        col = 'url_photo_velo' if field == 'photo_velo' else 'url_facture'
+        with _transaction() as conn:
+            conn.execute(f"UPDATE entretien SET {col} = ?, updated_at = ? WHERE id = ?",
+                         (public_url, _maintenant(), entretien_id))
+        return True, public_url
+    except (OSError, sqlite3.Error) as e:
+        print(f"[ERROR] Erreur upload_entretien_file: {e}")
+        return False, str(e)
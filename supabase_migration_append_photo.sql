@@ -0,0 +1,28 @@
+-- Migration : ajout atomique de photos à un tour (remplace lecture + réécriture du tableau)
+-- À exécuter dans l'éditeur SQL de Supabase (après supabase_migration_photos.sql)
+-- Deux uploads simultanés sur le même tour ne peuvent plus perdre une photo
+
+-- Ajoute les éléments de p_photos (tableau JSON) à rides.photos ; retourne le tableau
+-- complet, NULL si le tour n'existe pas
+CREATE OR REPLACE FUNCTION append_ride_photos(p_id INTEGER, p_photos JSONB)
+RETURNS JSONB
+LANGUAGE sql
+VOLATILE
+AS $$
+    UPDATE rides
+    SET photos = COALESCE(rides.photos, '[]'::jsonb) || p_photos
+    WHERE rides.id = p_id
+    RETURNING rides.photos;
+$$;
+
+-- Une seule photo : URL (chaîne JSON) ou {url, medium, thumb}
+CREATE OR REPLACE FUNCTION append_ride_photo(p_id INTEGER, p_url JSONB)
+RETURNS JSONB
+LANGUAGE sql
+VOLATILE
+AS $$
+    SELECT append_ride_photos(p_id, jsonb_build_array(p_url));
+$$;
+
+GRANT EXECUTE ON FUNCTION append_ride_photos(INTEGER, JSONB) TO anon, authenticated;
+GRANT EXECUTE ON FUNCTION append_ride_photo(INTEGER, JSONB) TO anon, authenticated;
@@ -0,0 +1,8 @@
+-- Migration : clé d'import des tours (import en masse idempotent, voir migrate_to_supabase.py)
+-- À exécuter dans l'éditeur SQL de Supabase avant d'importer journal_velo.csv
+-- import_key vaut '<source>:<Id du tour dans le CSV>' ; NULL pour les tours saisis dans l'application
+
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS import_key TEXT;
+
+-- Cible de l'upsert (on_conflict=import_key) : un tour importé deux fois est mis à jour, pas dupliqué
+CREATE UNIQUE INDEX IF NOT EXISTS idx_rides_import_key ON rides(import_key);
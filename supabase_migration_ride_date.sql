@@ -0,0 +1,63 @@
+-- Migration : colonne DATE typée pour les tours (rides.date reste en VARCHAR 'dd/mm/yyyy')
+-- À exécuter dans l'éditeur SQL de Supabase si la table existe déjà
+-- Pendant la transition l'application écrit les deux colonnes ; le trigger couvre les
+-- écritures d'anciennes versions qui ne remplissent que 'date'
+
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS ride_date DATE;
+
+-- Remplir ride_date depuis les chaînes existantes (les valeurs invalides restent NULL)
+UPDATE rides
+SET ride_date = to_date(date, 'DD/MM/YYYY')
+WHERE ride_date IS NULL
+  AND date ~ '^\d{1,2}/\d{1,2}/\d{4}$';
+
+-- Historique par utilisateur et filtres de période en requêtes indexées
+CREATE INDEX IF NOT EXISTS idx_rides_utilisateur_ride_date ON rides(utilisateur, ride_date);
+CREATE INDEX IF NOT EXISTS idx_rides_ride_date ON rides(ride_date);
+
+CREATE OR REPLACE FUNCTION rides_set_ride_date()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.ride_date IS NULL AND NEW.date ~ '^\d{1,2}/\d{1,2}/\d{4}$' THEN
+        NEW.ride_date := to_date(NEW.date, 'DD/MM/YYYY');
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_rides_set_ride_date ON rides;
+CREATE TRIGGER trg_rides_set_ride_date
+    BEFORE INSERT OR UPDATE OF date, ride_date ON rides
+    FOR EACH ROW EXECUTE FUNCTION rides_set_ride_date();
+
+-- Si supabase_migration_stats.sql a été exécuté : agréger sur la colonne typée
+CREATE OR REPLACE FUNCTION ride_aggregates(p_today DATE DEFAULT CURRENT_DATE)
+RETURNS TABLE (
+    utilisateur VARCHAR,
+    total_global DOUBLE PRECISION,
+    total_aujourdhui DOUBLE PRECISION,
+    total_semaine DOUBLE PRECISION,
+    total_mois DOUBLE PRECISION,
+    total_annee DOUBLE PRECISION,
+    nb_tours BIGINT,
+    dernier_id INTEGER
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        rides.utilisateur,
+        COALESCE(SUM(rides.km), 0)::DOUBLE PRECISION,
+        COALESCE(SUM(rides.km) FILTER (WHERE rides.ride_date = p_today), 0)::DOUBLE PRECISION,
+        COALESCE(SUM(rides.km) FILTER (WHERE rides.ride_date >= date_trunc('week', p_today)::DATE), 0)::DOUBLE PRECISION,
+        COALESCE(SUM(rides.km) FILTER (WHERE rides.ride_date >= date_trunc('month', p_today)::DATE), 0)::DOUBLE PRECISION,
+        COALESCE(SUM(rides.km) FILTER (WHERE rides.ride_date >= date_trunc('year', p_today)::DATE), 0)::DOUBLE PRECISION,
+        COUNT(*),
+        MAX(rides.id)
+    FROM rides
+    GROUP BY rides.utilisateur;
+$$;
+
+GRANT EXECUTE ON FUNCTION ride_aggregates(DATE) TO anon, authenticated;
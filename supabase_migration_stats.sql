@@ -0,0 +1,45 @@
+-- Migration : agrégation des km côté Postgres (stats de /api/tours)
+-- À exécuter dans l'éditeur SQL de Supabase
+-- Retourne une ligne par valeur de rides.utilisateur au lieu de toutes les lignes de la table ;
+-- le rattachement des anciennes valeurs (Opa, MOI, NULL...) reste fait par l'application
+
+CREATE OR REPLACE FUNCTION ride_aggregates(p_today DATE DEFAULT CURRENT_DATE)
+RETURNS TABLE (
+    utilisateur VARCHAR,
+    total_global DOUBLE PRECISION,
+    total_aujourdhui DOUBLE PRECISION,
+    total_semaine DOUBLE PRECISION,
+    total_mois DOUBLE PRECISION,
+    total_annee DOUBLE PRECISION,
+    nb_tours BIGINT,
+    dernier_id INTEGER
+)
+LANGUAGE sql
+STABLE
+AS $$
+    WITH r AS (
+        SELECT
+            rides.id,
+            rides.utilisateur,
+            rides.km,
+            -- Dates au format dd/mm/yyyy ; une valeur invalide ne compte que dans le total global
+            CASE WHEN rides.date ~ '^\d{1,2}/\d{1,2}/\d{4}$'
+                 THEN to_date(rides.date, 'DD/MM/YYYY') END AS jour
+        FROM rides
+    )
+    SELECT
+        r.utilisateur,
+        COALESCE(SUM(r.km), 0)::DOUBLE PRECISION,
+        COALESCE(SUM(r.km) FILTER (WHERE r.jour = p_today), 0)::DOUBLE PRECISION,
+        -- Semaine du lundi (comme dans l'application)
+        COALESCE(SUM(r.km) FILTER (WHERE r.jour >= date_trunc('week', p_today)::DATE), 0)::DOUBLE PRECISION,
+        COALESCE(SUM(r.km) FILTER (WHERE r.jour >= date_trunc('month', p_today)::DATE), 0)::DOUBLE PRECISION,
+        COALESCE(SUM(r.km) FILTER (WHERE r.jour >= date_trunc('year', p_today)::DATE), 0)::DOUBLE PRECISION,
+        COUNT(*),
+        MAX(r.id)
+    FROM r
+    GROUP BY r.utilisateur;
+$$;
+
+-- Appel via l'API REST (POST /rest/v1/rpc/ride_aggregates) avec la clé anon
+GRANT EXECUTE ON FUNCTION ride_aggregates(DATE) TO anon, authenticated;
@@ -0,0 +1,25 @@
+-- Migration : colonne updated_at sur rides (synchronisation incrémentale de la réplique locale)
+-- À exécuter dans l'éditeur SQL de Supabase si SUPABASE_REPLICA=true
+-- Sans cette colonne, les modifications (météo, photos) faites par d'autres workers ne
+-- sont vues par la réplique qu'à la resynchronisation complète (REPLICA_FULL_SYNC_INTERVAL)
+
+ALTER TABLE rides ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+UPDATE rides SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_rides_updated_at ON rides(updated_at);
+
+CREATE OR REPLACE FUNCTION rides_set_updated_at()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_rides_set_updated_at ON rides;
+CREATE TRIGGER trg_rides_set_updated_at
+    BEFORE UPDATE ON rides
+    FOR EACH ROW EXECUTE FUNCTION rides_set_updated_at();
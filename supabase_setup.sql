@@ -4,6 +4,7 @@
 CREATE TABLE IF NOT EXISTS rides (
     id SERIAL PRIMARY KEY,
     date VARCHAR(10) NOT NULL,
+    ride_date DATE,
     start VARCHAR(255) NOT NULL,
     etape VARCHAR(255),
     ziel VARCHAR(255) NOT NULL,
@@ -17,5 +18,9 @@ CREATE TABLE IF NOT EXISTS rides (
 -- Créer un index sur la date pour améliorer les performances des requêtes
 CREATE INDEX IF NOT EXISTS idx_rides_date ON rides(date);
 
+-- Index sur la date typée (périodes, historique par utilisateur)
+CREATE INDEX IF NOT EXISTS idx_rides_utilisateur_ride_date ON rides(utilisateur, ride_date);
+CREATE INDEX IF NOT EXISTS idx_rides_ride_date ON rides(ride_date);
+
 -- Créer un index sur created_at pour le tri
 CREATE INDEX IF NOT EXISTS idx_rides_created_at ON rides(created_at DESC);
@@ -0,0 +1,37 @@
+"""
+Utilisateurs de l'application et rattachement des valeurs stockées (rides.utilisateur,
+colonne Utilisateur du CSV) : une seule règle pour les stats, l'historique et les
+filtres, en Python (normaliser_utilisateur) comme côté Supabase (MOTIFS_UTILISATEUR)
+"""
+import re
+from typing import Dict
+
+USERS = ['Oswald', 'Titine', 'Alexandre', 'Damien']
+
+# Anciennes valeurs rattachées à un utilisateur, comparées sans tenir compte de la casse
+# (Opa, comme toute valeur inconnue ou vide, revient à Oswald)
+ALIAS_UTILISATEUR = {'MOI': 'Damien'}
+
+
+def normaliser_utilisateur(val) -> str:
+    """Normalise l'utilisateur : Oswald, Titine, Alexandre ou Damien. Opa -> Oswald pour rétrocompatibilité."""
+    v = str(val or 'Oswald').strip()
+    if v.upper() in ALIAS_UTILISATEUR:
+        return ALIAS_UTILISATEUR[v.upper()]
+    if v in USERS:
+        return v
+    return 'Oswald'
+
+
+def _motif(utilisateur: str) -> str:
+    """Expression POSIX des valeurs que normaliser_utilisateur rattache à `utilisateur`"""
+    valeurs = [re.escape(utilisateur)] + [
+        ''.join(f'[{c.upper()}{c.lower()}]' if c.isalpha() else re.escape(c) for c in alias)
+        for alias, cible in ALIAS_UTILISATEUR.items() if cible == utilisateur
+    ]
+    return f"^[[:space:]]*({'|'.join(valeurs)})[[:space:]]*$"
+
+
+# Motifs (opérateur match de PostgREST) des utilisateurs autres qu'Oswald ; Oswald = NULL
+# ou aucun de ces motifs
+MOTIFS_UTILISATEUR: Dict[str, str] = {u: _motif(u) for u in USERS if u != 'Oswald'}